@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import SmallInteger, String, select, func, type_coerce
+from sqlalchemy.orm import Session
+
+from .archive import archive_version, read_archived_records
+from .models import ATTENDANCE_STATUS_CODES, AttendanceRecord, Employee
+from .sharding import TenantSessionLocal, fan_in
+
+# -----------------------------
+# Columnar attendance analytics
+# -----------------------------
+#
+# Attendance is loaded once per data version into flat NumPy arrays
+# (employee index, day ordinal, status code) and every report is computed
+# with vectorized group-bys over those arrays instead of ORM objects.
+# Archived months (app/archive.py) are merged in, so reports cover the full
+# history; where a day exists in both, the live row wins.
+
+# The stored codes (see app/codes.py), read straight from the column without decoding
+STATUS_CODES = ATTENDANCE_STATUS_CODES
+ABSENCE_CODES = (STATUS_CODES["ABSENT"], STATUS_CODES["LEAVE"])
+WORKING_CODES = (STATUS_CODES["PRESENT"],) + ABSENCE_CODES
+
+GROUP_BY = ("manager", "location", "weekday", "month")
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# One attendance row as read by load_frame
+_RECORD_DTYPE = np.dtype([("emp", object), ("day", object), ("status", np.int8)])
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+@dataclass
+class AttendanceFrame:
+    emp_ids: List[str]            # employee index -> emp_id
+    managers: np.ndarray          # employee index -> manager label index
+    manager_labels: List[str]
+    locations: np.ndarray         # employee index -> location label index
+    location_labels: List[str]
+    emp: np.ndarray               # per record: employee index (int32)
+    day: np.ndarray               # per record: date ordinal (int32)
+    status: np.ndarray            # per record: status code (int8)
+
+    @property
+    def size(self) -> int:
+        return int(self.emp.size)
+
+    @property
+    def absent(self) -> np.ndarray:
+        return np.isin(self.status, ABSENCE_CODES)
+
+    @property
+    def working(self) -> np.ndarray:
+        return np.isin(self.status, WORKING_CODES)
+
+    def weekday(self) -> np.ndarray:
+        # date.toordinal() is 1 for Monday 0001-01-01
+        return (self.day - 1) % 7
+
+
+def _labels(values: List[Optional[str]]) -> Tuple[np.ndarray, List[str]]:
+    labels = sorted({v or "UNKNOWN" for v in values})
+    index = {label: i for i, label in enumerate(labels)}
+    return np.array([index[v or "UNKNOWN"] for v in values], dtype=np.int32), labels
+
+
+def data_version(db: Session) -> tuple:
+    """Cheap fingerprint of the attendance + employee tables; changes on any write."""
+    att = fan_in(db.execute(
+        select(func.count(), func.max(AttendanceRecord.id), func.max(AttendanceRecord.last_updated_at))
+    ).all(), "sum", "max", "max")
+    # updated_at moves on manager/location changes and deactivations (HR sync), not just inserts
+    emps = fan_in(db.execute(select(func.count(), func.max(Employee.updated_at))).all(), "sum", "max")
+    return att + emps + (archive_version(),)
+
+
+def _index_of(values: np.ndarray, keys: List[str]) -> np.ndarray:
+    """Position of each value in `keys`, or -1 where it is not there."""
+    if not keys or not values.size:
+        return np.full(values.size, -1, dtype=np.int32)
+    known = np.array(keys)
+    sorter = np.argsort(known)
+    pos = sorter[np.searchsorted(known, values, sorter=sorter).clip(max=len(keys) - 1)]
+    return np.where(known[pos] == values, pos, -1).astype(np.int32)
+
+
+def load_frame(db: Session) -> AttendanceFrame:
+    # Deactivated employees drop out of every report; their records are skipped below
+    employees = db.execute(
+        select(Employee.emp_id, Employee.manager_emp_id, Employee.location)
+        .where(Employee.is_active)
+        .order_by(Employee.emp_id)
+    ).all()
+    emp_ids = [e.emp_id for e in employees]
+    managers, manager_labels = _labels([e.manager_emp_id for e in employees])
+    locations, location_labels = _labels([e.location for e in employees])
+
+    # Rows stream straight into one structured array; no per-row Python loop.
+    # Days are read as ISO text (a date on PostgreSQL) and parsed by NumPy in bulk.
+    result = db.execute(
+        select(AttendanceRecord.emp_id, type_coerce(AttendanceRecord.day, String),
+               type_coerce(AttendanceRecord.status, SmallInteger))
+    )
+    records = np.fromiter(map(tuple, result), dtype=_RECORD_DTYPE)
+    live = len(records)
+    archived = read_archived_records()
+    if archived:
+        records = np.concatenate([records, np.fromiter(
+            ((e, d, STATUS_CODES.get(s, -1)) for e, d, s in archived), dtype=_RECORD_DTYPE, count=len(archived)
+        )])
+    emp = _index_of(records["emp"].astype(str), emp_ids)
+    days = records["day"].astype("U10").astype("datetime64[D]")
+    day = (days.astype(np.int64) + _EPOCH_ORDINAL).astype(np.int32)
+    from_archive = np.arange(len(records)) >= live
+    known = (emp >= 0) & (records["status"] >= 0)
+    emp, day, status, from_archive = emp[known], day[known], records["status"][known], from_archive[known]
+
+    # (employee index, day) order, sorted here rather than by the DB
+    order = np.lexsort((from_archive, day, emp))
+    emp, day, status = emp[order], day[order], status[order]
+    # A day archived and then written again lives in both; keep the live row (sorted first)
+    first = np.ones(len(emp), dtype=bool)
+    first[1:] = (emp[1:] != emp[:-1]) | (day[1:] != day[:-1])
+    return AttendanceFrame(
+        emp_ids=emp_ids,
+        managers=managers,
+        manager_labels=manager_labels,
+        locations=locations,
+        location_labels=location_labels,
+        emp=emp[first],
+        day=day[first],
+        status=status[first],
+    )
+
+
+# -----------------------------
+# Reports
+# -----------------------------
+
+def absence_rate(frame: AttendanceFrame, by: str) -> List[dict]:
+    """Absent+leave days over working days (present/absent/leave), grouped by `by`."""
+    if by == "manager":
+        keys, labels = frame.managers[frame.emp], frame.manager_labels
+    elif by == "location":
+        keys, labels = frame.locations[frame.emp], frame.location_labels
+    elif by == "weekday":
+        keys, labels = frame.weekday(), list(WEEKDAY_NAMES)
+    elif by == "month":
+        # Convert only the distinct days to months, then broadcast back to records
+        uniq_days, day_inv = np.unique(frame.day, return_inverse=True)
+        months = np.array([d.year * 12 + d.month - 1 for d in map(date.fromordinal, uniq_days.tolist())], dtype=np.int32)
+        month_keys, keys = np.unique(months[day_inv], return_inverse=True)
+        labels = [f"{m // 12:04d}-{m % 12 + 1:02d}" for m in month_keys.tolist()]
+    else:
+        raise ValueError(f"Unsupported group: {by}")
+
+    size = len(labels)
+    working = np.bincount(keys, weights=frame.working, minlength=size)
+    absent = np.bincount(keys, weights=frame.absent, minlength=size)
+    rate = np.divide(absent, working, out=np.zeros(size), where=working > 0)
+    return [
+        {"group": labels[i], "working_days": int(working[i]), "absent_days": int(absent[i]), "absence_rate": round(float(rate[i]), 4)}
+        for i in range(size)
+        if working[i] > 0
+    ]
+
+
+def monday_friday_pattern(frame: AttendanceFrame, min_absences: int = 3, threshold: float = 0.6) -> List[dict]:
+    """Employees whose absences cluster on Mondays/Fridays (expected share is 2/5)."""
+    absent = frame.absent
+    emp = frame.emp[absent]
+    weekday = frame.weekday()[absent]
+    n = len(frame.emp_ids)
+    total = np.bincount(emp, minlength=n)
+    edge = np.bincount(emp, weights=(weekday == 0) | (weekday == 4), minlength=n)
+    share = np.divide(edge, total, out=np.zeros(n), where=total > 0)
+    flagged = np.nonzero((total >= min_absences) & (share >= threshold))[0]
+    order = flagged[np.argsort(-share[flagged], kind="stable")]
+    return [
+        {"emp_id": frame.emp_ids[i], "absences": int(total[i]), "mon_fri_absences": int(edge[i]), "share": round(float(share[i]), 4)}
+        for i in order.tolist()
+    ]
+
+
+def absence_streaks(frame: AttendanceFrame, min_length: int = 3) -> List[dict]:
+    """Runs of consecutive recorded absence days per employee (weekends/holidays don't break a run)."""
+    if frame.size == 0:
+        return []
+    # Only working days take part; records are already ordered by (emp, day)
+    mask = frame.working
+    emp, day, absent = frame.emp[mask], frame.day[mask], frame.absent[mask]
+    if emp.size == 0:
+        return []
+
+    # A run breaks whenever the employee changes or the absence flag flips
+    boundary = np.ones(emp.size, dtype=bool)
+    boundary[1:] = (emp[1:] != emp[:-1]) | (absent[1:] != absent[:-1])
+    starts = np.flatnonzero(boundary)
+    lengths = np.diff(np.append(starts, emp.size))
+    hit = absent[starts] & (lengths >= min_length)
+
+    result = []
+    for s, length in zip(starts[hit].tolist(), lengths[hit].tolist()):
+        result.append({
+            "emp_id": frame.emp_ids[emp[s]],
+            "start": date.fromordinal(int(day[s])).isoformat(),
+            "end": date.fromordinal(int(day[s + length - 1])).isoformat(),
+            "days": length,
+        })
+    result.sort(key=lambda r: -r["days"])
+    return result
+
+
+def rolling_absence_rate(frame: AttendanceFrame, window: int = 7) -> List[dict]:
+    """Org-wide absence rate over a trailing window of calendar days."""
+    if frame.size == 0:
+        return []
+    first = int(frame.day.min())
+    offsets = frame.day - first
+    span = int(offsets.max()) + 1
+    working = np.bincount(offsets, weights=frame.working, minlength=span)
+    absent = np.bincount(offsets, weights=frame.absent, minlength=span)
+
+    def trailing(x):
+        c = np.cumsum(np.insert(x, 0, 0.0))
+        return c[window:] - c[:-window] if span >= window else np.array([])
+
+    w_sum, a_sum = trailing(working), trailing(absent)
+    rate = np.divide(a_sum, w_sum, out=np.zeros_like(a_sum), where=w_sum > 0)
+    return [
+        {"day": date.fromordinal(first + i + window - 1).isoformat(), "absence_rate": round(float(r), 4)}
+        for i, r in enumerate(rate.tolist())
+    ]
+
+
+# -----------------------------
+# Cache keyed by data version
+# -----------------------------
+
+class AnalyticsCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._frame: Optional[AttendanceFrame] = None
+        self._results: Dict[tuple, object] = {}
+
+    def frame(self, db: Session) -> Tuple[tuple, AttendanceFrame]:
+        version = data_version(db)
+        with self._lock:
+            if version != self._version:
+                self._frame = load_frame(db)
+                self._version = version
+                self._results = {}
+            return version, self._frame
+
+    def report(self, db: Session, name: str, fn, **params):
+        version, frame = self.frame(db)
+        key = (name,) + tuple(sorted(params.items()))
+        with self._lock:
+            if version == self._version and key in self._results:
+                return self._results[key]
+        result = fn(frame, **params)
+        with self._lock:
+            if version == self._version:
+                self._results[key] = result
+        return result
+
+
+analytics_cache = AnalyticsCache()
+
+REPORTS = {
+    "absence-rate": absence_rate,
+    "monday-friday": monday_friday_pattern,
+    "streaks": absence_streaks,
+    "rolling": rolling_absence_rate,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attendance analytics reports")
+    sub = parser.add_subparsers(dest="report", required=True)
+    p = sub.add_parser("absence-rate")
+    p.add_argument("--by", choices=GROUP_BY, default="manager")
+    p = sub.add_parser("monday-friday")
+    p.add_argument("--min-absences", type=int, default=3)
+    p.add_argument("--threshold", type=float, default=0.6)
+    p = sub.add_parser("streaks")
+    p.add_argument("--min-length", type=int, default=3)
+    p = sub.add_parser("rolling")
+    p.add_argument("--window", type=int, default=7)
+    args = vars(parser.parse_args(argv))
+
+    report = args.pop("report")
+    db = TenantSessionLocal()
+    try:
+        frame = load_frame(db)
+    finally:
+        db.close()
+    print(json.dumps(REPORTS[report](frame, **args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, delete, func, text, column, table as table_clause
+from sqlalchemy.engine import Engine
+
+from .db import engine as default_engine
+from .models import AttendanceRecord
+from .partitions import (
+    is_postgres,
+    list_partitions,
+    ensure_partitions,
+    month_start,
+    add_months,
+    partition_existing,
+    partition_name,
+    PARTITIONED_TABLES,
+)
+
+try:  # Optional: Parquet output when pyarrow is installed
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on environment
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Cold storage for old months
+# -----------------------------
+#
+# Months older than the hot window are exported to compressed columnar files
+# (Parquet when pyarrow is available, otherwise gzip'd column-oriented JSON)
+# and removed from the database. A manifest maps each file to its month so
+# readers only open the files that overlap the requested range.
+
+ARCHIVE_ROOT = Path(os.environ.get("ARCHIVE_DIR", Path(__file__).resolve().parent.parent / "archive"))
+ATTENDANCE_ARCHIVE_DIR = ARCHIVE_ROOT / "attendance"
+HOT_MONTHS = int(os.environ.get("ATTENDANCE_HOT_MONTHS", "12"))
+
+MANIFEST_NAME = "manifest.json"
+DELETE_CHUNK = 5000
+
+_ATTENDANCE_COLUMNS = ("id", "emp_id", "day", "status", "source_system", "last_updated_by", "last_updated_at")
+_manifest_cache: Dict[Path, tuple] = {}
+_records_cache: Dict[Path, tuple] = {}
+
+
+def load_manifest(archive_dir: Path) -> dict:
+    path = archive_dir / MANIFEST_NAME
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return {}
+    cached = _manifest_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    manifest = json.loads(path.read_text())
+    _manifest_cache[path] = (mtime, manifest)
+    return manifest
+
+
+def save_manifest(archive_dir: Path, manifest: dict):
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    tmp = archive_dir / (MANIFEST_NAME + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    tmp.replace(archive_dir / MANIFEST_NAME)
+
+
+def unique_name(manifest: dict, base: str, ext: str) -> str:
+    name = f"{base}{ext}"
+    n = 2
+    while name in manifest:
+        name = f"{base}_{n}{ext}"
+        n += 1
+    return name
+
+
+# -----------------------------
+# Attendance
+# -----------------------------
+
+def _write_columns(path: Path, columns: Dict[str, list]):
+    if pq is not None:
+        pq.write_table(pa.table(columns), path, compression="zstd")
+    else:
+        with gzip.open(path, "wt", encoding="utf-8") as fh:
+            json.dump(columns, fh, default=str)
+
+
+def _read_columns(path: Path) -> Dict[str, list]:
+    if path.suffix == ".parquet":
+        if pq is None:
+            raise RuntimeError(f"pyarrow is required to read {path.name}")
+        return pq.read_table(path).to_pydict()
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _partition_columns(name: str) -> list:
+    """Archive columns of one detached partition, typed so status/source codes decode to names."""
+    src = [AttendanceRecord.__table__.c[c] for c in _ATTENDANCE_COLUMNS]
+    part = table_clause(name, *[column(c.name, c.type) for c in src])
+    return [part.c[c.name].label(key) for c, key in zip(src, _ATTENDANCE_COLUMNS)]
+
+
+def _write_attendance_archive(archive_dir: Path, month: date, rows: List[dict]) -> Optional[str]:
+    if not rows:
+        return None
+    manifest = load_manifest(archive_dir).copy()
+    ext = ".parquet" if pq is not None else ".json.gz"
+    name = unique_name(manifest, partition_name("attendance_records", month), ext)
+
+    columns = {col: [r[col] for r in rows] for col in _ATTENDANCE_COLUMNS}
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    _write_columns(archive_dir / name, columns)
+
+    manifest[name] = {"month": month.isoformat(), "rows": len(rows)}
+    save_manifest(archive_dir, manifest)
+    return name
+
+
+def archive_attendance(
+    before: date, engine: Engine = default_engine, archive_dir: Path = ATTENDANCE_ARCHIVE_DIR
+) -> List[str]:
+    """Move every full month of attendance older than `before` into columnar archive files."""
+    cutoff = month_start(before)
+    written = []
+
+    if is_postgres(engine):
+        for table, month in list_partitions(engine, "attendance_records"):
+            if month >= cutoff:
+                continue
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE attendance_records DETACH PARTITION {table}"))
+                part = _partition_columns(table)
+                rows = [dict(r._mapping) for r in conn.execute(
+                    select(*part).order_by(part[1], part[2])
+                )]
+                conn.execute(text(f"DROP TABLE {table}"))
+                name = _write_attendance_archive(archive_dir, month, rows)
+            if name:
+                written.append(name)
+            logger.info("Archived partition %s (%d rows)", table, len(rows))
+        return written
+
+    # SQLite: one hot table; export month by month and delete in bounded chunks
+    cols = [AttendanceRecord.__table__.c[c].label(c) for c in _ATTENDANCE_COLUMNS]
+    with engine.connect() as conn:
+        oldest = conn.execute(select(func.min(AttendanceRecord.day))).scalar()
+    if oldest is None:
+        return written
+
+    month = month_start(oldest)
+    while month < cutoff:
+        with engine.begin() as conn:
+            rows = [dict(r._mapping) for r in conn.execute(
+                select(*cols)
+                .where(AttendanceRecord.day >= month, AttendanceRecord.day < add_months(month, 1))
+                .order_by(AttendanceRecord.emp_id, AttendanceRecord.day)
+            )]
+            ids = [r["id"] for r in rows]
+            for i in range(0, len(ids), DELETE_CHUNK):
+                conn.execute(delete(AttendanceRecord).where(AttendanceRecord.id.in_(ids[i:i + DELETE_CHUNK])))
+            # Written last so a failed export rolls the deletes back
+            name = _write_attendance_archive(archive_dir, month, rows)
+        if name:
+            written.append(name)
+            logger.info("Archived attendance month %s (%d rows)", month, len(rows))
+        month = add_months(month, 1)
+    return written
+
+
+def read_archived_attendance(
+    emp_id: str, start: date, end: date, archive_dir: Path = ATTENDANCE_ARCHIVE_DIR
+) -> List[dict]:
+    """Archived attendance rows for one employee in [start, end], ordered by day."""
+    first, last = month_start(start), month_start(end)
+    rows = []
+    for name, meta in sorted(load_manifest(archive_dir).items()):
+        month = date.fromisoformat(meta["month"])
+        if not (first <= month <= last):
+            continue
+        cols = _read_columns(archive_dir / name)
+        for i, row_emp in enumerate(cols["emp_id"]):
+            if row_emp != emp_id:
+                continue
+            day = cols["day"][i]
+            day = day if isinstance(day, date) else date.fromisoformat(day)
+            if start <= day <= end:
+                rows.append({c: cols[c][i] for c in _ATTENDANCE_COLUMNS} | {"day": day})
+    rows.sort(key=lambda r: r["day"])
+    return rows
+
+
+def archived_months(archive_dir: Path = ATTENDANCE_ARCHIVE_DIR) -> set:
+    return {date.fromisoformat(meta["month"]) for meta in load_manifest(archive_dir).values()}
+
+
+def archive_version(archive_dir: Path = ATTENDANCE_ARCHIVE_DIR) -> tuple:
+    """Changes whenever a month is archived; cheap enough to fold into cache fingerprints."""
+    return tuple(sorted(load_manifest(archive_dir)))
+
+
+def read_archived_records(
+    months: Optional[set] = None, archive_dir: Path = ATTENDANCE_ARCHIVE_DIR
+) -> List[Tuple[str, str, str]]:
+    """(emp_id, ISO day, status name) for every archived record, or only those in `months`.
+
+    Whole-archive reads (the analytics frame) are cached until the manifest changes.
+    """
+    manifest = load_manifest(archive_dir)
+    if months is None:
+        cached = _records_cache.get(archive_dir)
+        if cached and cached[0] == manifest:
+            return cached[1]
+    rows = []
+    for name, meta in sorted(manifest.items()):
+        if months is not None and date.fromisoformat(meta["month"]) not in months:
+            continue
+        cols = _read_columns(archive_dir / name)
+        # Parquet gives dates back, the JSON fallback ISO strings
+        rows.extend(zip(cols["emp_id"], (str(d)[:10] for d in cols["day"]), cols["status"]))
+    if months is None:
+        _records_cache[archive_dir] = (manifest, rows)
+    return rows
+
+
+def maintain(engine: Engine = default_engine, hot_months: int = HOT_MONTHS) -> List[str]:
+    """Cron entry point: pre-create upcoming partitions and archive months past the hot window."""
+    for table in ("attendance_records", "audit_events"):
+        ensure_partitions(engine, table)
+    return archive_attendance(add_months(month_start(date.today()), -hot_months), engine=engine)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attendance partition maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("maintain", help="Create future partitions and archive months past the hot window")
+    sub.add_parser("partition", help="Convert tables created before partitioning into partitioned tables (PostgreSQL)")
+    archive_cmd = sub.add_parser("archive", help="Archive attendance months older than --before")
+    archive_cmd.add_argument("--before", type=date.fromisoformat, required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "partition":
+        for table in PARTITIONED_TABLES:
+            print(f"{table}: {partition_existing(default_engine, table)} rows moved")
+        return
+    if args.command == "maintain":
+        names = maintain()
+    else:
+        names = archive_attendance(args.before)
+    for name in names:
+        print(f"Archived {name}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
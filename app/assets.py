@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+
+try:  # Optional: brotli variants when the brotli package is installed
+    import brotli
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Static asset pipeline
+# -----------------------------
+#
+# `python -m app.assets build` minifies CSS/JS from app/static, copies icons,
+# and writes each file to static/dist/ under a content-hashed name
+# (css/mobile.3f9a0c1d2e.css), along with .gz/.br variants and
+# dist/assets.json mapping logical names to hashed ones. Templates call
+# asset_url("css/mobile.css"). Hashed files never change, so they are served
+# with `immutable`; anything else is revalidated with its ETag. Without a build,
+# asset_url falls back to the unhashed source file.
+#
+# A build never empties dist/: each file is written under a temporary name and
+# renamed into place, and assets.json is replaced last. Workers serving the
+# previous manifest keep finding its files, and a worker building at startup
+# can't break one that is already serving. `build --prune` removes files the
+# new manifest no longer references; run it once no page points at them.
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_NAME = "assets.json"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = {".css", ".js", ".json", ".svg", ".html"}
+HASHED = {".css", ".js", ".json", ".png", ".svg", ".ico", ".webp"}
+
+# Pages whose shell the service worker keeps for offline starts
+SHELL_PAGES = ("/mobile",)
+SHELL_ASSETS = ("css/mobile.css", "js/mobile.js", "manifest.json", "icon-192.png", "icon-512.png")
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE = re.compile(r"\s*([{};,])\s*")
+
+
+def minify_css(source: str) -> str:
+    css = _CSS_COMMENT.sub("", source)
+    css = re.sub(r"\s+", " ", css)
+    css = _CSS_SPACE.sub(r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_js(source: str) -> str:
+    # Conservative: trims indentation, blank lines and whole-line // comments,
+    # never touches anything inside a line (strings, regexes, URLs)
+    lines = (line.strip() for line in source.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//")) + "\n"
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _hashed_name(logical: str, data: bytes) -> str:
+    path = Path(logical)
+    return str(path.with_name(f"{path.stem}.{_content_hash(data)}{path.suffix}"))
+
+
+def _replace(target: Path, data: bytes):
+    """Write target so readers see either the old file or the complete new one."""
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _write(dist_dir: Path, name: str, data: bytes):
+    target = dist_dir / name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    _replace(target, data)
+    if target.suffix in COMPRESSIBLE:
+        # mtime=0 keeps the .gz byte-identical across builds
+        _replace(target.parent / (target.name + ".gz"), gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _replace(target.parent / (target.name + ".br"), brotli.compress(data, quality=11))
+
+
+def _prune(dist_dir: Path, mapping: Dict[str, str]) -> int:
+    """Delete built files (and their variants) that the manifest no longer names."""
+    keep = {MANIFEST_NAME} | set(mapping.values())
+    removed = 0
+    for path in dist_dir.rglob("*"):
+        name = path.relative_to(dist_dir).as_posix()
+        # Dot-files are another build's temporaries
+        if path.is_file() and not path.name.startswith(".") and name not in keep and name.removesuffix(".gz").removesuffix(".br") not in keep:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def build(static_dir: Path = STATIC_DIR, dist_dir: Optional[Path] = None, prune: bool = False) -> Dict[str, str]:
+    """Build dist/ from static_dir; returns {logical name: hashed name}."""
+    dist_dir = dist_dir or static_dir / "dist"
+    dist_dir.mkdir(parents=True, exist_ok=True)
+
+    sources = sorted(
+        p for p in static_dir.rglob("*")
+        if p.is_file() and dist_dir not in p.parents and p.suffix in HASHED
+    )
+    mapping: Dict[str, str] = {}
+    # Web app manifests reference icons, so they are rewritten after everything else
+    manifests = [p for p in sources if p.name == "manifest.json"]
+    for path in sources:
+        if path in manifests:
+            continue
+        logical = path.relative_to(static_dir).as_posix()
+        data = path.read_bytes()
+        if path.suffix == ".css":
+            data = minify_css(data.decode("utf-8")).encode("utf-8")
+        elif path.suffix == ".js":
+            data = minify_js(data.decode("utf-8")).encode("utf-8")
+        mapping[logical] = _hashed_name(logical, data)
+        _write(dist_dir, mapping[logical], data)
+
+    for path in manifests:
+        logical = path.relative_to(static_dir).as_posix()
+        manifest = json.loads(path.read_text("utf-8"))
+        for icon in manifest.get("icons", []):
+            src = icon.get("src", "")
+            if src.startswith("/static/") and src[len("/static/"):] in mapping:
+                icon["src"] = "/static/dist/" + mapping[src[len("/static/"):]]
+        data = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+        mapping[logical] = _hashed_name(logical, data)
+        _write(dist_dir, mapping[logical], data)
+
+    # Last, so the manifest never names a file that isn't there yet
+    _replace(dist_dir / MANIFEST_NAME, json.dumps(mapping, indent=2, sort_keys=True).encode("utf-8"))
+    if prune:
+        _prune(dist_dir, mapping)
+    return mapping
+
+
+class AssetManifest:
+    """Logical -> hashed asset names, reloaded when dist/assets.json changes."""
+
+    def __init__(self, dist_dir: Path = DIST_DIR):
+        self.dist_dir = dist_dir
+        self._mtime: Optional[float] = None
+        self._mapping: Dict[str, str] = {}
+
+    @property
+    def mapping(self) -> Dict[str, str]:
+        path = self.dist_dir / MANIFEST_NAME
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            self._mtime, self._mapping = None, {}
+            return self._mapping
+        if mtime != self._mtime:
+            self._mapping = json.loads(path.read_text("utf-8"))
+            self._mtime = mtime
+        return self._mapping
+
+    @property
+    def version(self) -> str:
+        return _content_hash(json.dumps(self.mapping, sort_keys=True).encode("utf-8"))
+
+    def url(self, logical: str) -> str:
+        hashed = self.mapping.get(logical)
+        return f"/static/dist/{hashed}" if hashed else f"/static/{logical}"
+
+
+asset_manifest = AssetManifest()
+
+
+def asset_url(logical: str) -> str:
+    return asset_manifest.url(logical)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """{coding: q} from an Accept-Encoding header; malformed q values count as 0."""
+    accepted: Dict[str, float] = {}
+    for item in header.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def _quality(accepted: Dict[str, float], encoding: str) -> float:
+    # x-gzip is the historical alias; "*" covers codings not listed by name
+    if encoding in accepted:
+        return accepted[encoding]
+    if encoding == "gzip" and "x-gzip" in accepted:
+        return accepted["x-gzip"]
+    return accepted.get("*", 0.0)
+
+
+class AssetStaticFiles(StaticFiles):
+    """StaticFiles with immutable caching for hashed files and precompressed variants."""
+
+    async def get_response(self, path: str, scope):
+        response = await self._precompressed(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+        path = path.replace("\\", "/")
+        hashed = path.startswith("dist/") and not path.endswith(MANIFEST_NAME)
+        response.headers["Cache-Control"] = IMMUTABLE if hashed else REVALIDATE
+        if Path(path).suffix in COMPRESSIBLE:
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    async def _precompressed(self, path: str, scope):
+        if scope["method"] not in ("GET", "HEAD") or Path(path).suffix not in COMPRESSIBLE:
+            return None
+        accepted = parse_accept_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        candidates = [(_quality(accepted, encoding), encoding, suffix) for encoding, suffix in (("br", ".br"), ("gzip", ".gz"))]
+        # Highest q first; the sort is stable, so br wins a tie
+        candidates.sort(key=lambda c: -c[0])
+        for q, encoding, suffix in candidates:
+            if q <= 0:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result is None:
+                continue
+            # FileResponse guesses the media type of "x.css.br" as text/css
+            response = self.file_response(full_path, stat_result, scope)
+            response.headers["Content-Encoding"] = encoding
+            return response
+        return None
+
+
+SERVICE_WORKER_JS = """\
+// Generated by app/assets.py (asset version %(version)s)
+const CACHE = 'attendance-shell-%(version)s';
+const PRECACHE = %(precache)s;
+const SHELL = %(shell)s;
+const NETWORK_TIMEOUT_MS = 3000;
+
+self.addEventListener('install', event => {
+    event.waitUntil(caches.open(CACHE).then(cache => cache.addAll(PRECACHE.concat(SHELL))).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(caches.keys()
+        .then(keys => Promise.all(keys.filter(k => k.startsWith('attendance-shell-') && k !== CACHE).map(k => caches.delete(k))))
+        .then(() => self.clients.claim()));
+});
+
+function networkFirst(request) {
+    return caches.open(CACHE).then(cache => {
+        const network = fetch(request).then(response => {
+            if (response.ok) cache.put(request, response.clone());
+            return response;
+        });
+        const timeout = new Promise(resolve => setTimeout(resolve, NETWORK_TIMEOUT_MS));
+        const cached = timeout.then(() => cache.match(request));
+        return Promise.race([network, cached.then(hit => hit || network)])
+            .catch(() => cache.match(request));
+    });
+}
+
+self.addEventListener('fetch', event => {
+    const url = new URL(event.request.url);
+    if (event.request.method !== 'GET' || url.origin !== self.location.origin) return;
+    if (url.pathname.startsWith('/static/dist/')) {
+        // Hashed, immutable: cache first
+        event.respondWith(caches.match(event.request).then(hit => hit || fetch(event.request).then(response => {
+            const copy = response.clone();
+            caches.open(CACHE).then(cache => cache.put(event.request, copy));
+            return response;
+        })));
+    } else if (SHELL.includes(url.pathname)) {
+        event.respondWith(networkFirst(event.request));
+    }
+});
+"""
+
+
+def service_worker_js() -> str:
+    precache = [asset_url(name) for name in SHELL_ASSETS]
+    return SERVICE_WORKER_JS % {
+        "version": asset_manifest.version,
+        "precache": json.dumps(precache),
+        "shell": json.dumps(list(SHELL_PAGES)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build hashed, minified, precompressed static assets")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build")
+    build_cmd.add_argument("--prune", action="store_true", help="delete built files the new manifest no longer uses")
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        mapping = build(prune=args.prune)
+        for logical, hashed in sorted(mapping.items()):
+            print(f"{logical} -> dist/{hashed}")
+        if brotli is None:
+            print("brotli not installed; wrote gzip variants only")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import event, insert, select, delete, text, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal, engine as default_engine
+from .models import AuditEvent
+from .partitions import is_postgres, list_partitions, month_start, add_months, partition_name
+from .archive import ARCHIVE_ROOT, load_manifest, save_manifest, unique_name
+from .sharding import TenantSessionLocal, execute_bulk
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Audit log storage
+# -----------------------------
+#
+# Audit events are append-only. Writes are staged on the session and inserted
+# as one executemany statement at commit; old months are moved out of the
+# database into gzip NDJSON files that `read_archived_audit` can still query.
+
+ARCHIVE_DIR = Path(os.environ.get("AUDIT_ARCHIVE_DIR", ARCHIVE_ROOT / "audit"))
+DELETE_CHUNK = 5000
+
+_BUFFER_KEY = "audit_buffer"
+_COLUMNS = ("id", "request_id", "actor_emp_id", "action", "comment", "created_at")
+
+
+def stage_audit(db: Session, request_id: int, actor_emp_id: Optional[str], action: str, comment: Optional[str] = None):
+    """Queue an audit row; it is written together with the rest of the transaction."""
+    db.info.setdefault(_BUFFER_KEY, []).append({
+        "request_id": request_id,
+        "actor_emp_id": actor_emp_id,
+        "action": action,
+        "comment": comment,
+        "created_at": datetime.utcnow(),
+    })
+
+
+def _write_staged_audit(session: Session):
+    rows = session.info.pop(_BUFFER_KEY, None)
+    if rows:
+        session.flush()  # parent requests must exist before their audit rows
+        execute_bulk(session, insert(AuditEvent), AuditEvent, rows)
+
+
+def _discard_staged_audit(session: Session):
+    session.info.pop(_BUFFER_KEY, None)
+
+
+for _factory in {SessionLocal, TenantSessionLocal}:
+    event.listen(_factory, "before_commit", _write_staged_audit)
+    event.listen(_factory, "after_rollback", _discard_staged_audit)
+
+
+def install_append_only_guard(engine: Engine):
+    """Reject UPDATEs on audit_events at the database level."""
+    with engine.begin() as conn:
+        if is_postgres(engine):
+            conn.execute(text(
+                "CREATE OR REPLACE FUNCTION audit_events_append_only() RETURNS trigger AS $$ "
+                "BEGIN RAISE EXCEPTION 'audit_events is append-only'; END $$ LANGUAGE plpgsql"
+            ))
+            conn.execute(text("DROP TRIGGER IF EXISTS audit_events_no_update ON audit_events"))
+            conn.execute(text(
+                "CREATE TRIGGER audit_events_no_update BEFORE UPDATE ON audit_events "
+                "FOR EACH ROW EXECUTE FUNCTION audit_events_append_only()"
+            ))
+        else:
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS audit_events_no_update BEFORE UPDATE ON audit_events "
+                "BEGIN SELECT RAISE(ABORT, 'audit_events is append-only'); END"
+            ))
+
+
+# -----------------------------
+# Archival
+# -----------------------------
+
+def _write_archive(archive_dir: Path, month: date, rows: List[dict]) -> Optional[str]:
+    if not rows:
+        return None
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(archive_dir).copy()
+    name = unique_name(manifest, partition_name("audit_events", month), ".ndjson.gz")
+
+    with gzip.open(archive_dir / name, "wt", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write(json.dumps(row, default=str) + "\n")
+
+    request_ids = [r["request_id"] for r in rows]
+    manifest[name] = {
+        "month": month.isoformat(),
+        "rows": len(rows),
+        "min_request_id": min(request_ids),
+        "max_request_id": max(request_ids),
+    }
+    save_manifest(archive_dir, manifest)
+    return name
+
+
+def archive_audit(before: date, engine: Engine = default_engine, archive_dir: Path = ARCHIVE_DIR) -> List[str]:
+    """Move every full month of audit events older than `before` into archive files."""
+    cutoff = month_start(before)
+    written = []
+
+    if is_postgres(engine):
+        for table, month in list_partitions(engine, "audit_events"):
+            if month >= cutoff:
+                continue
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE audit_events DETACH PARTITION {table}"))
+                rows = [dict(r._mapping) for r in conn.execute(
+                    text(f"SELECT {', '.join(_COLUMNS)} FROM {table} ORDER BY created_at, id")
+                )]
+                conn.execute(text(f"DROP TABLE {table}"))
+                name = _write_archive(archive_dir, month, rows)
+            if name:
+                written.append(name)
+            logger.info("Archived partition %s (%d rows)", table, len(rows))
+        return written
+
+    # SQLite fallback: export month by month, then delete in bounded chunks
+    cols = [AuditEvent.__table__.c[c] for c in _COLUMNS]
+    with engine.connect() as conn:
+        oldest = conn.execute(select(func.min(AuditEvent.created_at))).scalar()
+    if oldest is None:
+        return written
+
+    month = month_start(oldest.date())
+    while month < cutoff:
+        lo = datetime.combine(month, datetime.min.time())
+        hi = datetime.combine(add_months(month, 1), datetime.min.time())
+        with engine.begin() as conn:
+            rows = [dict(r._mapping) for r in conn.execute(
+                select(*cols)
+                .where(AuditEvent.created_at >= lo, AuditEvent.created_at < hi)
+                .order_by(AuditEvent.created_at, AuditEvent.id)
+            )]
+            ids = [r["id"] for r in rows]
+            for i in range(0, len(ids), DELETE_CHUNK):
+                conn.execute(delete(AuditEvent).where(AuditEvent.id.in_(ids[i:i + DELETE_CHUNK])))
+            # Written last so a failed export rolls the deletes back
+            name = _write_archive(archive_dir, month, rows)
+        if name:
+            written.append(name)
+            logger.info("Archived audit month %s (%d rows)", month, len(rows))
+        month = add_months(month, 1)
+    return written
+
+
+def read_archived_audit(request_id: int, archive_dir: Path = ARCHIVE_DIR) -> List[dict]:
+    """Return archived audit rows for one request, skipping files that cannot contain it."""
+    events = []
+    for name, meta in sorted(load_manifest(archive_dir).items()):
+        if not (meta["min_request_id"] <= request_id <= meta["max_request_id"]):
+            continue
+        with gzip.open(archive_dir / name, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                row = json.loads(line)
+                if row["request_id"] == request_id:
+                    events.append(row)
+    return events
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit log maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    archive_cmd = sub.add_parser("archive", help="Archive audit months older than --before")
+    archive_cmd.add_argument("--before", type=date.fromisoformat, required=True)
+    archive_cmd.add_argument("--dir", type=Path, default=ARCHIVE_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "archive":
+        for name in archive_audit(args.before, archive_dir=args.dir):
+            print(f"Archived {name}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
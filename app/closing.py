@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import Date, DateTime, SmallInteger, String, case, exists, insert, literal, select, text
+from sqlalchemy.orm import Session
+
+from .codes import known_source
+from .db import SessionLocal
+from .models import ATTENDANCE_STATUS_CODES, AttendanceRecord, Employee
+from .partitions import is_postgres
+from .rules import Calendar, get_rule_engine
+from .sharding import shard_router
+from .timesheets import timesheet_cache
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# End-of-day closing
+# -----------------------------
+#
+# Every employee-day without a record is written as ABSENT, HOLIDAY or
+# WEEKLY_OFF (by the location's `non_working_day` rule), so reports read
+# records instead of re-deriving gaps. Each day is one set-based
+# INSERT ... SELECT: active employees anti-joined (NOT EXISTS) against that
+# day's records, with the status picked per location by a CASE. Days commit
+# one by one, so an interrupted run resumes where it stopped and re-running a
+# closed day inserts nothing. A later mark or approved correction overwrites
+# the closing record like any other.
+
+SOURCE_SYSTEM = known_source("SYSTEM_AUTO")
+# Days before yesterday re-checked on every run, in case a run was missed
+LOOKBACK_DAYS = int(os.environ.get("CLOSING_LOOKBACK_DAYS", "7"))
+# Local time of the daily run (closes through yesterday); empty disables it
+SCHEDULE = os.environ.get("CLOSING_SCHEDULE", "00:30")
+_LOCK_KEY = 0x636C6F73  # pg_advisory_xact_lock key shared by all workers
+
+
+def calendar_status(calendar: Calendar, day: date) -> str:
+    """Status of an unmarked day under a (weekend, holidays) calendar."""
+    weekend, holidays = calendar
+    if (day.month, day.day) in holidays:
+        return "HOLIDAY"
+    if day.weekday() in weekend:
+        return "WEEKLY_OFF"
+    return "ABSENT"
+
+
+def expected_status(location: Optional[str], day: date) -> str:
+    """What closing writes for an employee at `location` who has no record on `day`."""
+    return calendar_status(get_rule_engine().calendar(location), day)
+
+
+def _status_code(day: date):
+    """SQL expression: the closing status code for employees.location on `day`."""
+    engine = get_rule_engine()
+    default = ATTENDANCE_STATUS_CODES[calendar_status(engine.calendar(None), day)]
+    overrides = {}
+    for location in engine.config.get("locations", {}):
+        code = ATTENDANCE_STATUS_CODES[calendar_status(engine.calendar(location), day)]
+        if code != default:
+            overrides[location] = code
+    if not overrides:
+        return literal(default, SmallInteger)
+    return case(overrides, value=Employee.location, else_=literal(default, SmallInteger))
+
+
+def close_day(db: Session, day: date) -> int:
+    """Insert the missing records for one day in one statement; commits. Returns rows inserted."""
+    records = AttendanceRecord.__table__
+    now = datetime.utcnow()
+    missing = (
+        select(
+            Employee.emp_id,
+            literal(day, Date),
+            _status_code(day),
+            literal(SOURCE_SYSTEM, records.c.source_system.type),
+            literal(SOURCE_SYSTEM, String),
+            literal(now, DateTime),
+        )
+        .where(
+            Employee.is_active,
+            ~exists().where(records.c.emp_id == Employee.emp_id, records.c.day == day),
+        )
+    )
+    stmt = insert(records).from_select(
+        [records.c.emp_id, records.c.day, records.c.status, records.c.source_system,
+         records.c.last_updated_by, records.c.last_updated_at],
+        missing,
+    )
+    try:
+        if is_postgres(db.get_bind()):
+            # Two workers closing the same day would both see the gap
+            db.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _LOCK_KEY})
+        inserted = db.execute(stmt).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return inserted
+
+
+def close_days(since: date, through: date) -> dict:
+    """Close every day in [since, through] on every database that holds employees."""
+    if through < since:
+        raise ValueError("through must be on or after since")
+    started = time.perf_counter()
+    days = [since + timedelta(days=i) for i in range((through - since).days + 1)]
+
+    def run(db: Session) -> Dict[str, int]:
+        return {d.isoformat(): close_day(db, d) for d in days}
+
+    if shard_router is not None:
+        per_db = shard_router.fan_out(lambda name, db: run(db))
+    else:
+        db = SessionLocal()
+        try:
+            per_db = {"primary": run(db)}
+        finally:
+            db.close()
+
+    by_day = {d.isoformat(): sum(counts[d.isoformat()] for counts in per_db.values()) for d in days}
+    inserted = sum(by_day.values())
+    if inserted:
+        timesheet_cache.invalidate(since, through)
+    summary = {
+        "since": since.isoformat(),
+        "through": through.isoformat(),
+        "inserted": inserted,
+        "days": by_day,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info("Closed %s..%s: %d records in %.3fs", since, through, inserted, summary["seconds"])
+    return summary
+
+
+def default_window(today: Optional[date] = None) -> tuple:
+    through = (today or date.today()) - timedelta(days=1)
+    return through - timedelta(days=LOOKBACK_DAYS - 1), through
+
+
+# -----------------------------
+# Daily schedule
+# -----------------------------
+
+class ClosingJob:
+    def __init__(self, schedule: str = SCHEDULE):
+        self.schedule = schedule
+        self.last_run: Optional[dict] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def run(self, since: Optional[date] = None, through: Optional[date] = None) -> dict:
+        default_since, default_through = default_window()
+        with self._lock:  # one run at a time per worker
+            summary = close_days(since or default_since, through or default_through)
+            self.last_run = {**summary, "finished_at": datetime.utcnow().isoformat()}
+            self.last_error = None
+        return summary
+
+    def _seconds_until_next(self) -> float:
+        at = datetime.strptime(self.schedule, "%H:%M").time()
+        now = datetime.now()
+        target = datetime.combine(now.date(), at)
+        if target <= now:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+
+    def start(self):
+        if not self.schedule or (self._thread and self._thread.is_alive()):
+            return
+        self._seconds_until_next()  # fail at startup on a bad CLOSING_SCHEDULE
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="closing-job", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self._seconds_until_next()):
+            try:
+                self.run()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("End-of-day closing failed")
+
+    def stats(self) -> dict:
+        return {"schedule": self.schedule or None, "last_run": self.last_run, "last_error": self.last_error}
+
+
+closing_job = ClosingJob()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-of-day closing: record ABSENT/HOLIDAY/WEEKLY_OFF for unmarked days")
+    default_since, default_through = default_window()
+    parser.add_argument("--since", type=date.fromisoformat, default=default_since)
+    parser.add_argument("--through", type=date.fromisoformat, default=default_through)
+    args = parser.parse_args(argv)
+    print(json.dumps(close_days(args.since, args.through), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
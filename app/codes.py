@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import SmallInteger, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.types import TypeDecorator
+
+from .db import Base, engine as default_engine
+from .partitions import is_postgres
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Compact status codes
+# -----------------------------
+#
+# Status-like columns are stored as SMALLINT codes instead of a varchar repeated
+# on every row. The ORM still reads and writes the string names, so queries
+# such as `AttendanceRecord.status == "PRESENT"` and the API are unchanged.
+# Closed sets (the enums in app/models.py) have fixed codes listed next to the
+# enum; codes are append-only and never renumbered. Attendance sources are
+# open-ended, so they get a lookup table (`source_systems`) instead.
+#
+# `python -m app.codes migrate` converts a database created with the old
+# varchar columns, in batches.
+
+BATCH_SIZE = 50_000
+
+
+class CodeType(TypeDecorator):
+    """A string enum stored as a SMALLINT code."""
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, codes: Dict[str, int], enum=None):
+        super().__init__()
+        if enum is not None:
+            missing = sorted({m.value for m in enum} - set(codes))
+            if missing:
+                raise ValueError(f"No code for {enum.__name__} members: {', '.join(missing)}")
+        if len(set(codes.values())) != len(codes):
+            raise ValueError("Codes must be unique")
+        self.codes = tuple(sorted(codes.items()))  # hashable, for the statement cache key
+        self.enum = enum
+        self._by_name = dict(codes)
+        self._by_code = {code: name for name, code in codes.items()}
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        name = getattr(value, "value", value)
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise ValueError(f"Unknown value {name!r}; expected one of {', '.join(self._by_name)}") from None
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self._by_code.get(value, f"#{value}")
+
+
+# Registered up front so the common sources never need a write on the hot path.
+# Modules that write records declare their own source with known_source(), so
+# a new writer can't be left out of this list.
+_KNOWN_SOURCES: List[str] = [
+    "SAP_MOCK", "HRMS_PORTAL",
+    "BIOMETRIC_GATE_MAIN", "BIOMETRIC_GATE_1", "CARD_INT_05", "TEAMS_APP", "WIFI_LOGIN_FL3",
+]
+
+
+def known_source(name: str) -> str:
+    """Declare a source this code writes so it is registered at startup; returns the name."""
+    if name not in _KNOWN_SOURCES:
+        _KNOWN_SOURCES.append(name)
+    return name
+
+
+def known_sources() -> Tuple[str, ...]:
+    return tuple(_KNOWN_SOURCES)
+
+
+class SourceRegistry:
+    """name <-> code for `source_systems`, cached per process.
+
+    An unknown name is registered on first use through its own connection. On
+    SQLite that connection waits for any write transaction already open in this
+    process, so register new integrations up front (`python -m app.codes
+    register NAME`) rather than relying on the first write.
+    """
+
+    def __init__(self, engine: Engine = default_engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._by_name: Dict[str, int] = {}
+        self._by_code: Dict[int, str] = {}
+        self._loaded = False
+
+    def load(self):
+        with self._lock:
+            self._read()
+            known = known_sources()
+            if not set(known) <= set(self._by_name):
+                self._insert_missing(known)
+                self._read()
+            self._loaded = True
+
+    def _read(self):
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("SELECT code, name FROM source_systems")).all()
+        self._by_name = {name: code for code, name in rows}
+        self._by_code = {code: name for code, name in rows}
+
+    def _insert_missing(self, names: Iterable[str]):
+        names = [n for n in dict.fromkeys(names) if n not in self._by_name]
+        if not names:
+            return
+        dialect = postgresql if is_postgres(self.engine) else sqlite
+        stmt = dialect.insert(Base.metadata.tables["source_systems"]).on_conflict_do_nothing(index_elements=["name"])
+        with self.engine.begin() as conn:
+            conn.execute(stmt, [{"name": n} for n in names])
+
+    def register(self, names: Iterable[str]) -> Dict[str, int]:
+        names = list(names)
+        with self._lock:
+            self._insert_missing(names)
+            self._read()
+            self._loaded = True
+        return {n: self._by_name[n] for n in names}
+
+    def code(self, name: str) -> int:
+        code = self._by_name.get(name)
+        if code is None:
+            if not self._loaded:
+                self.load()
+                code = self._by_name.get(name)
+            if code is None:
+                code = self.register([name])[name]
+        return code
+
+    def name(self, code: int) -> str:
+        name = self._by_code.get(code)
+        if name is None:
+            # Registered by another worker since we last read the table
+            with self._lock:
+                self._read()
+                self._loaded = True
+            name = self._by_code.get(code, f"#{code}")
+        return name
+
+    def names(self) -> Dict[int, str]:
+        if not self._loaded:
+            self.load()
+        return dict(self._by_code)
+
+
+source_codes = SourceRegistry()
+
+
+class SourceCodeType(TypeDecorator):
+    """An open-ended source name stored as a SMALLINT code from `source_systems`."""
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else source_codes.code(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else source_codes.name(value)
+
+
+# -----------------------------
+# Migration from varchar columns
+# -----------------------------
+
+def _conversions() -> Dict[str, List[Tuple[str, str, Optional[Dict[str, int]]]]]:
+    """table -> [(old varchar column, new code column, codes or None for sources)]."""
+    from .models import AttendanceChangeRequest, AttendanceRecord
+
+    out: Dict[str, list] = {}
+    for model in (AttendanceRecord, AttendanceChangeRequest):
+        for attr in model.__table__.columns:
+            if isinstance(attr.type, (CodeType, SourceCodeType)) and attr.name != attr.key:
+                codes = dict(attr.type.codes) if isinstance(attr.type, CodeType) else None
+                out.setdefault(model.__tablename__, []).append((attr.key, attr.name, codes))
+    return out
+
+
+def _case(old: str, codes: Dict[str, int]) -> str:
+    # Values come from our own code tables / source names, but quote them properly anyway
+    whens = " ".join(f"WHEN '{name.replace(chr(39), chr(39) * 2)}' THEN {code}" for name, code in codes.items())
+    return f"CASE {old} {whens} END" if whens else "NULL"
+
+
+def migrate_table(engine: Engine, table: str, conversions, batch_size: int = BATCH_SIZE) -> int:
+    """Convert one table; safe to re-run after an interruption. Returns rows converted."""
+    insp = inspect(engine)
+    existing = {c["name"] for c in insp.get_columns(table)}
+    todo = [(old, new, codes) for old, new, codes in conversions if old in existing]
+    if not todo:
+        return 0
+
+    with engine.begin() as conn:
+        for old, new, codes in todo:
+            if new not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {new} SMALLINT"))
+
+    # Open-ended sources: register every distinct value first
+    mapping = {}
+    for old, new, codes in todo:
+        if codes is None:
+            with engine.connect() as conn:
+                names = [r[0] for r in conn.execute(text(f"SELECT DISTINCT {old} FROM {table} WHERE {old} IS NOT NULL"))]
+            codes = source_codes.register(names)
+        mapping[old] = (new, codes)
+
+    sets = ", ".join(f"{new} = {_case(old, codes)}" for old, (new, codes) in mapping.items())
+    first_new = next(iter(mapping.values()))[0]
+    with engine.connect() as conn:
+        lo, hi = conn.execute(text(f"SELECT MIN(id), MAX(id) FROM {table} WHERE {first_new} IS NULL")).one()
+    converted = 0
+    if lo is not None:
+        started = time.perf_counter()
+        for start in range(lo, hi + 1, batch_size):
+            with engine.begin() as conn:
+                converted += conn.execute(text(
+                    f"UPDATE {table} SET {sets} WHERE id >= :lo AND id < :hi AND {first_new} IS NULL"
+                ), {"lo": start, "hi": start + batch_size}).rowcount
+            logger.info("%s: converted ids < %d (%d rows, %.1fs)", table, start + batch_size, converted,
+                        time.perf_counter() - started)
+
+    # Anything left unconverted has a value without a code; keep the old column until it is fixed
+    with engine.connect() as conn:
+        for old, (new, codes) in mapping.items():
+            bad = conn.execute(text(
+                f"SELECT {old}, COUNT(*) FROM {table} WHERE {new} IS NULL AND {old} IS NOT NULL GROUP BY {old}"
+            )).all()
+            if bad:
+                raise ValueError(f"{table}.{old} has values without a code: {dict(bad)}")
+
+    # Swap: drop indexes on the old columns, drop the columns, build the model's indexes
+    olds = set(mapping)
+    with engine.begin() as conn:
+        for idx in insp.get_indexes(table):
+            if olds & set(idx["column_names"]):
+                conn.execute(text(f"DROP INDEX {idx['name']}"))
+        for old, (new, codes) in mapping.items():
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {old}"))
+            if is_postgres(engine):
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {new} SET NOT NULL"))
+        for idx in Base.metadata.tables[table].indexes:
+            idx.create(conn, checkfirst=True)
+    logger.info("%s: migrated %s", table, ", ".join(f"{o} -> {n}" for o, (n, _) in mapping.items()))
+    return converted
+
+
+def migrate(engine: Engine = default_engine, batch_size: int = BATCH_SIZE) -> Dict[str, int]:
+    Base.metadata.tables["source_systems"].create(default_engine, checkfirst=True)
+    source_codes.load()
+    return {
+        table: migrate_table(engine, table, conversions, batch_size)
+        for table, conversions in _conversions().items()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact status codes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("migrate", help="Convert varchar status/source columns to codes, in batches")
+    p.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    p = sub.add_parser("register", help="Register attendance source names")
+    p.add_argument("names", nargs="+")
+    sub.add_parser("sources", help="List registered attendance sources")
+    args = parser.parse_args(argv)
+    from . import models  # noqa: F401  (registers the tables)
+
+    if args.command == "migrate":
+        from .sharding import shard_router
+
+        engines = {"primary": default_engine}
+        if shard_router is not None:
+            engines.update(shard_router.engines)
+        for name, eng in engines.items():
+            print(name, migrate(eng, args.batch_size))
+    elif args.command == "register":
+        Base.metadata.tables["source_systems"].create(default_engine, checkfirst=True)
+        for name, code in source_codes.register(args.names).items():
+            print(f"{code:5d}  {name}")
+    elif args.command == "sources":
+        for code, name in sorted(source_codes.names().items()):
+            print(f"{code:5d}  {name}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # Run the imported module's main so the CLI shares the registry the models use
+    from app.codes import main as _main
+
+    _main()
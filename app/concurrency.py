@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from .partitions import is_postgres
+from .sharding import is_sharded, shard_router
+
+# -----------------------------
+# Optimistic concurrency
+# -----------------------------
+#
+# Change requests and attendance records carry a `version` column that the ORM
+# checks and bumps on every UPDATE (`version_id_col`). If a writer commits after
+# reading a row that someone else changed in the meantime, the UPDATE matches no
+# row and the whole transaction rolls back. That includes the records an
+# approval applied and its audit rows, so nothing is applied twice. Two inserts
+# of one employee-day hit the unique (emp_id, day) index instead. Both come
+# back to the caller as a 409 to retry, not as a wait on a lock.
+#
+# On PostgreSQL, approve/reject also read the request FOR UPDATE NOWAIT. A
+# second approver then gets its 409 immediately, rather than after the first
+# one's apply finishes. Background jobs use SKIP LOCKED to pass over rows a
+# request is working on.
+
+_EMP_DAY_INDEX = "uq_attendance_records_emp_day"
+_LOCK_NOT_AVAILABLE = "55P03"
+
+
+class ConflictError(Exception):
+    """A concurrent writer changed the row first; the client should reload and retry."""
+
+
+def is_conflict(exc: Exception) -> bool:
+    if isinstance(exc, StaleDataError):
+        return True
+    orig = getattr(exc, "orig", None)
+    if isinstance(exc, IntegrityError):
+        text = str(orig)
+        # PostgreSQL names the index; SQLite names the columns
+        return _EMP_DAY_INDEX in text or "attendance_records.emp_id, attendance_records.day" in text
+    if isinstance(exc, OperationalError):
+        return getattr(orig, "pgcode", None) == _LOCK_NOT_AVAILABLE
+    return False
+
+
+class ConflictStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+    def record(self, what: str):
+        with self._lock:
+            self._counts[what] = self._counts.get(what, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+conflict_stats = ConflictStats()
+
+
+def conflict(db: Session, exc: Exception, what: str) -> ConflictError:
+    """Roll back and turn a lost race into a ConflictError; re-raises anything else."""
+    db.rollback()
+    if not is_conflict(exc):
+        raise exc
+    conflict_stats.record(what)
+    return ConflictError(f"{what} was changed by another request; reload and retry")
+
+
+def commit_or_conflict(db: Session, what: str):
+    try:
+        db.commit()
+    except (StaleDataError, IntegrityError, OperationalError) as e:
+        raise conflict(db, e, what) from e
+
+
+def _on_postgres(db: Session) -> bool:
+    if is_sharded(db):
+        return is_postgres(next(iter(shard_router.engines.values())))
+    return is_postgres(db.get_bind())
+
+
+def lock_options(db: Session, skip_locked: bool = False) -> dict:
+    """`with_for_update` arguments: NOWAIT (or SKIP LOCKED) on PostgreSQL, nothing elsewhere."""
+    if not _on_postgres(db):
+        return {}
+    return {"skip_locked": True} if skip_locked else {"nowait": True}
+
+
+def get_for_update(db: Session, model, ident, what: str):
+    """db.get that fails fast with ConflictError when another transaction holds the row (PostgreSQL)."""
+    # populate_existing: a copy already in the session may predate a concurrent commit
+    options = lock_options(db)
+    if not options:
+        return db.get(model, ident, populate_existing=True)
+    try:
+        return db.get(model, ident, with_for_update=options, populate_existing=True)
+    except OperationalError as e:
+        raise conflict(db, e, what) from e
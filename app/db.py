@@ -8,20 +8,37 @@ from sqlalchemy.orm import DeclarativeBase, sessionmaker
 
 # Support both PostgreSQL (production) and SQLite (local dev)
 DATABASE_URL = os.environ.get("DATABASE_URL")
+# Optional read replica; GET handlers read from it (see app/replicas.py)
+REPLICA_DATABASE_URL = os.environ.get("REPLICA_DATABASE_URL")
+
+
+def _normalize_url(url: str) -> str:
+    # Handle potential postgres:// vs postgresql:// prefix issue
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def _make_engine(url: str):
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(url)
+
 
 if DATABASE_URL:
     # PostgreSQL for production (AWS RDS)
-    # Handle potential postgres:// vs postgresql:// prefix issue
-    if DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    engine = create_engine(DATABASE_URL)
+    DATABASE_URL = _normalize_url(DATABASE_URL)
 else:
     # SQLite for local development
     DB_PATH = Path(__file__).resolve().parent.parent / "attendance.db"
     DATABASE_URL = f"sqlite:///{DB_PATH}"
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = _make_engine(DATABASE_URL)
+
+replica_engine = _make_engine(_normalize_url(REPLICA_DATABASE_URL)) if REPLICA_DATABASE_URL else None
 
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+# Falls back to the primary when no replica is configured
+ReadSessionLocal = sessionmaker(bind=replica_engine or engine, autocommit=False, autoflush=False)
 
 
 class Base(DeclarativeBase):
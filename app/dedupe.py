@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import argparse
+import logging
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import select, func, update
+from sqlalchemy.orm import Session
+
+from .models import AttendanceChangeRequest, RequestStatus
+from .audit import stage_audit
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Overlapping change requests
+# -----------------------------
+#
+# A request "overlaps" another when both cover at least one common day for the
+# same employee and type. Only open requests (DRAFT / PENDING_APPROVAL) take
+# part: those are the ones that would be applied twice. The lookup is a single
+# range query served by ix_change_requests_emp_range.
+
+OPEN_STATUSES = (RequestStatus.DRAFT.value, RequestStatus.PENDING_APPROVAL.value)
+OVERLAP_POLICIES = ("reject", "merge", "link")
+UPDATE_CHUNK = 1000
+
+
+def find_open_overlaps(
+    db: Session, emp_id: str, request_type: str, start: date, end: date
+) -> List[AttendanceChangeRequest]:
+    return db.execute(
+        select(AttendanceChangeRequest)
+        .where(
+            AttendanceChangeRequest.emp_id == emp_id,
+            AttendanceChangeRequest.date_start <= end,
+            AttendanceChangeRequest.date_end >= start,
+            AttendanceChangeRequest.request_type == request_type,
+            AttendanceChangeRequest.status.in_(OPEN_STATUSES),
+        )
+        .order_by(AttendanceChangeRequest.id)
+    ).scalars().all()
+
+
+def is_duplicate(req: AttendanceChangeRequest, start: date, end: date, desired_status: Optional[str]) -> bool:
+    return req.date_start == start and req.date_end == end and req.desired_status == desired_status
+
+
+def merge_into(db: Session, target: AttendanceChangeRequest, start: date, end: date, actor_emp_id: str, comment: Optional[str]):
+    """Widen `target` to cover [start, end] instead of creating a second request."""
+    old = f"{target.date_start}..{target.date_end}"
+    target.date_start = min(target.date_start, start)
+    target.date_end = max(target.date_end, end)
+    target.updated_at = datetime.utcnow()
+    stage_audit(
+        db, target.id, actor_emp_id, "MERGED",
+        f"Range {old} -> {target.date_start}..{target.date_end}" + (f": {comment}" if comment else ""),
+    )
+
+
+def dedupe_open_requests(db: Session, actor_emp_id: str = "SYSTEM_DEDUPE") -> int:
+    """Reject exact duplicates among open requests, keeping the oldest of each group."""
+    keep = (
+        select(func.min(AttendanceChangeRequest.id).label("keep_id"),
+               AttendanceChangeRequest.emp_id, AttendanceChangeRequest.request_type,
+               AttendanceChangeRequest.date_start, AttendanceChangeRequest.date_end,
+               func.coalesce(AttendanceChangeRequest.desired_status, "").label("desired"))
+        .where(AttendanceChangeRequest.status.in_(OPEN_STATUSES))
+        .group_by(AttendanceChangeRequest.emp_id, AttendanceChangeRequest.request_type,
+                  AttendanceChangeRequest.date_start, AttendanceChangeRequest.date_end,
+                  func.coalesce(AttendanceChangeRequest.desired_status, ""))
+        .having(func.count() > 1)
+        .subquery()
+    )
+    dupes = db.execute(
+        select(AttendanceChangeRequest.id, keep.c.keep_id)
+        .join(keep, (AttendanceChangeRequest.emp_id == keep.c.emp_id)
+              & (AttendanceChangeRequest.request_type == keep.c.request_type)
+              & (AttendanceChangeRequest.date_start == keep.c.date_start)
+              & (AttendanceChangeRequest.date_end == keep.c.date_end)
+              & (func.coalesce(AttendanceChangeRequest.desired_status, "") == keep.c.desired))
+        .where(AttendanceChangeRequest.status.in_(OPEN_STATUSES), AttendanceChangeRequest.id != keep.c.keep_id)
+    ).all()
+    if not dupes:
+        return 0
+
+    now = datetime.utcnow()
+    by_keep = {}
+    for dup_id, keep_id in dupes:
+        by_keep.setdefault(keep_id, []).append(dup_id)
+        stage_audit(db, dup_id, actor_emp_id, "DEDUPED", f"Duplicate of request #{keep_id}")
+    for keep_id, ids in by_keep.items():
+        for i in range(0, len(ids), UPDATE_CHUNK):
+            db.execute(
+                update(AttendanceChangeRequest)
+                .where(AttendanceChangeRequest.id.in_(ids[i:i + UPDATE_CHUNK]))
+                .values(status=RequestStatus.REJECTED.value, related_request_id=keep_id, updated_at=now,
+                        version=AttendanceChangeRequest.version + 1),
+                execution_options={"synchronize_session": False},
+            )
+    db.commit()
+    return len(dupes)
+
+
+def main(argv=None):
+    from .sharding import TenantSessionLocal
+
+    parser = argparse.ArgumentParser(description="Reject duplicate open attendance change requests")
+    parser.parse_args(argv)
+    db = TenantSessionLocal()
+    try:
+        count = dedupe_open_requests(db)
+    finally:
+        db.close()
+    print(f"Deduplicated {count} requests")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
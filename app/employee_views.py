@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session, aliased
+
+from .models import AttendanceChangeRequest, AttendanceRecord, AuditEvent, Employee
+from .sharding import fan_in
+
+# -----------------------------
+# Admin employee page: result cache
+# -----------------------------
+#
+# The employee detail page is built from plain dicts (profile, last 30 days of
+# attendance, one page of change requests with each one's latest audit note)
+# cached per (employee, page) under a per-employee version. Versions are bumped
+# from the tables' own change timestamps: each view first reads the newest
+# last_updated_at / updated_at of records, requests and employees (one indexed
+# MAX each). When that moves, the rows changed since the previous watermark
+# name the employees to bump. The check sees writes from every worker, CLI and
+# background job, not just this process's handlers.
+#
+# Timestamps come from application clocks and commit out of order, so the scan
+# starts CLOCK_SLACK before the watermark and keeps running until nothing new
+# has shown up for CLOCK_SLACK. A write whose transaction stays open longer than
+# that before committing can be missed until the employee's next write.
+
+HISTORY_ROWS = 30
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+CACHE_SIZE = int(os.environ.get("EMPLOYEE_VIEW_CACHE_SIZE", "1000"))
+CLOCK_SLACK = timedelta(seconds=float(os.environ.get("EMPLOYEE_VIEW_CLOCK_SLACK", "5")))
+
+# table -> (model, change timestamp column)
+_WATCHED = {
+    "attendance": (AttendanceRecord, AttendanceRecord.last_updated_at),
+    "requests": (AttendanceChangeRequest, AttendanceChangeRequest.updated_at),
+    "employees": (Employee, Employee.updated_at),
+}
+
+
+# -----------------------------
+# Queries
+# -----------------------------
+
+def load_profile(db: Session, emp_id: str) -> Optional[dict]:
+    manager = aliased(Employee)
+    row = db.execute(
+        select(Employee, manager.name)
+        .outerjoin(manager, manager.emp_id == Employee.manager_emp_id)
+        .where(Employee.emp_id == emp_id)
+    ).first()
+    if row is None:
+        return None
+    emp, manager_name = row
+    return {
+        "emp_id": emp.emp_id, "name": emp.name, "email": emp.email, "device": emp.device,
+        "location": emp.location, "manager_emp_id": emp.manager_emp_id, "manager_name": manager_name,
+    }
+
+
+def load_history(db: Session, emp_id: str, limit: int = HISTORY_ROWS) -> List[dict]:
+    rows = db.execute(
+        select(AttendanceRecord.day, AttendanceRecord.status, AttendanceRecord.source_system,
+               AttendanceRecord.last_updated_at)
+        .where(AttendanceRecord.emp_id == emp_id)
+        .order_by(AttendanceRecord.day.desc())
+        .limit(limit)
+    ).all()
+    return [dict(r._mapping) for r in rows]
+
+
+def load_requests(db: Session, emp_id: str, before: Optional[int] = None,
+                  limit: int = PAGE_SIZE) -> Tuple[List[dict], Optional[int]]:
+    """One page of the employee's requests, newest first, and the id to pass as `before` for the next page."""
+    acr = AttendanceChangeRequest
+    stmt = select(acr.id, acr.created_at, acr.request_type, acr.status, acr.reason_text).where(acr.emp_id == emp_id)
+    if before is not None:
+        # Keyset on (created_at, id) through ix_change_requests_emp_created
+        cursor = select(acr.created_at).where(acr.id == before, acr.emp_id == emp_id).scalar_subquery()
+        stmt = stmt.where(or_(acr.created_at < cursor, and_(acr.created_at == cursor, acr.id < before)))
+    rows = db.execute(stmt.order_by(acr.created_at.desc(), acr.id.desc()).limit(limit + 1)).all()
+    page = [dict(r._mapping, latest_note=None) for r in rows[:limit]]
+    next_before = page[-1]["id"] if len(rows) > limit else None
+
+    if page:
+        by_id = {r["id"]: r for r in page}
+        for request_id, comment in db.execute(
+            select(AuditEvent.request_id, AuditEvent.comment)
+            .where(AuditEvent.request_id.in_(by_id))
+            .order_by(AuditEvent.request_id, AuditEvent.created_at, AuditEvent.id)
+        ):
+            by_id[request_id]["latest_note"] = comment
+    return page, next_before
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+
+class EmployeeViewCache:
+    def __init__(self, max_entries: int = CACHE_SIZE, slack: timedelta = CLOCK_SLACK):
+        self.max_entries = max_entries
+        self.slack = slack
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        # (emp_id, before, limit) -> (version, view)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._watermark: Optional[datetime] = None
+        self._recent: set = set()  # (table, emp_id, ts) already applied, within the slack window
+        self._last_change = 0.0    # monotonic time a new change was last seen
+        self.hits = 0
+        self.misses = 0
+        self.bumps = 0
+
+    def _latest(self, db: Session) -> Optional[datetime]:
+        stamps = [fan_in(db.execute(select(func.max(col))).all(), "max")[0] for _, col in _WATCHED.values()]
+        stamps = [s for s in stamps if s is not None]
+        return max(stamps) if stamps else None
+
+    def _changes(self, db: Session, since: datetime) -> set:
+        out = set()
+        for table, (model, col) in _WATCHED.items():
+            for emp_id, ts in db.execute(select(model.emp_id, col).where(col > since)):
+                out.add((table, emp_id, ts))
+        return out
+
+    def _since(self, watermark: datetime) -> datetime:
+        return watermark - self.slack if watermark > datetime.min + self.slack else datetime.min
+
+    def sync(self, db: Session):
+        """Bump the version of every employee whose data changed since the last call."""
+        now = time.monotonic()
+        with self._lock:
+            watermark, settled = self._watermark, now - self._last_change > self.slack.total_seconds()
+        latest = self._latest(db)
+        if watermark is None:
+            # First view: nothing is cached yet, just remember what is already there
+            recent = self._changes(db, self._since(latest)) if latest else set()
+            with self._lock:
+                self._watermark, self._recent, self._last_change = latest or datetime.min, recent, now
+            return
+        if settled and (latest is None or latest <= watermark):
+            return
+
+        changes = self._changes(db, self._since(watermark))
+        with self._lock:
+            new = changes - self._recent
+            for emp_id in {emp_id for _, emp_id, _ in new}:
+                self._versions[emp_id] = self._versions.get(emp_id, 0) + 1
+                self.bumps += 1
+            if new:
+                self._last_change = now
+            self._recent = changes
+            self._watermark = max([watermark] + [ts for _, _, ts in changes])
+
+    def get(self, db: Session, emp_id: str, before: Optional[int] = None,
+            limit: int = PAGE_SIZE) -> Optional[dict]:
+        """The employee page's data, or None if there is no such employee."""
+        self.sync(db)
+        key = (emp_id, before, limit)
+        with self._lock:
+            version = self._versions.get(emp_id, 0)
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        profile = load_profile(db, emp_id)
+        if profile is None:
+            return None
+        requests, next_before = load_requests(db, emp_id, before, limit)
+        view = {
+            "emp": profile,
+            "history": load_history(db, emp_id),
+            "change_requests": requests,
+            "next_before": next_before,
+            "version": version,
+        }
+        with self._lock:
+            # Not stored if a bump landed while we were reading
+            if self._versions.get(emp_id, 0) == version:
+                self._entries[key] = (version, view)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return view
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "version_bumps": self.bumps,
+                "watermark": self._watermark.isoformat() if self._watermark and self._watermark != datetime.min else None,
+            }
+
+
+employee_views = EmployeeViewCache()
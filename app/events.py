@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from typing import Any, Dict, Set, Tuple
+
+# -----------------------------
+# In-process pub/sub for live admin updates
+# -----------------------------
+#
+# Handlers publish small domain events (request created/approved/rejected,
+# attendance marked). Each event is serialized once into an SSE frame and
+# pushed to every subscriber queue, so N open dashboards cost one fan-out
+# instead of N full page reloads.
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class EventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Tuple[asyncio.AbstractEventLoop, asyncio.Queue]:
+        """Register a subscriber; must be called from inside the event loop."""
+        sub = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        """Broadcast an event. Safe to call from sync handlers running in the threadpool."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        frame = f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, frame)
+            except RuntimeError:
+                # Loop already closed; drop the dead subscriber
+                self.unsubscribe((loop, queue))
+
+
+def _offer(queue: asyncio.Queue, frame: str):
+    if queue.full():
+        # Slow client: drop the oldest frame rather than block publishers
+        queue.get_nowait()
+    queue.put_nowait(frame)
+
+
+event_bus = EventBus()
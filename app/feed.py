@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import select, or_, and_
+from sqlalchemy.orm import Session
+
+from .models import AttendanceRecord, AttendanceChangeRequest
+
+# -----------------------------
+# Change feed (incremental sync)
+# -----------------------------
+#
+# Consumers page through rows ordered by (updated timestamp, id) and keep the
+# last position as an opaque cursor. Each page is one keyset query against the
+# (last_updated_at, id) / (updated_at, id) indexes, so the cost of a sync is
+# proportional to what changed since the cursor, not to the table size.
+#
+# Timestamps come from application clocks and commit out of order: a row
+# stamped before the last delivered one can become visible after it. So the
+# cursor only moves its floor to CLOCK_SLACK behind the newest delivered row,
+# and carries the (id, timestamp) of rows delivered above the floor. Each read
+# re-scans from the floor and skips those. A write whose transaction stays open
+# longer than CLOCK_SLACK before committing can still be missed, as can one
+# under a burst of more than SEEN_MAX rows per CLOCK_SLACK.
+
+FEED_TABLES = {
+    "attendance": (AttendanceRecord, AttendanceRecord.last_updated_at),
+    "requests": (AttendanceChangeRequest, AttendanceChangeRequest.updated_at),
+}
+
+CLOCK_SLACK = timedelta(seconds=float(os.environ.get("FEED_CLOCK_SLACK", "5")))
+SEEN_MAX = int(os.environ.get("FEED_SEEN_MAX", "200"))
+
+_EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+
+class FeedPosition:
+    """Keyset floor plus the rows above it already delivered, as {(id, timestamp)}."""
+
+    def __init__(self, ts: datetime = _EPOCH, row_id: int = 0, seen: Optional[Set[Tuple[int, datetime]]] = None):
+        self.ts = ts
+        self.row_id = row_id
+        self.seen = seen or set()
+
+    def advance(self, rows: list, ts_key: str, slack: timedelta = CLOCK_SLACK):
+        """Mark rows delivered; moves the floor past what can no longer be committed late."""
+        seen = self.seen | {(r.id, getattr(r, ts_key)) for r in rows}
+        if not seen:
+            return
+        horizon = max(ts for _, ts in seen) - slack
+        ordered = sorted(seen, key=lambda e: (e[1], e[0]))
+        drop = sum(1 for _, ts in ordered if ts <= horizon)
+        # Every row ordered before a delivered one was delivered too (or committed late)
+        drop = max(drop, len(ordered) - SEEN_MAX)
+        if drop:
+            row_id, ts = ordered[drop - 1]
+            if (ts, row_id) > (self.ts, self.row_id):
+                self.ts, self.row_id = ts, row_id
+        self.seen = set(ordered[drop:])
+
+
+def encode_cursor(positions: dict) -> str:
+    data = {}
+    for name, pos in positions.items():
+        # Seen timestamps as microseconds above the floor, to keep the cursor short
+        data[name] = [pos.ts.isoformat(), pos.row_id,
+                      [[row_id, (ts - pos.ts) // _US] for row_id, ts in sorted(pos.seen, key=lambda e: e[0])]]
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> dict:
+    """Return {table: FeedPosition}; missing tables start from the beginning.
+
+    Raises ValueError for anything that is not a cursor this module issued.
+    """
+    positions = {name: FeedPosition() for name in FEED_TABLES}
+    if not cursor:
+        return positions
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        for name, entry in data.items():
+            if name not in positions:
+                continue
+            # Cursors issued before the slack window have no seen list
+            ts, row_id, *rest = entry
+            floor = datetime.fromisoformat(ts)
+            seen = {(int(r), floor + int(us) * _US) for r, us in (rest[0] if rest else [])}
+            positions[name] = FeedPosition(floor, int(row_id), seen)
+    except (TypeError, AttributeError, ValueError, binascii.Error, OverflowError) as e:
+        raise ValueError("Invalid cursor") from e
+    return positions
+
+
+def _fetch_since(db: Session, table: str, position: FeedPosition, limit: int) -> List:
+    model, ts_col = FEED_TABLES[table]
+    ts, row_id = position.ts, position.row_id
+    fetch = limit + len(position.seen)
+    rows = db.execute(
+        select(model)
+        .where(or_(ts_col > ts, and_(ts_col == ts, model.id > row_id)))
+        .order_by(ts_col.asc(), model.id.asc())
+        .limit(fetch)
+    ).scalars().all()
+    # A sharded session concatenates up to `limit` rows per shard
+    rows.sort(key=lambda r: (getattr(r, ts_col.key), r.id))
+    fresh = [r for r in rows[:fetch] if (r.id, getattr(r, ts_col.key)) not in position.seen]
+    return fresh[:limit]
+
+
+def read_changes(db: Session, cursor: Optional[str], limit: int = 500):
+    """Fetch up to `limit` changed rows per table after `cursor`.
+
+    Returns (attendance_rows, request_rows, next_cursor, has_more).
+    """
+    positions = decode_cursor(cursor)
+    attendance = _fetch_since(db, "attendance", positions["attendance"], limit)
+    requests = _fetch_since(db, "requests", positions["requests"], limit)
+
+    positions["attendance"].advance(attendance, "last_updated_at")
+    positions["requests"].advance(requests, "updated_at")
+
+    has_more = len(attendance) == limit or len(requests) == limit
+    return attendance, requests, encode_cursor(positions), has_more
+
+
+class ChangeNotifier:
+    """Wakes long-poll readers when a write handler commits a change.
+
+    Async readers wait on a future in their own loop, so a parked long-poll or
+    SSE client holds no threadpool thread.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._version = 0
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def notify(self):
+        """Called after a commit, from the event loop or a threadpool thread."""
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+            waiters, self._waiters = self._waiters, set()
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, fut)
+            except RuntimeError:
+                pass  # loop already closed
+
+    def wait(self, seen_version: int, timeout: float) -> bool:
+        """Block until the version moves past `seen_version` or timeout expires."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._version != seen_version, timeout=timeout)
+
+    async def wait_async(self, seen_version: int, timeout: float) -> bool:
+        """`wait` for coroutines: parks on the event loop instead of a thread."""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._cond:
+            if self._version != seen_version:
+                return True
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._cond:
+                self._waiters.discard(waiter)
+
+
+def _wake(fut: asyncio.Future):
+    if not fut.done():
+        fut.set_result(None)
+
+
+change_notifier = ChangeNotifier()
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import logging
+import threading
+from bisect import bisect_right
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .models import AttendanceChangeRequest, RequestStatus, RequestType, UnlockGrant
+from .system_state import POLL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Unlock grants
+# -----------------------------
+#
+# Approved UNLOCK requests are materialized as rows in `unlock_grants`
+# (emp_id, date_start, date_end). Each worker mirrors them in memory as
+# sorted, merged day-ordinal intervals per employee, so "may E1001 mark
+# 2026-01-26?" is a bisect, not a query. Grants are append-only, so the row
+# count only ever grows. Other workers catch up by loading rows with id > the
+# last id they have seen; if those rows plus the ones already loaded don't
+# add up to the table's count, a lower id committed late and the cache is
+# rebuilt from scratch instead.
+
+
+class UnlockGrantCache:
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        # emp_id -> (starts, ends), both sorted, intervals non-overlapping
+        self._intervals: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._last_id = 0
+        self._loaded = 0  # rows read from the table so far
+        self._poller: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def covers(self, emp_id: str, day: date) -> bool:
+        entry = self._intervals.get(emp_id)
+        if not entry:
+            return False
+        starts, ends = entry
+        ordinal = day.toordinal()
+        i = bisect_right(starts, ordinal) - 1
+        return i >= 0 and ends[i] >= ordinal
+
+    def add(self, emp_id: str, start: date, end: date):
+        """Apply a grant committed by this worker without waiting for the poller."""
+        with self._lock:
+            self._insert(self._intervals, emp_id, start.toordinal(), end.toordinal())
+
+    @staticmethod
+    def _insert(intervals: Dict[str, Tuple[List[int], List[int]]], emp_id: str, lo: int, hi: int):
+        starts, ends = intervals.get(emp_id, ([], []))
+        # Merge with every interval that overlaps or touches [lo, hi]
+        i = bisect_right(starts, hi + 1)
+        j = i
+        while j > 0 and ends[j - 1] >= lo - 1:
+            j -= 1
+        if j < i:
+            lo = min(lo, starts[j])
+            hi = max(hi, max(ends[j:i]))
+        # Copy-on-write so lock-free readers never see a half-updated list
+        intervals[emp_id] = (starts[:j] + [lo] + starts[i:], ends[:j] + [hi] + ends[i:])
+
+    def refresh(self, db: Optional[Session] = None):
+        """Load grants created since the last refresh (by this or any other worker)."""
+        own = db is None
+        db = db or self._session_factory()
+        columns = select(UnlockGrant.id, UnlockGrant.emp_id, UnlockGrant.date_start, UnlockGrant.date_end)
+        try:
+            total = db.execute(select(func.count(UnlockGrant.id))).scalar_one()
+            if total == self._loaded:
+                return
+            rows = db.execute(columns.where(UnlockGrant.id > self._last_id).order_by(UnlockGrant.id)).all()
+            # Rows are never deleted, so a shortfall means a lower id was skipped
+            rebuild = self._loaded + len(rows) != total
+            if rebuild:
+                rows = db.execute(columns.order_by(UnlockGrant.id)).all()
+        finally:
+            if own:
+                db.close()
+        with self._lock:
+            # A rebuild fills a fresh dict and swaps it in, so readers never see a half-empty cache
+            intervals = {} if rebuild else self._intervals
+            for grant_id, emp_id, start, end in rows:
+                self._insert(intervals, emp_id, start.toordinal(), end.toordinal())
+                self._last_id = max(self._last_id, grant_id)
+            self._intervals = intervals
+            self._loaded = len(rows) if rebuild else self._loaded + len(rows)
+
+    def start(self, interval: float = POLL_SECONDS):
+        if self._poller and self._poller.is_alive():
+            return
+        self.refresh()
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._poll, args=(interval,), name="unlock-grant-poller", daemon=True)
+        self._poller.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Unlock grant refresh failed")
+
+
+def grant_for_request(db: Session, req: AttendanceChangeRequest) -> UnlockGrant:
+    """Materialize an approved UNLOCK request; the caller commits."""
+    grant = UnlockGrant(emp_id=req.emp_id, date_start=req.date_start, date_end=req.date_end, request_id=req.id)
+    db.add(grant)
+    return grant
+
+
+def backfill_grants(db: Session) -> int:
+    """Create grants for approved UNLOCK requests that predate the grant table."""
+    missing = db.execute(
+        select(AttendanceChangeRequest)
+        .outerjoin(UnlockGrant, UnlockGrant.request_id == AttendanceChangeRequest.id)
+        .where(
+            AttendanceChangeRequest.request_type == RequestType.UNLOCK.value,
+            AttendanceChangeRequest.status.in_([RequestStatus.APPROVED.value, RequestStatus.APPLIED.value]),
+            UnlockGrant.id.is_(None),
+        )
+    ).scalars().all()
+    for req in missing:
+        grant_for_request(db, req)
+    db.commit()
+    return len(missing)
+
+
+unlock_grants = UnlockGrantCache()
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select, insert, update
+from sqlalchemy.orm import Session
+
+from .models import Employee
+from .sharding import TenantSessionLocal, execute_bulk
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# HR master-data sync
+# -----------------------------
+#
+# A snapshot (CSV or NDJSON) is diffed in memory against the current employee
+# table, loaded with one query. The resulting inserts, updates and
+# soft-deletes are applied as executemany batches. New employees are inserted
+# level by level down the reporting tree, so a manager row always exists
+# before the rows that reference it through manager_emp_id.
+
+SYNC_FIELDS = ("name", "location", "cost_center", "email", "device", "manager_emp_id")
+SYNC_MODES = ("full", "delta")
+BATCH_SIZE = 5000
+# A full snapshot that would deactivate more than this share of active
+# employees is most likely truncated; it is refused unless forced.
+MAX_DEACTIVATE_FRACTION = float(os.environ.get("HR_SYNC_MAX_DEACTIVATE_FRACTION", "0.1"))
+
+_FALSE = {"0", "false", "no", "n", "inactive", "deleted"}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def parse_snapshot(payload: str, fmt: str) -> List[dict]:
+    if fmt == "csv":
+        rows = list(csv.DictReader(io.StringIO(payload)))
+    elif fmt == "ndjson":
+        rows = [json.loads(line) for line in payload.splitlines() if line.strip()]
+    else:
+        raise SnapshotError(f"Unsupported format: {fmt}")
+    return rows
+
+
+def _normalize(raw) -> dict:
+    if not isinstance(raw, dict):
+        raise SnapshotError("expected an object with emp_id, name, ...")
+    emp_id = raw.get("emp_id")
+    if not isinstance(emp_id, str) or not emp_id.strip():
+        raise SnapshotError("emp_id is required and must be a string")
+    emp_id = emp_id.strip()
+    row = {"emp_id": emp_id}
+    for field in SYNC_FIELDS:
+        value = raw.get(field)
+        if value is not None and not isinstance(value, str):
+            raise SnapshotError(f"{emp_id}: {field} must be a string")
+        row[field] = (value or "").strip() or None
+    if not row["name"]:
+        raise SnapshotError(f"{emp_id}: name is required")
+    active = raw.get("active", True)
+    if isinstance(active, str):
+        row["is_active"] = active.strip().lower() not in _FALSE
+    elif active is None or isinstance(active, (bool, int)):
+        row["is_active"] = active is None or bool(active)
+    else:
+        raise SnapshotError(f"{emp_id}: active must be a boolean or a string")
+    return row
+
+
+def _insert_levels(new_rows: Dict[str, dict], existing_ids: set) -> List[List[dict]]:
+    """Group new employees so each level only references managers from earlier levels."""
+    levels = []
+    placed = set(existing_ids)
+    pending = dict(new_rows)
+    while pending:
+        level = [r for r in pending.values() if not r["manager_emp_id"] or r["manager_emp_id"] in placed]
+        if not level:
+            raise SnapshotError(
+                "Reporting-line cycle or unknown manager among: " + ", ".join(sorted(pending)[:20])
+            )
+        levels.append(level)
+        for r in level:
+            placed.add(r["emp_id"])
+            del pending[r["emp_id"]]
+    return levels
+
+
+def sync_employees(db: Session, raw_rows: Iterable[dict], mode: str = "delta", dry_run: bool = False,
+                   force: bool = False) -> dict:
+    """Diff a snapshot against the employee table and apply it. Returns a change summary.
+
+    A full snapshot that is empty, or that would deactivate more than
+    MAX_DEACTIVATE_FRACTION of active employees, raises SnapshotError unless `force`.
+    """
+    if mode not in SYNC_MODES:
+        raise SnapshotError(f"mode must be one of {', '.join(SYNC_MODES)}")
+    started = time.perf_counter()
+
+    snapshot: Dict[str, dict] = {}
+    for i, raw in enumerate(raw_rows, start=1):
+        try:
+            row = _normalize(raw)
+        except SnapshotError as e:
+            raise SnapshotError(f"row {i}: {e}")
+        snapshot[row["emp_id"]] = row
+
+    cols = [Employee.emp_id, Employee.is_active] + [getattr(Employee, f) for f in SYNC_FIELDS]
+    current = {r.emp_id: r._asdict() for r in db.execute(select(*cols))}
+
+    inserts: Dict[str, dict] = {}
+    updates: List[dict] = []
+    unchanged = 0
+    for emp_id, row in snapshot.items():
+        cur = current.get(emp_id)
+        if cur is None:
+            inserts[emp_id] = row
+        elif any(cur[f] != row[f] for f in SYNC_FIELDS + ("is_active",)):
+            updates.append(row)
+        else:
+            unchanged += 1
+
+    deactivate = []
+    if mode == "full":
+        if not snapshot:
+            raise SnapshotError("Full snapshot is empty; refusing to deactivate every employee")
+        deactivate = [emp_id for emp_id, cur in current.items() if cur["is_active"] and emp_id not in snapshot]
+        active = sum(1 for cur in current.values() if cur["is_active"])
+        if not force and len(deactivate) > MAX_DEACTIVATE_FRACTION * active:
+            raise SnapshotError(
+                f"Full snapshot would deactivate {len(deactivate)} of {active} active employees "
+                f"(limit {MAX_DEACTIVATE_FRACTION:.0%}); pass force to apply it anyway"
+            )
+
+    # Managers must exist (in the table or in this snapshot) before anyone points at them
+    known = set(current) | set(snapshot)
+    missing = sorted({r["manager_emp_id"] for r in snapshot.values() if r["manager_emp_id"] and r["manager_emp_id"] not in known})
+    if missing:
+        raise SnapshotError("Unknown manager_emp_id: " + ", ".join(missing[:20]))
+    levels = _insert_levels(inserts, set(current))
+
+    summary = {
+        "mode": mode,
+        "dry_run": dry_run,
+        "received": len(snapshot),
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "deactivated": len(deactivate),
+        "unchanged": unchanged,
+    }
+
+    if not dry_run:
+        now = datetime.utcnow()
+        for level in levels:
+            for i in range(0, len(level), BATCH_SIZE):
+                execute_bulk(db, insert(Employee), Employee, [{**r, "updated_at": now} for r in level[i:i + BATCH_SIZE]])
+        # ORM bulk UPDATE by primary key (executemany)
+        for i in range(0, len(updates), BATCH_SIZE):
+            execute_bulk(db, update(Employee), Employee, [{**r, "updated_at": now} for r in updates[i:i + BATCH_SIZE]])
+        for i in range(0, len(deactivate), BATCH_SIZE):
+            execute_bulk(
+                db, update(Employee), Employee,
+                [{"emp_id": e, "is_active": False, "updated_at": now} for e in deactivate[i:i + BATCH_SIZE]],
+            )
+        db.commit()
+
+    summary["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("HR sync summary: %s", summary)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync employees from an HRMS snapshot")
+    parser.add_argument("path", help="CSV or NDJSON snapshot file")
+    parser.add_argument("--mode", choices=SYNC_MODES, default="delta")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--force", action="store_true",
+                        help="apply a full snapshot even if it deactivates more than the allowed share")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    with open(args.path, encoding="utf-8") as fh:
+        rows = parse_snapshot(fh.read(), fmt)
+
+    db = TenantSessionLocal()
+    try:
+        summary = sync_employees(db, rows, mode=args.mode, dry_run=args.dry_run, force=args.force)
+    finally:
+        db.close()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# -----------------------------
+# Structured logging
+# -----------------------------
+#
+# Handlers write from a background thread: the root logger only has a
+# QueueHandler, which stamps the record with the current request id, applies
+# sampling and drops it into a bounded queue. Message formatting (the
+# %-style args) and JSON encoding happen on the listener thread, so a hot path
+# that logs pays for a dict lookup and a queue put. When the queue is full the
+# record is dropped and counted rather than blocking the request.
+#
+# Sampling is per event, keyed by logger and message template: the first
+# LOG_SAMPLE_BURST records of an event in each LOG_SAMPLE_WINDOW seconds are
+# kept, then one in LOG_SAMPLE_EVERY. The next kept record carries the number
+# skipped in `suppressed`. ERROR and above are never sampled.
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")  # json | text
+QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+SAMPLE_WINDOW = float(os.environ.get("LOG_SAMPLE_WINDOW", "10"))
+SAMPLE_BURST = int(os.environ.get("LOG_SAMPLE_BURST", "20"))
+SAMPLE_EVERY = int(os.environ.get("LOG_SAMPLE_EVERY", "100"))
+REQUEST_ID_HEADER = b"x-request-id"
+
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "suppressed"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields are included as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id") or record.request_id is None:
+            record.request_id = "-"
+        return super().format(record)
+
+
+class EventSampler(logging.Filter):
+    """Burst-then-sample per (logger, message template); see the module comment."""
+
+    def __init__(self, window: float = SAMPLE_WINDOW, burst: int = SAMPLE_BURST, every: int = SAMPLE_EVERY):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.every = max(every, 1)
+        self._lock = threading.Lock()
+        # key -> [window start, seen in window, suppressed since last kept]
+        self._events: Dict[tuple, list] = {}
+        self.kept = 0
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            self.kept += 1
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            state = self._events.get(key)
+            if state is None or now - state[0] >= self.window:
+                pending = state[2] if state else 0
+                state = self._events[key] = [now, 0, pending]
+            state[1] += 1
+            seen = state[1]
+            if seen > self.burst and (seen - self.burst) % self.every:
+                state[2] += 1
+                self.suppressed += 1
+                return False
+            record.suppressed, state[2] = state[2], 0
+            self.kept += 1
+        return True
+
+
+class RequestIdFilter(logging.Filter):
+    """Copies the request id into the record on the calling thread, before it is queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queues the record unformatted and drops it when the queue is full."""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() formats here; leave that to the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    def __init__(self):
+        self.handler: Optional[NonBlockingQueueHandler] = None
+        self.sampler: Optional[EventSampler] = None
+        self.listener: Optional[logging.handlers.QueueListener] = None
+
+    def configure(self, level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None, sample: bool = True):
+        """Route the root logger through the queue. Safe to call again (replaces the previous setup)."""
+        self.stop()
+        target = logging.StreamHandler(stream or sys.stderr)
+        target.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+        self.handler = NonBlockingQueueHandler(queue.Queue(QUEUE_SIZE))
+        self.handler.addFilter(RequestIdFilter())
+        self.sampler = EventSampler() if sample else None
+        if self.sampler:
+            self.handler.addFilter(self.sampler)
+        root = logging.getLogger()
+        root.handlers[:] = [self.handler]
+        root.setLevel(level)
+        self.listener = logging.handlers.QueueListener(self.handler.queue, target, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        """Flush what is queued and stop the listener thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def stats(self) -> dict:
+        if self.handler is None:
+            return {"configured": False}
+        return {
+            "configured": True,
+            "queued": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "kept": self.sampler.kept if self.sampler else None,
+            "suppressed": self.sampler.suppressed if self.sampler else 0,
+        }
+
+
+log_pipeline = LogPipeline()
+atexit.register(log_pipeline.stop)
+
+
+def configure_logging(**kwargs):
+    log_pipeline.configure(**kwargs)
+
+
+class RequestIdMiddleware:
+    """Sets the request id for log records and echoes it as X-Request-ID.
+
+    An incoming X-Request-ID (from a proxy or the caller) is reused so one id
+    follows the request across services.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rid = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                rid = value.decode("latin-1")[:64]
+                break
+        rid = rid or uuid.uuid4().hex[:16]
+        token = request_id.set(rid)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [(REQUEST_ID_HEADER, rid.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -2,24 +2,26 @@ from __future__ import annotations
 
 from datetime import date, datetime, timedelta
 from typing import Optional, List
+import asyncio
+import hmac
 import os
 
 from pydantic import BaseModel
 
-from fastapi import FastAPI, Depends, HTTPException, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, Form
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, func
 
-from .db import SessionLocal
+from .db import DATABASE_URL, SessionLocal, replica_engine
 from .models import (
     Employee,
     AttendanceRecord,
     AttendanceChangeRequest,
     AuditEvent,
     RequestStatus,
+    RequestType,
 )
 from .schemas import (
     EmployeeOut,
@@ -29,11 +31,61 @@ from .schemas import (
     RequestActionIn,
     AuditEventOut,
     AtomicworkSyncIn,
+    ChangeFeedOut,
+    EmployeeSearchOut,
+    MobileSyncIn,
+    MobileSyncOut,
 )
 from .seed import seed
+from .feed import decode_cursor, read_changes, change_notifier
+from .events import event_bus
+from .audit import stage_audit, read_archived_audit
+from .archive import archived_months, read_archived_attendance
+from .partitions import is_postgres, month_start, partition_scheduler
+from .system_state import system_state, set_state, SIMULATION_STATES, SCOPES
+from .rules import MarkContext, get_rule_engine
+from .grants import unlock_grants, grant_for_request, backfill_grants
+from .dedupe import find_open_overlaps, is_duplicate, merge_into, OPEN_STATUSES, OVERLAP_POLICIES
+from .search import employee_index, search_employees, MAX_LIMIT as SEARCH_MAX_LIMIT
+from .hr_sync import parse_snapshot, sync_employees, SnapshotError
+from .mobile_sync import (
+    check_secret as check_mobile_sync_secret, device_key, verify_signature, sync_offline_marks,
+    session_token, session_emp_id, SESSION_COOKIE, MAX_BATCH as MOBILE_SYNC_MAX_BATCH,
+)
+from .assets import AssetStaticFiles, asset_manifest, asset_url, build as build_assets, service_worker_js
+from .ratelimit import RateLimitMiddleware, rate_limiter
+from .replicas import ReadYourWritesMiddleware, routing_stats, session_for
+from .sharding import TenantSessionLocal, all_engines, ensure_columns, ensure_indexes, fan_in, is_sharded, shard_router, shard_status
+from .rendering import build_templates, precompile, fragment_cache, render_stats, LazyRows
+from .analytics import (
+    analytics_cache,
+    absence_rate,
+    monday_friday_pattern,
+    absence_streaks,
+    rolling_absence_rate,
+    GROUP_BY,
+)
+from .closing import closing_job, expected_status
+from .employee_views import employee_views, MAX_PAGE_SIZE as EMPLOYEE_MAX_PAGE_SIZE, PAGE_SIZE as EMPLOYEE_PAGE_SIZE
+from .sla import approval_percentiles, escalation_scheduler, pending_by_approver
+from .logs import RequestIdMiddleware, configure_logging, log_pipeline
+from .tracing import TracingMiddleware, span, traced, tracer
+from .concurrency import ConflictError, commit_or_conflict, conflict_stats, get_for_update
+from .timesheets import parse_month, shutdown_pool as shutdown_timesheet_pool, timesheet_cache, to_csv as timesheet_csv
+from .codes import known_source
+
+# Attendance sources written by the handlers below (see app/codes.py)
+ATOMICWORK_SOURCE = known_source("ATOMICWORK")
+MOBILE_SOURCE = known_source("MOBILE_APP")
 
 app = FastAPI(title="Attendance Service (SAP Mock)", version="0.1.0")
 
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Inside CORS so 429 responses still carry the CORS headers
+if os.environ.get("RATE_LIMIT_ENABLED", "1") == "1":
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 from fastapi.middleware.cors import CORSMiddleware
 app.add_middleware(
     CORSMiddleware,
@@ -43,21 +95,108 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(ConflictError)
+async def _conflict_handler(request: Request, exc: ConflictError):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+
+# Root span per sampled request; inside RequestIdMiddleware so it can read the id
+app.add_middleware(TracingMiddleware)
+
+# Outermost, so every log line of a request (including 429s) carries its id
+app.add_middleware(RequestIdMiddleware)
+
 # Optional admin UI assets
 # Optional admin UI assets
 base_dir = os.path.dirname(os.path.abspath(__file__))
-app.mount("/static", StaticFiles(directory=os.path.join(base_dir, "static")), name="static")
-templates = Jinja2Templates(directory=os.path.join(base_dir, "templates"))
+app.mount("/static", AssetStaticFiles(directory=os.path.join(base_dir, "static")), name="static")
+templates = build_templates(os.path.join(base_dir, "templates"))
+templates.env.globals["asset_url"] = asset_url
 
 
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    # GET handlers read from the replica when one is configured (app/replicas.py)
+    db = session_for(request)()
     try:
         yield db
     finally:
         db.close()
 
 
+@app.get("/api/metrics/templates")
+def api_template_metrics():
+    """Render time per template plus fragment cache hit/miss counts."""
+    return {"templates": render_stats.snapshot(), "fragments": fragment_cache.stats()}
+
+
+@app.get("/api/metrics/ratelimit")
+def api_ratelimit_metrics():
+    """Allowed/limited counts per limit, live bucket count and mean check cost."""
+    return rate_limiter.metrics()
+
+
+@app.get("/api/metrics/logging")
+def api_logging_metrics():
+    """Queue depth, records dropped on a full queue, and records kept/suppressed by sampling."""
+    return log_pipeline.stats()
+
+
+@app.get("/api/metrics/traces")
+def api_trace_metrics():
+    """Sampled requests per route with the time per stage (SQL verb, apply, commit, render...)."""
+    return tracer.stats()
+
+
+@app.get("/api/metrics/employee-views")
+def api_employee_view_metrics():
+    """Admin employee page cache: entries, hits/misses and version bumps seen from the change watermark."""
+    return employee_views.stats()
+
+
+@app.get("/api/metrics/conflicts")
+def api_conflict_metrics():
+    """409s returned because a concurrent writer changed the row first, per kind of row."""
+    return conflict_stats.snapshot()
+
+
+@app.get("/api/metrics/db")
+def api_db_metrics():
+    """Sessions handed out per database (sticky = reads pinned to the primary)."""
+    return {"replica_configured": replica_engine is not None, "sessions": dict(routing_stats)}
+
+
+@app.get("/api/metrics/timesheets")
+def api_timesheet_metrics():
+    return timesheet_cache.stats()
+
+
+@app.get("/api/metrics/closing")
+def api_closing_metrics():
+    return closing_job.stats()
+
+
+@app.get("/api/metrics/sla")
+def api_sla_metrics(db: Session = Depends(get_db)):
+    """Escalation schedule and last run, plus pending/overdue requests per approver."""
+    return {**escalation_scheduler.stats(), "approvers": pending_by_approver(db)}
+
+
+@app.get("/api/metrics/approvals")
+def api_approval_metrics(days: int = 90, db: Session = Depends(get_db)):
+    """Time-to-approve percentiles (hours) per approver, slowest p90 first."""
+    if days < 1:
+        raise HTTPException(status_code=400, detail="days must be >= 1")
+    return {"days": days, "approvers": approval_percentiles(db, days)}
+
+
+@app.get("/api/shards")
+def api_shards():
+    """Shard map, routing counts and per-shard row/tenant counts (fan-out over all shards)."""
+    if shard_router is None:
+        return {"sharded": False}
+    return {"sharded": True, **shard_status(shard_router)}
+
+
 @app.get("/api/version")
 def api_version():
     return {
@@ -131,24 +270,29 @@ async def atomicwork_sync(request: Request, db: Session = Depends(get_db)):
         select(AttendanceRecord).where(and_(AttendanceRecord.emp_id == payload.emp_id, AttendanceRecord.day == payload.date))
     ).scalars().first()
 
+    was_present = bool(rec and rec.status == "PRESENT")
     if rec:
         rec.status = payload.status
         rec.last_updated_by = "ATOMICWORK"
         rec.last_updated_at = datetime.utcnow()
-        rec.source_system = "ATOMICWORK"
+        rec.source_system = ATOMICWORK_SOURCE
     else:
         db.add(
             AttendanceRecord(
                 emp_id=payload.emp_id,
                 day=payload.date,
                 status=payload.status,
-                source_system="ATOMICWORK",
+                source_system=ATOMICWORK_SOURCE,
                 last_updated_by="ATOMICWORK",
                 last_updated_at=datetime.utcnow(),
             )
         )
     
-    db.commit()
+    commit_or_conflict(db, "Attendance for this day")
+    timesheet_cache.invalidate(payload.date)
+    change_notifier.notify()
+    event_bus.publish("request_created", {"request": _request_event(req), "pending_delta": 0})
+    _publish_attendance(payload.emp_id, payload.date, payload.status, was_present)
     return {"status": "success", "message": "Synced successfully", "request_id": req.id}
 
 
@@ -156,28 +300,149 @@ async def atomicwork_sync(request: Request, db: Session = Depends(get_db)):
 
 import logging
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Structured, queued logging (see app/logs.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 def _startup():
+    # Not caught: a missing secret must stop the process, not just log
+    check_mobile_sync_secret(DATABASE_URL)
+
+    try:
+        # Added after the first release; create_all does not alter existing tables
+        ensure_columns(Employee, "is_active", "updated_at")
+        ensure_columns(AttendanceChangeRequest, "related_request_id", "version")
+        ensure_columns(AttendanceRecord, "version")
+    except Exception as e:
+        logger.error("Could not add new columns: %s", e, exc_info=True)
+
     try:
         # Create DB + seed demo data if empty.
         seed()
         logger.info("Database seeding completed.")
     except Exception as e:
-        logger.error(f"Error during database seeding: {e}", exc_info=True)
+        logger.error("Error during database seeding: %s", e, exc_info=True)
         # We catch the error so the app can still start
 
+    try:
+        # Added after the first release; create_all does not add indexes to existing tables
+        ensure_indexes(Employee, "ix_employees_updated_at")
+        ensure_indexes(AttendanceRecord, "ix_attendance_records_updated")
+        ensure_indexes(
+            AttendanceChangeRequest,
+            "ix_attendance_change_requests_updated", "ix_change_requests_emp_range", "ix_change_requests_emp_created",
+        )
+    except Exception as e:
+        logger.error("Could not create change feed / search / overlap / request history indexes: %s", e, exc_info=True)
+
+    try:
+        ensure_indexes(AttendanceRecord, "uq_attendance_records_emp_day")
+    except Exception as e:
+        # Fails while duplicate employee-days exist; inserts are unguarded until they are merged
+        logger.error("Could not create unique employee-day index: %s", e, exc_info=True)
+
+    try:
+        system_state.start()
+    except Exception as e:
+        logger.error("Could not load shared system state: %s", e, exc_info=True)
+
+    try:
+        db = SessionLocal()
+        try:
+            created = backfill_grants(db)
+        finally:
+            db.close()
+        if created:
+            logger.info("Materialized %d unlock grants from approved requests.", created)
+        unlock_grants.start()
+    except Exception as e:
+        logger.error("Could not load unlock grants: %s", e, exc_info=True)
+
+    try:
+        if not asset_manifest.mapping:
+            build_assets()
+            logger.info("Built hashed static assets.")
+    except Exception as e:
+        logger.error("Could not build static assets (serving unhashed files): %s", e, exc_info=True)
+
+    try:
+        precompile(templates.env)
+    except Exception as e:
+        logger.error("Could not precompile templates: %s", e, exc_info=True)
+
+    try:
+        closing_job.start()
+    except Exception as e:
+        logger.error("Could not schedule end-of-day closing: %s", e, exc_info=True)
+
+    try:
+        escalation_scheduler.start()
+    except Exception as e:
+        logger.error("Could not start SLA escalation: %s", e, exc_info=True)
+
+    try:
+        partition_scheduler.start(all_engines())
+    except Exception as e:
+        logger.error("Could not schedule partition maintenance: %s", e, exc_info=True)
+
+
+@app.on_event("shutdown")
+def _shutdown():
+    system_state.stop()
+    unlock_grants.stop()
+    closing_job.stop()
+    escalation_scheduler.stop()
+    partition_scheduler.stop()
+    shutdown_timesheet_pool()
+    tracer.flush()
+
 
 
 # -----------------------------
 # Helpers
 # -----------------------------
 
+# Bearer token the HRMS integration sends to /api/hr/employees/sync (unset: admin session only)
+HR_SYNC_TOKEN = os.environ.get("HR_SYNC_TOKEN")
+
+
+def _require_admin(request: Request, service_token: Optional[str] = None):
+    """401 unless the caller has an admin session or, where given, presents `service_token` as a bearer token."""
+    if request.cookies.get("admin_session"):
+        return
+    if service_token:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), service_token.encode()):
+            return
+    raise HTTPException(status_code=401, detail="Not authenticated")
+
+
+def _check_version(req: AttendanceChangeRequest, payload: RequestActionIn):
+    """409 if the client acted on a copy of the request that has since changed."""
+    if payload.expected_version is not None and payload.expected_version != req.version:
+        conflict_stats.record("Request")
+        raise HTTPException(status_code=409, detail="Request was changed by another request; reload and retry")
+
+
 def _add_audit(db: Session, request_id: int, actor_emp_id: Optional[str], action: str, comment: Optional[str] = None):
-    db.add(AuditEvent(request_id=request_id, actor_emp_id=actor_emp_id, action=action, comment=comment))
+    # Staged and batch-inserted at commit (see app/audit.py)
+    stage_audit(db, request_id, actor_emp_id, action, comment)
+
+
+def _request_event(req: AttendanceChangeRequest) -> dict:
+    return RequestOut.model_validate(req, from_attributes=True).model_dump(mode="json")
+
+
+def _publish_attendance(emp_id: str, day: date, status: str, was_present: bool):
+    """Broadcast an attendance change with its effect on today's present counter."""
+    present_delta = 0
+    if day == date.today():
+        present_delta = int(status == "PRESENT") - int(was_present)
+    event_bus.publish(
+        "attendance_marked",
+        {"emp_id": emp_id, "day": day.isoformat(), "status": status, "present_delta": present_delta},
+    )
 
 
 def _daterange(start: date, end: date):
@@ -189,12 +454,19 @@ def _daterange(start: date, end: date):
         cur = cur + timedelta(days=1)
 
 
+@traced("apply_change")
 def _apply_change(db: Session, req: AttendanceChangeRequest, actor_emp_id: str):
     """Apply the request into AttendanceRecord rows (mock 'SAP update')."""
-    # For unlock-only requests without desired_status, we only log an audit event.
+    # Approved unlocks become grants that mark-attendance checks (see app/grants.py)
+    if req.request_type == RequestType.UNLOCK.value:
+        grant_for_request(db, req)
+
+    # For unlock-only requests without desired_status, nothing else to apply.
     if not req.desired_status:
         return
 
+    timesheet_cache.invalidate(req.date_start, req.date_end)
+
     for d in _daterange(req.date_start, req.date_end):
         rec = db.execute(
             select(AttendanceRecord).where(and_(AttendanceRecord.emp_id == req.emp_id, AttendanceRecord.day == d))
@@ -204,14 +476,14 @@ def _apply_change(db: Session, req: AttendanceChangeRequest, actor_emp_id: str):
             rec.status = req.desired_status
             rec.last_updated_by = actor_emp_id
             rec.last_updated_at = datetime.utcnow()
-            rec.source_system = "ATOMICWORK"
+            rec.source_system = ATOMICWORK_SOURCE
         else:
             db.add(
                 AttendanceRecord(
                     emp_id=req.emp_id,
                     day=d,
                     status=req.desired_status,
-                    source_system="ATOMICWORK",
+                    source_system=ATOMICWORK_SOURCE,
                     last_updated_by=actor_emp_id,
                     last_updated_at=datetime.utcnow(),
                 )
@@ -260,14 +532,196 @@ def list_attendance(emp_id: str, start: date, end: date, db: Session = Depends(g
             and_(AttendanceRecord.emp_id == emp_id, AttendanceRecord.day >= start, AttendanceRecord.day <= end)
         ).order_by(AttendanceRecord.day.asc())
     ).scalars().all()
+
+    # Months moved to cold storage are merged back in transparently
+    first, last = month_start(start), month_start(end)
+    if any(first <= m <= last for m in archived_months()):
+        archived = read_archived_attendance(emp_id, start, end)
+        return sorted(archived + list(rows), key=lambda r: r["day"] if isinstance(r, dict) else r.day)
     return rows
 
 
+@app.get("/api/changes", response_model=ChangeFeedOut)
+async def list_changes(cursor: Optional[str] = None, limit: int = 500, wait: float = 0, db: Session = Depends(get_db)):
+    """
+    Incremental change feed over attendance records and change requests.
+    Pass the returned `cursor` back to receive only rows modified since.
+    With `wait` > 0 the call long-polls (up to 30s) until something changes.
+    """
+    limit = max(1, min(limit, 5000))
+    try:
+        seen = change_notifier.version
+        attendance, reqs, next_cursor, has_more = await run_in_threadpool(read_changes, db, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not attendance and not reqs and wait > 0:
+        # Park on the event loop, holding neither a worker thread nor a pooled connection
+        await run_in_threadpool(db.close)
+        if await change_notifier.wait_async(seen, timeout=min(wait, 30.0)):
+            # The notification comes from a primary commit the replica may not have yet
+            attendance, reqs, next_cursor, has_more = await run_in_threadpool(_read_primary_changes, cursor, limit)
+
+    return {"attendance": attendance, "requests": reqs, "cursor": next_cursor, "has_more": has_more}
+
+
+def _read_primary_changes(cursor: Optional[str], limit: int):
+    primary = TenantSessionLocal()
+    try:
+        return read_changes(primary, cursor, limit)
+    finally:
+        primary.close()
+
+
+@app.get("/api/changes/stream")
+async def stream_changes(cursor: Optional[str] = None):
+    """Server-sent events variant of /api/changes: one `changes` event per delta."""
+    try:
+        decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def _read(cur):
+        db = TenantSessionLocal()
+        try:
+            attendance, reqs, next_cursor, has_more = read_changes(db, cur)
+            payload = ChangeFeedOut.model_validate(
+                {"attendance": attendance, "requests": reqs, "cursor": next_cursor, "has_more": has_more},
+                from_attributes=True,
+            )
+            return payload, bool(attendance or reqs)
+        finally:
+            db.close()
+
+    async def _events():
+        cur = cursor
+        while True:
+            seen = change_notifier.version
+            payload, changed = await run_in_threadpool(_read, cur)
+            if changed:
+                cur = payload.cursor
+                yield f"event: changes\ndata: {payload.model_dump_json()}\n\n"
+                if payload.has_more:
+                    continue
+            # Heartbeat comment keeps proxies from closing idle connections
+            if not await change_notifier.wait_async(seen, 15.0):
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(_events(), media_type="text/event-stream")
+
+
+# -----------------------------
+# Analytics
+# -----------------------------
+
+@app.get("/api/analytics/absence-rate")
+def analytics_absence_rate(by: str = "manager", db: Session = Depends(get_db)):
+    if by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"by must be one of {', '.join(GROUP_BY)}")
+    return analytics_cache.report(db, "absence-rate", absence_rate, by=by)
+
+
+@app.get("/api/analytics/monday-friday")
+def analytics_monday_friday(min_absences: int = 3, threshold: float = 0.6, db: Session = Depends(get_db)):
+    return analytics_cache.report(
+        db, "monday-friday", monday_friday_pattern, min_absences=min_absences, threshold=threshold
+    )
+
+
+@app.get("/api/analytics/streaks")
+def analytics_streaks(min_length: int = 3, db: Session = Depends(get_db)):
+    return analytics_cache.report(db, "streaks", absence_streaks, min_length=max(1, min_length))
+
+
+@app.get("/api/analytics/rolling")
+def analytics_rolling(window: int = 7, db: Session = Depends(get_db)):
+    return analytics_cache.report(db, "rolling", rolling_absence_rate, window=max(1, window))
+
+
+@app.get("/api/timesheets/{month}")
+def api_timesheet(month: str, format: str = "json", db: Session = Depends(get_db)):
+    """Org-wide timesheet for one month (YYYY-MM); format=csv for payroll."""
+    try:
+        first = parse_month(month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format not in ("json", "csv"):
+        raise HTTPException(status_code=400, detail="format must be json or csv")
+    generated_at, rows = timesheet_cache.get(db, first)
+    if format == "csv":
+        return Response(
+            timesheet_csv(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="timesheet-{month}.csv"'},
+        )
+    return {"month": month, "generated_at": generated_at, "employees": rows}
+
+
+@app.post("/api/closing/run")
+def api_closing_run(request: Request, since: Optional[date] = None, through: Optional[date] = None):
+    """Run end-of-day closing now (default: the lookback window through yesterday). Admin only."""
+    _require_admin(request)
+    if through and through > date.today():
+        raise HTTPException(status_code=400, detail="Cannot close future days")
+    try:
+        return closing_job.run(since, through)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/api/sla/escalate")
+def api_sla_escalate(request: Request):
+    """Escalate overdue pending requests now instead of waiting for the next poll. Admin only."""
+    _require_admin(request)
+    return escalation_scheduler.run()
+
+
 @app.post("/attendance-requests", response_model=RequestOut, status_code=201)
-def create_request(payload: RequestCreateIn, db: Session = Depends(get_db)):
+def create_request(payload: RequestCreateIn, response: Response, db: Session = Depends(get_db)):
     emp = db.get(Employee, payload.emp_id)
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
+    if payload.date_end < payload.date_start:
+        raise HTTPException(status_code=400, detail="date_end must be >= date_start")
+    if payload.on_overlap not in OVERLAP_POLICIES:
+        raise HTTPException(status_code=400, detail=f"on_overlap must be one of {', '.join(OVERLAP_POLICIES)}")
+
+    # One indexed range query for open requests covering any of the same days
+    overlaps = find_open_overlaps(db, payload.emp_id, payload.request_type, payload.date_start, payload.date_end)
+    related_request_id = None
+    if overlaps:
+        # Retried / repeated submission: hand back the existing request
+        for existing in overlaps:
+            if is_duplicate(existing, payload.date_start, payload.date_end, payload.desired_status):
+                response.status_code = 200
+                return existing
+
+        if payload.on_overlap == "merge":
+            if len(overlaps) > 1 or overlaps[0].desired_status != payload.desired_status:
+                raise HTTPException(status_code=409, detail={
+                    "code": "OVERLAP_NOT_MERGEABLE",
+                    "request_ids": [r.id for r in overlaps],
+                })
+            # Re-read under a row lock: it may have been approved or rejected since the overlap query
+            target = get_for_update(db, AttendanceChangeRequest, overlaps[0].id, "Request")
+            if target is None or target.status not in OPEN_STATUSES:
+                conflict_stats.record("Request")
+                raise ConflictError("Request was changed by another request; reload and retry")
+            merge_into(db, target, payload.date_start, payload.date_end, payload.emp_id, payload.reason_text)
+            commit_or_conflict(db, "Request")
+            change_notifier.notify()
+            db.refresh(target)
+            event_bus.publish("request_created", {"request": _request_event(target), "pending_delta": 0})
+            response.status_code = 200
+            return target
+
+        if payload.on_overlap == "reject":
+            raise HTTPException(status_code=409, detail={
+                "code": "OVERLAPPING_REQUEST",
+                "request_ids": [r.id for r in overlaps],
+            })
+
+        related_request_id = overlaps[0].id
 
     approver_emp_id = emp.manager_emp_id
 
@@ -281,6 +735,7 @@ def create_request(payload: RequestCreateIn, db: Session = Depends(get_db)):
         reason_category=(payload.reason_category or "OTHER"),
         reason_text=payload.reason_text,
         approver_emp_id=approver_emp_id,
+        related_request_id=related_request_id,
         status=RequestStatus.PENDING_APPROVAL.value,
         created_at=datetime.utcnow(),
         updated_at=datetime.utcnow(),
@@ -290,7 +745,9 @@ def create_request(payload: RequestCreateIn, db: Session = Depends(get_db)):
 
     _add_audit(db, req.id, actor_emp_id=payload.emp_id, action="REQUEST_CREATED", comment=payload.reason_text)
     db.commit()
+    change_notifier.notify()
     db.refresh(req)
+    event_bus.publish("request_created", {"request": _request_event(req), "pending_delta": 1})
     return req
 
 
@@ -303,26 +760,32 @@ def get_request(request_id: int, db: Session = Depends(get_db)):
 
 
 @app.get("/attendance-requests/{request_id}/audit", response_model=List[AuditEventOut])
-def get_request_audit(request_id: int, db: Session = Depends(get_db)):
+def get_request_audit(request_id: int, include_archived: bool = False, db: Session = Depends(get_db)):
     req = db.get(AttendanceChangeRequest, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
+    if include_archived:
+        return read_archived_audit(request_id) + list(req.audit_events)
     return req.audit_events
 
 
 @app.post("/attendance-requests/{request_id}/approve", response_model=RequestOut)
 def approve_request(request_id: int, payload: RequestActionIn, db: Session = Depends(get_db)):
-    req = db.get(AttendanceChangeRequest, request_id)
+    with span("load_request"):
+        req = get_for_update(db, AttendanceChangeRequest, request_id, "Request")
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
 
     if req.status not in [RequestStatus.PENDING_APPROVAL.value, RequestStatus.DRAFT.value]:
         raise HTTPException(status_code=409, detail=f"Cannot approve request in status {req.status}")
+    _check_version(req, payload)
 
     # Simple authorization: actor must be configured approver
     if req.approver_emp_id and payload.actor_emp_id != req.approver_emp_id:
         raise HTTPException(status_code=403, detail="Only the configured approver can approve")
 
+    pending_delta = -1 if req.status == RequestStatus.PENDING_APPROVAL.value else 0
+
     req.status = RequestStatus.APPROVED.value
     req.updated_at = datetime.utcnow()
     _add_audit(db, req.id, actor_emp_id=payload.actor_emp_id, action="APPROVED", comment=payload.comment)
@@ -336,33 +799,46 @@ def approve_request(request_id: int, payload: RequestActionIn, db: Session = Dep
         req.status = RequestStatus.FAILED.value
         req.updated_at = datetime.utcnow()
         _add_audit(db, req.id, actor_emp_id=payload.actor_emp_id, action="FAILED", comment=str(e))
-        db.commit()
+        commit_or_conflict(db, "Request")
+        change_notifier.notify()
         db.refresh(req)
+        event_bus.publish("request_approved", {"request": _request_event(req), "pending_delta": pending_delta})
         raise
 
-    db.commit()
-    db.refresh(req)
+    with span("commit"):  # includes the staged audit inserts and the version check
+        commit_or_conflict(db, "Request")
+    change_notifier.notify()
+    if req.request_type == RequestType.UNLOCK.value:
+        unlock_grants.add(req.emp_id, req.date_start, req.date_end)
+    with span("refresh"):
+        db.refresh(req)
+    event_bus.publish("request_approved", {"request": _request_event(req), "pending_delta": pending_delta})
     return req
 
 
 @app.post("/attendance-requests/{request_id}/reject", response_model=RequestOut)
 def reject_request(request_id: int, payload: RequestActionIn, db: Session = Depends(get_db)):
-    req = db.get(AttendanceChangeRequest, request_id)
+    req = get_for_update(db, AttendanceChangeRequest, request_id, "Request")
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
 
     if req.status not in [RequestStatus.PENDING_APPROVAL.value, RequestStatus.DRAFT.value]:
         raise HTTPException(status_code=409, detail=f"Cannot reject request in status {req.status}")
+    _check_version(req, payload)
 
     if req.approver_emp_id and payload.actor_emp_id != req.approver_emp_id:
         raise HTTPException(status_code=403, detail="Only the configured approver can reject")
 
+    pending_delta = -1 if req.status == RequestStatus.PENDING_APPROVAL.value else 0
+
     req.status = RequestStatus.REJECTED.value
     req.updated_at = datetime.utcnow()
     _add_audit(db, req.id, actor_emp_id=payload.actor_emp_id, action="REJECTED", comment=payload.comment)
 
-    db.commit()
+    commit_or_conflict(db, "Request")
+    change_notifier.notify()
     db.refresh(req)
+    event_bus.publish("request_rejected", {"request": _request_event(req), "pending_delta": pending_delta})
     return req
 
 
@@ -373,10 +849,13 @@ def reject_request(request_id: int, payload: RequestActionIn, db: Session = Depe
 # -----------------------------
 # Simulation Logic
 # -----------------------------
-SIMULATION_STATE = "NORMAL"  # NORMAL, HOLIDAY, LOCKOUT
+# Shared across workers via the system_state table (see app/system_state.py)
 
 class SimulationIn(BaseModel):
     state: str
+    scope: str = "GLOBAL"  # GLOBAL | LOCATION | EMPLOYEE
+    scope_key: Optional[str] = None  # location name or emp_id for scoped states
+    actor_emp_id: Optional[str] = None
 
 @app.get("/simulate", response_class=HTMLResponse)
 def simulation_ui(request: Request):
@@ -384,25 +863,30 @@ def simulation_ui(request: Request):
 
 @app.get("/api/simulate")
 def get_simulation_state():
-    return {"state": SIMULATION_STATE}
+    return {"state": system_state.global_state(), "scoped": system_state.scoped(), "version": system_state.version}
 
 @app.post("/api/simulate")
-def set_simulation_state(payload: SimulationIn):
-    global SIMULATION_STATE
-    if payload.state not in ["NORMAL", "HOLIDAY", "LOCKOUT", "UNLOCK_RESTRICTION"]:
+def set_simulation_state(payload: SimulationIn, db: Session = Depends(get_db)):
+    if payload.state not in SIMULATION_STATES:
         raise HTTPException(status_code=400, detail="Invalid state")
-    SIMULATION_STATE = payload.state
-    return {"state": SIMULATION_STATE}
-
-# 2026 Indian Holidays (Fixed Set)
-INDIAN_HOLIDAYS = {
-    (1, 26),  # Republic Day
-    (5, 1),   # Labor Day / Maharashtra Day
-    (8, 15),  # Independence Day
-    (10, 2),  # Gandhi Jayanti
-    (12, 25), # Christmas
-    (11, 8),  # Diwali (Approx for demo)
-}
+    if payload.scope not in SCOPES:
+        raise HTTPException(status_code=400, detail="Invalid scope")
+    if payload.scope != "GLOBAL" and not payload.scope_key:
+        raise HTTPException(status_code=400, detail="scope_key is required for scoped states")
+    version = set_state(db, payload.state, payload.scope, payload.scope_key, actor=payload.actor_emp_id)
+    return {"state": system_state.global_state(), "scoped": system_state.scoped(), "version": version}
+
+# Holiday calendar and marking rules live in app/rules.py
+
+
+@app.get("/sw.js")
+def service_worker():
+    # Served from the root so its scope covers /mobile; always revalidated
+    return Response(
+        service_worker_js(),
+        media_type="application/javascript",
+        headers={"Cache-Control": "no-cache", "Service-Worker-Allowed": "/"},
+    )
 
 
 @app.get("/", response_class=RedirectResponse)
@@ -410,13 +894,29 @@ def root():
     return RedirectResponse(url="/mobile")
 
 
+@app.get("/mobile/login", response_class=HTMLResponse)
+def mobile_login_ui(request: Request):
+    return templates.TemplateResponse("mobile_login.html", {"request": request})
+
+
+@app.post("/mobile/login")
+def mobile_login(emp_id: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
+    # Mock Auth: any active employee with the demo password
+    emp = db.get(Employee, emp_id.strip())
+    if emp and emp.is_active and password == "demo":
+        response = RedirectResponse(url="/mobile", status_code=303)
+        response.set_cookie(key=SESSION_COOKIE, value=session_token(emp.emp_id), httponly=True, samesite="lax")
+        return response
+    return HTMLResponse("Invalid credentials", status_code=401)
+
+
 @app.get("/mobile", response_class=HTMLResponse)
 def mobile_home(request: Request, db: Session = Depends(get_db)):
-    # Mock login: Assume E1001 for demo
-    emp_id = "E1001"
-    emp = db.get(Employee, emp_id)
-    if not emp:
-        return HTMLResponse("<h1>Demo Error: Employee E1001 not found (please check seed data)</h1>")
+    # The page carries the offline sync key, so it is only rendered for a signed-in employee
+    emp_id = session_emp_id(request.cookies.get(SESSION_COOKIE))
+    emp = db.get(Employee, emp_id) if emp_id else None
+    if not emp or not emp.is_active:
+        return RedirectResponse(url="/mobile/login", status_code=303)
 
     today = date.today()
     
@@ -425,36 +925,33 @@ def mobile_home(request: Request, db: Session = Depends(get_db)):
         select(AttendanceRecord).where(and_(AttendanceRecord.emp_id == emp_id, AttendanceRecord.day == today))
     ).scalars().first()
 
-    # Build complete 7-day history (including weekends/holidays)
-    history = []
-    for i in range(1, 8):  # Last 7 days (excluding today)
-        day = today - timedelta(days=i)
-        
-        # Check if weekend or holiday
-        is_weekend = day.weekday() > 4  # Sat=5, Sun=6
-        is_holiday = (day.month, day.day) in INDIAN_HOLIDAYS
-        
-        # Try to get actual record from DB
-        record = db.execute(
-            select(AttendanceRecord).where(and_(AttendanceRecord.emp_id == emp_id, AttendanceRecord.day == day))
-        ).scalars().first()
-        
-        if record:
-            # Use actual record
-            history.append({"day": day, "status": record.status})
-        elif is_weekend:
-            history.append({"day": day, "status": "WEEKEND"})
-        elif is_holiday:
-            history.append({"day": day, "status": "HOLIDAY"})
-        else:
-            # Workday with no record = ABSENT
-            history.append({"day": day, "status": "ABSENT"})
-
+    # Build complete 7-day history (including weekends/holidays), only on a fragment cache miss
+    first_day, last_day = today - timedelta(days=7), today - timedelta(days=1)
+    in_range = and_(AttendanceRecord.emp_id == emp_id, AttendanceRecord.day.between(first_day, last_day))
+    history_version = (emp_id, today) + tuple(db.execute(
+        select(func.count(), func.max(AttendanceRecord.last_updated_at)).where(in_range)
+    ).one())
+
+    def _history():
+        recorded = dict(db.execute(select(AttendanceRecord.day, AttendanceRecord.status).where(in_range)).all())
+        history = []
+        for i in range(1, 8):  # Last 7 days (excluding today)
+            day = today - timedelta(days=i)
+
+            # Closed days are recorded; only days the closing job hasn't reached yet are inferred
+            status = recorded.get(day) or expected_status(emp.location, day)
+            history.append({"day": day, "status": status})
+        return history
+
+    issued_at = int(datetime.now().timestamp())
     return templates.TemplateResponse("mobile_home.html", {
         "request": request, 
         "employee": emp, 
         "today_record": today_record, 
-        "history": history
+        "sync_key": device_key(emp_id, issued_at),
+        "sync_issued_at": issued_at,
+        "history": LazyRows(_history),
+        "history_version": history_version,
     })
 
 
@@ -463,12 +960,55 @@ class MarkAttendanceIn(BaseModel):
     date: str = None # Format YYYY-MM-DD, defaults to today if None
 
 
+class RuleCheckIn(BaseModel):
+    marks: List[MarkAttendanceIn]
+
+
+@app.post("/api/rules/evaluate")
+def evaluate_marks(payload: RuleCheckIn, db: Session = Depends(get_db)):
+    """Dry-run the marking rules over a batch of marks (e.g. before an import)."""
+    emp_ids = {m.emp_id for m in payload.marks}
+    employees = {
+        e.emp_id: e for e in db.execute(select(Employee).where(Employee.emp_id.in_(emp_ids))).scalars()
+    }
+
+    engine = get_rule_engine()
+    now = datetime.now()
+    results = []
+    for mark in payload.marks:
+        emp = employees.get(mark.emp_id)
+        if not emp:
+            results.append({"emp_id": mark.emp_id, "date": mark.date, "allowed": False, "code": "EMPLOYEE_NOT_FOUND"})
+            continue
+        if not emp.is_active:
+            results.append({"emp_id": mark.emp_id, "date": mark.date, "allowed": False, "code": "EMPLOYEE_INACTIVE"})
+            continue
+        try:
+            target = datetime.strptime(mark.date, "%Y-%m-%d").date() if mark.date else now.date()
+        except ValueError:
+            results.append({"emp_id": mark.emp_id, "date": mark.date, "allowed": False, "code": "INVALID_DATE"})
+            continue
+        ctx = MarkContext(
+            emp_id=emp.emp_id,
+            target_date=target,
+            now=now,
+            location=emp.location,
+            sim_state=system_state.effective(emp.emp_id, emp.location),
+            unlock_lookup=lambda e=emp.emp_id, d=target: unlock_grants.covers(e, d),
+        )
+        code = engine.evaluate(ctx)
+        results.append({"emp_id": emp.emp_id, "date": target.isoformat(), "allowed": code is None, "code": code})
+    return results
+
+
 @app.post("/api/mark-attendance")
 def mark_attendance_api(payload: MarkAttendanceIn, db: Session = Depends(get_db)):
     # Verify employee
     emp = db.get(Employee, payload.emp_id)
     if not emp:
         raise HTTPException(status_code=404, detail="Employee not found")
+    if not emp.is_active:
+        raise HTTPException(status_code=403, detail="Employee is inactive")
 
     # Determine target date
     if payload.date:
@@ -478,40 +1018,27 @@ def mark_attendance_api(payload: MarkAttendanceIn, db: Session = Depends(get_db)
              raise HTTPException(status_code=400, detail="Invalid date format")
     else:
         target_date = date.today()
-    
-    today = date.today()
 
     # --- SIMULATION & VALIDATION CHECKS ---
-    global SIMULATION_STATE
-    
-    # 1. System Lockout (Manual Override)
-    if SIMULATION_STATE == "LOCKOUT":
-        raise HTTPException(status_code=400, detail="LOCKOUT_BLOCK")
-
-    # 2. Weekend/Holiday Validation
-    # Rules: Sat(5)/Sun(6) OR in INDIAN_HOLIDAYS OR Manual HOLIDAY state
-    is_weekend = target_date.weekday() > 4
-    is_holiday = (target_date.month, target_date.day) in INDIAN_HOLIDAYS
-    
-    # Validation Logic:
-    # IF (Weekend OR Holiday) AND (State is NOT "UNLOCK_RESTRICTION") -> BLOCK
-    # "UNLOCK_RESTRICTION" allows working on these days (simulating Atom approval)
-    
-    if (is_weekend or is_holiday or SIMULATION_STATE == "HOLIDAY"):
-        if SIMULATION_STATE != "UNLOCK_RESTRICTION":
-            logger.warning(f"Blocking attendance for {payload.emp_id} on {target_date}: HOLIDAY_BLOCK")
-            raise HTTPException(status_code=400, detail="HOLIDAY_BLOCK")
-        
-    # 3. Date Validation (Past/Future)
-    # We enforce this strictly for the demo (no backdated allowed even with unlock, usually)
-    # OR we could allow backdated with unlock? Typically Unlock is for "Restricted Days".
-    # Let's keep Past/Future strict for simplicity unless user asks.
-    if target_date < today:
-        logger.warning(f"Blocking attendance for {payload.emp_id} on {target_date}: PAST_DATE_BLOCK")
-        raise HTTPException(status_code=400, detail="PAST_DATE_BLOCK")
-    if target_date > today:
-        logger.warning(f"Blocking attendance for {payload.emp_id} on {target_date}: FUTURE_DATE_BLOCK")
-        raise HTTPException(status_code=400, detail="FUTURE_DATE_BLOCK")
+    # Lockout, weekend/holiday, backdating and future-date rules are compiled
+    # per location by the rule engine; the shared simulation state is an
+    # in-memory read (employee > location > global).
+    ctx = MarkContext(
+        emp_id=emp.emp_id,
+        target_date=target_date,
+        now=datetime.now(),
+        location=emp.location,
+        sim_state=system_state.effective(emp.emp_id, emp.location),
+        unlock_lookup=lambda: unlock_grants.covers(emp.emp_id, target_date),
+    )
+    code = get_rule_engine().evaluate(ctx)
+    if code:
+        if code != "LOCKOUT_BLOCK":
+            logger.warning(
+                "Blocking attendance for %s on %s: %s", payload.emp_id, target_date, code,
+                extra={"emp_id": payload.emp_id, "day": target_date.isoformat(), "code": code},
+            )
+        raise HTTPException(status_code=400, detail=code)
     # -------------------------
     
     # Check if already marked
@@ -522,27 +1049,70 @@ def mark_attendance_api(payload: MarkAttendanceIn, db: Session = Depends(get_db)
         ))
     ).scalars().first()
 
+    was_present = bool(existing and existing.status == "PRESENT")
     if existing:
         existing.status = "PRESENT"
         existing.last_updated_by = payload.emp_id
         existing.last_updated_at = datetime.utcnow()
-        existing.source_system = "MOBILE_APP"
+        existing.source_system = MOBILE_SOURCE
     else:
         # Create new record
         new_rec = AttendanceRecord(
             emp_id=payload.emp_id,
             day=target_date,
             status="PRESENT",
-            source_system="MOBILE_APP",
+            source_system=MOBILE_SOURCE,
             last_updated_by=payload.emp_id,
             last_updated_at=datetime.utcnow()
         )
         db.add(new_rec)
     
-    db.commit()
+    commit_or_conflict(db, "Attendance for this day")
+    timesheet_cache.invalidate(target_date)
+    change_notifier.notify()
+    _publish_attendance(payload.emp_id, target_date, "PRESENT", was_present)
     return {"status": "success", "message": "Marked present"}
 
 
+@app.post("/api/mobile/sync", response_model=MobileSyncOut)
+async def mobile_sync(request: Request):
+    """
+    Apply a batch of marks queued by the PWA while offline.
+    The raw body must be signed: X-Signature = hex HMAC-SHA256(device key, body),
+    with the key the /mobile page was rendered with at `issued_at`.
+    """
+    received_at = datetime.now()
+    body = await request.body()
+    try:
+        payload = MobileSyncIn.model_validate_json(body)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not verify_signature(payload.emp_id, payload.issued_at, body, request.headers.get("x-signature")):
+        raise HTTPException(status_code=401, detail="Invalid batch signature")
+    if len(payload.marks) > MOBILE_SYNC_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MOBILE_SYNC_MAX_BATCH} marks per batch")
+
+    def _run():
+        db = TenantSessionLocal()
+        try:
+            emp = db.get(Employee, payload.emp_id)
+            if not emp:
+                raise HTTPException(status_code=404, detail="Employee not found")
+            if not emp.is_active:
+                raise HTTPException(status_code=403, detail="Employee is inactive")
+            return sync_offline_marks(db, emp, payload, received_at)
+        finally:
+            db.close()
+
+    summary, changes = await run_in_threadpool(_run)
+    if changes:
+        change_notifier.notify()
+        for day, was_present in changes:
+            timesheet_cache.invalidate(day)
+            _publish_attendance(payload.emp_id, day, "PRESENT", was_present)
+    return summary
+
+
 # -----------------------------
 # Admin UI
 # -----------------------------
@@ -567,24 +1137,55 @@ def admin_dashboard(request: Request, db: Session = Depends(get_db)):
         return RedirectResponse(url="/admin/login")
 
     # Fetch Stats
-    total_emps = db.query(Employee).count()
+    # Aggregates come back as one row per shard when sharded; fan_in combines them
+    total_emps, = fan_in(db.execute(select(func.count()).where(Employee.is_active)).all(), "sum")
     today = date.today()
-    present_today = db.query(AttendanceRecord).filter(
-        AttendanceRecord.day == today, 
-        AttendanceRecord.status == "PRESENT"
-    ).count()
-    
-    reqs = db.execute(select(AttendanceChangeRequest).order_by(AttendanceChangeRequest.created_at.desc())).scalars().all()
-    pending_count = len([r for r in reqs if r.status == "PENDING_APPROVAL"])
-    
+    present_today, = fan_in(db.execute(
+        select(func.count()).where(AttendanceRecord.day == today, AttendanceRecord.status == "PRESENT")
+    ).all(), "sum")
+
+    pending_count, = fan_in(db.execute(
+        select(func.count()).where(AttendanceChangeRequest.status == RequestStatus.PENDING_APPROVAL.value)
+    ).all(), "sum")
+    # The request table is re-rendered only when a request is added or changes
+    requests_version = fan_in(db.execute(
+        select(func.count(), func.max(AttendanceChangeRequest.id), func.max(AttendanceChangeRequest.updated_at))
+    ).all(), "sum", "max", "max")
+    reqs = LazyRows(lambda: sorted(db.execute(
+        select(AttendanceChangeRequest).order_by(AttendanceChangeRequest.created_at.desc())
+    ).scalars().all(), key=lambda r: r.created_at, reverse=True))
+
     return templates.TemplateResponse("admin_dashboard.html", {
         "request": request, 
         "requests": reqs,
+        "requests_version": requests_version,
         "total_employees": total_emps,
         "present_today": present_today,
         "pending_requests": pending_count
     })
 
+@app.get("/admin/events")
+async def admin_events(request: Request):
+    """Live dashboard updates (server-sent events) fed by the in-process event bus."""
+    if not request.cookies.get("admin_session"):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    sub = event_bus.subscribe()
+    _, queue = sub
+
+    async def _stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            event_bus.unsubscribe(sub)
+
+    return StreamingResponse(_stream(), media_type="text/event-stream")
+
 @app.get("/admin/requests/{request_id}", response_class=HTMLResponse)
 def admin_request_detail(request_id: int, request: Request, db: Session = Depends(get_db)):
     if not request.cookies.get("admin_session"):
@@ -606,37 +1207,72 @@ def admin_request_detail(request_id: int, request: Request, db: Session = Depend
 
 @app.get("/api/employees-list", response_model=List[EmployeeOut])
 def api_employees_list(db: Session = Depends(get_db)):
-    return db.query(Employee).all()
+    # Employees deactivated by HR sync are kept for history but not listed
+    return db.query(Employee).filter(Employee.is_active).all()
+
+@app.get("/api/employees/search", response_model=EmployeeSearchOut)
+def api_employees_search(q: str = "", limit: int = 20, offset: int = 0, db: Session = Depends(get_db)):
+    """Paginated search over name, emp_id, email, location and cost center."""
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
+    total, items = search_employees(db, q, limit, offset)
+    return {"total": total, "limit": limit, "offset": offset, "items": items}
+
+@app.post("/api/hr/employees/sync")
+async def api_hr_employee_sync(
+    request: Request, mode: str = "delta", format: Optional[str] = None, dry_run: bool = False, force: bool = False
+):
+    """
+    Bulk employee sync from the HRMS. Body is a CSV (text/csv) or NDJSON snapshot.
+    mode=full soft-deletes employees missing from the snapshot; mode=delta only upserts.
+    Needs an admin session or `Authorization: Bearer $HR_SYNC_TOKEN`.
+    """
+    _require_admin(request, HR_SYNC_TOKEN)
+    try:
+        body = (await request.body()).decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=422, detail="Snapshot must be UTF-8")
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+
+    def _run():
+        db = TenantSessionLocal()
+        try:
+            summary = sync_employees(db, parse_snapshot(body, fmt), mode=mode, dry_run=dry_run, force=force)
+            if not dry_run and (is_sharded(db) or not is_postgres(db.get_bind())):
+                # Rebuild this worker's search index now rather than on the next typeahead
+                employee_index.refresh(db, force=True)
+            return summary
+        finally:
+            db.close()
+
+    try:
+        return await run_in_threadpool(_run)
+    except (SnapshotError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 @app.get("/admin/employees/{emp_id}", response_class=HTMLResponse)
-def admin_employee_detail(request: Request, emp_id: str, db: Session = Depends(get_db)):
+def admin_employee_detail(request: Request, emp_id: str, before: Optional[int] = None,
+                          page_size: int = EMPLOYEE_PAGE_SIZE, db: Session = Depends(get_db)):
     # Check auth
     if not request.cookies.get("admin_session"):
         return RedirectResponse(url="/admin/login")
 
-    emp = db.get(Employee, emp_id)
-    if not emp:
-         raise HTTPException(status_code=404, detail="Employee not found")
-
-    # History
-    history = db.execute(
-        select(AttendanceRecord).where(
-            AttendanceRecord.emp_id == emp_id
-        ).order_by(AttendanceRecord.day.desc()).limit(30)
-    ).scalars().all()
-
-    # Change Requests (Audit Log)
-    start_history = db.execute(
-        select(AttendanceChangeRequest)
-        .where(AttendanceChangeRequest.emp_id == emp_id)
-        .order_by(AttendanceChangeRequest.created_at.desc())
-    ).scalars().all()
+    # Profile, last 30 days and one page of requests, cached per employee version (see app/employee_views.py)
+    page_size = max(1, min(page_size, EMPLOYEE_MAX_PAGE_SIZE))
+    view = employee_views.get(db, emp_id, before, page_size)
+    if view is None:
+        raise HTTPException(status_code=404, detail="Employee not found")
 
     return templates.TemplateResponse("employee_detail.html", {
-        "request": request, 
-        "emp": emp, 
-        "history": history,
-        "change_requests": start_history
+        "request": request,
+        "emp": view["emp"],
+        "history": view["history"],
+        "history_version": (emp_id, view["version"]),
+        "change_requests": view["change_requests"],
+        "requests_version": (emp_id, view["version"], before, page_size),
+        "before": before,
+        "next_before": view["next_before"],
+        "page_size": page_size,
     })
 
 
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .codes import known_source
+from .concurrency import commit_or_conflict
+from .grants import unlock_grants
+from .models import AttendanceRecord, Employee
+from .rules import MarkContext, get_rule_engine
+from .schemas import MobileSyncIn
+from .system_state import system_state
+
+# -----------------------------
+# Offline mobile marking
+# -----------------------------
+#
+# The PWA queues marks while offline and sends them as one batch when it
+# reconnects. Each batch is signed with an HMAC device key that is handed
+# only to a signed-in employee session, and is bound to the server time the
+# page was rendered (`issued_at`). A mark can't have been captured before the
+# page it was captured on was issued, which bounds how far back a device can
+# claim a mark was taken. Marks for today run the marking rules with `now` set
+# to the device time of capture, so a mark tapped before the lockout still
+# counts when it syncs after it. Marks for an earlier day are judged as of the
+# server clock, like an online mark, so they need an unlock grant. The device
+# clock is only trusted if `sent_at` is within CLOCK_TOLERANCE of the server
+# clock, and marks older than MAX_OFFLINE_AGE are refused. Accepted marks are
+# applied in a single transaction. The built-in dev secret is only allowed
+# against the local SQLite database; anywhere else MOBILE_SYNC_SECRET must be
+# set.
+
+_DEV_SYNC_SECRET = "dev-mobile-sync-secret"
+SYNC_SECRET = (os.getenv("MOBILE_SYNC_SECRET") or _DEV_SYNC_SECRET).encode("utf-8")
+CLOCK_TOLERANCE = timedelta(seconds=int(os.getenv("MOBILE_SYNC_CLOCK_TOLERANCE_SECONDS", "300")))
+MAX_OFFLINE_AGE = timedelta(hours=int(os.getenv("MOBILE_SYNC_MAX_AGE_HOURS", "72")))
+MAX_BATCH = 500
+SOURCE_SYSTEM = known_source("MOBILE_APP_OFFLINE")
+SESSION_COOKIE = "employee_session"
+
+
+def check_secret(database_url: str) -> None:
+    """Refuse to start with the public dev secret outside local SQLite development."""
+    if SYNC_SECRET == _DEV_SYNC_SECRET.encode("utf-8") and not database_url.startswith("sqlite"):
+        raise RuntimeError("MOBILE_SYNC_SECRET must be set when not running against the local SQLite database")
+
+
+def _sign(*parts: str) -> str:
+    return hmac.new(SYNC_SECRET, ":".join(parts).encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def session_token(emp_id: str) -> str:
+    """Cookie value for a signed-in employee."""
+    return f"{emp_id}.{_sign('session', emp_id)}"
+
+
+def session_emp_id(token: Optional[str]) -> Optional[str]:
+    """The employee a session cookie was issued to, or None if it is missing or forged."""
+    emp_id, _, signature = (token or "").rpartition(".")
+    if emp_id and hmac.compare_digest(_sign("session", emp_id), signature):
+        return emp_id
+    return None
+
+
+def device_key(emp_id: str, issued_at: int) -> str:
+    """Key for batches queued from a page rendered at `issued_at` (epoch seconds, server clock)."""
+    return _sign("device", emp_id, str(issued_at))
+
+
+def verify_signature(emp_id: str, issued_at: int, body: bytes, signature: Optional[str]) -> bool:
+    if not signature:
+        return False
+    expected = hmac.new(device_key(emp_id, issued_at).encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().lower())
+
+
+def _local(ts: datetime) -> datetime:
+    # Devices send UTC ISO strings; the rule engine works in server-local naive time
+    return ts.astimezone().replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def sync_offline_marks(
+    db: Session, emp: Employee, payload: MobileSyncIn, received_at: Optional[datetime] = None
+) -> Tuple[dict, List[Tuple[date, bool]]]:
+    """Validate and apply a batch of queued marks.
+
+    Returns the response summary and the (day, was_present) pairs that changed,
+    for the caller to publish after the commit.
+    """
+    received_at = received_at or datetime.now()
+    skew = received_at - _local(payload.sent_at)
+    issued = datetime.fromtimestamp(payload.issued_at)
+    trusted_clock = abs(skew) <= CLOCK_TOLERANCE
+    engine = get_rule_engine()
+    sim_state = system_state.effective(emp.emp_id, emp.location)
+
+    results = []
+    accepted: Dict[date, None] = {}
+    for mark in payload.marks:
+        captured = _local(mark.captured_at)
+        code = None
+        if not trusted_clock:
+            code = "CLOCK_SKEW"
+        elif captured > _local(payload.sent_at) + CLOCK_TOLERANCE:
+            code = "CAPTURED_AFTER_SEND"
+        elif captured < issued - CLOCK_TOLERANCE:
+            code = "CAPTURED_BEFORE_ISSUE"
+        elif received_at - captured > MAX_OFFLINE_AGE:
+            code = "STALE_MARK"
+        else:
+            code = engine.evaluate(MarkContext(
+                emp_id=emp.emp_id,
+                target_date=mark.date,
+                # Past days go through the backdating rules (and unlock grants) as of now
+                now=captured if mark.date >= received_at.date() else received_at,
+                location=emp.location,
+                sim_state=sim_state,
+                unlock_lookup=lambda d=mark.date: unlock_grants.covers(emp.emp_id, d),
+            ))
+        if code is None:
+            accepted[mark.date] = None
+        results.append({"client_id": mark.client_id, "date": mark.date, "applied": code is None, "code": code})
+
+    changes = []
+    if accepted:
+        existing = {
+            rec.day: rec
+            for rec in db.execute(
+                select(AttendanceRecord).where(
+                    AttendanceRecord.emp_id == emp.emp_id, AttendanceRecord.day.in_(list(accepted))
+                )
+            ).scalars()
+        }
+        now = datetime.utcnow()
+        for day in accepted:
+            rec = existing.get(day)
+            was_present = bool(rec and rec.status == "PRESENT")
+            if rec:
+                rec.status = "PRESENT"
+                rec.last_updated_by = emp.emp_id
+                rec.last_updated_at = now
+                rec.source_system = SOURCE_SYSTEM
+            else:
+                db.add(AttendanceRecord(
+                    emp_id=emp.emp_id, day=day, status="PRESENT", source_system=SOURCE_SYSTEM,
+                    last_updated_by=emp.emp_id, last_updated_at=now,
+                ))
+            changes.append((day, was_present))
+        # A concurrent mark of one of these days fails the batch with a 409; the app keeps it queued
+        commit_or_conflict(db, "Attendance for this day")
+
+    applied = sum(1 for r in results if r["applied"])
+    summary = {
+        "emp_id": emp.emp_id,
+        "applied": applied,
+        "rejected": len(results) - applied,
+        "clock_skew_seconds": round(skew.total_seconds(), 3),
+        "results": results,
+    }
+    return summary, changes
@@ -4,9 +4,10 @@ from datetime import datetime, date
 from enum import Enum
 from typing import Optional, List
 
-from sqlalchemy import String, DateTime, Date, ForeignKey, Text, Integer
+from sqlalchemy import String, DateTime, Date, ForeignKey, Text, Integer, Index, UniqueConstraint, Boolean, text, true
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from .codes import CodeType, SourceCodeType
 from .db import Base
 
 
@@ -18,10 +19,18 @@ class AttendanceStatus(str, Enum):
     WEEKLY_OFF = "WEEKLY_OFF"
 
 
+# Stored codes (see app/codes.py). Append-only: never renumber or reuse a code.
+ATTENDANCE_STATUS_CODES = {"PRESENT": 1, "ABSENT": 2, "LEAVE": 3, "HOLIDAY": 4, "WEEKLY_OFF": 5}
+
+
 class RequestType(str, Enum):
     UNLOCK = "UNLOCK"
     CORRECT_MARKING = "CORRECT_MARKING"
     HOLIDAY_EXCEPTION = "HOLIDAY_EXCEPTION"
+    ATOMICWORK_SYNC = "ATOMICWORK_SYNC"
+
+
+REQUEST_TYPE_CODES = {"UNLOCK": 1, "CORRECT_MARKING": 2, "HOLIDAY_EXCEPTION": 3, "ATOMICWORK_SYNC": 4}
 
 
 class RequestStatus(str, Enum):
@@ -33,12 +42,23 @@ class RequestStatus(str, Enum):
     FAILED = "FAILED"
 
 
+REQUEST_STATUS_CODES = {
+    "DRAFT": 1, "PENDING_APPROVAL": 2, "APPROVED": 3, "REJECTED": 4, "APPLIED": 5, "FAILED": 6,
+}
+
+
 class ReasonCategory(str, Enum):
     MISTAKE = "MISTAKE"
     HOLIDAY_WORK = "HOLIDAY_WORK"
     SYSTEM_ISSUE = "SYSTEM_ISSUE"
     MANAGER_ON_LEAVE = "MANAGER_ON_LEAVE"
     OTHER = "OTHER"
+    ATOMICWORK = "ATOMICWORK"
+
+
+REASON_CATEGORY_CODES = {
+    "MISTAKE": 1, "HOLIDAY_WORK": 2, "SYSTEM_ISSUE": 3, "MANAGER_ON_LEAVE": 4, "OTHER": 5, "ATOMICWORK": 6,
+}
 
 
 class Employee(Base):
@@ -55,33 +75,81 @@ class Employee(Base):
         String(32), ForeignKey("employees.emp_id"), nullable=True
     )
 
+    # Soft-deleted by HR sync when an employee leaves (see app/hr_sync.py)
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True, server_default=true())
+
+    # Drives incremental refresh of the search index (see app/search.py). Rows
+    # older than the column read as the epoch, so a full load still picks them up.
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True,
+        server_default=text("'1970-01-01 00:00:00'"),
+    )
+
     # Correct SQLAlchemy typing: Optional["Employee"]
     manager: Mapped[Optional["Employee"]] = relationship(
         remote_side=[emp_id], backref="reports"
     )
 
 
+class SourceSystem(Base):
+    """Attendance sources, stored on records as a code (see app/codes.py). Global; on the primary when sharded."""
+
+    __tablename__ = "source_systems"
+
+    code: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(50), unique=True)
+
+
 class AttendanceRecord(Base):
+    """Partitioned by month on `day` on PostgreSQL; old months are archived (see app/archive.py)."""
+
     __tablename__ = "attendance_records"
+    __table_args__ = (
+        # Hot-path lookups: one employee's days, and per-day counts. Unique, so two
+        # writers inserting the same employee-day cannot both succeed.
+        Index("uq_attendance_records_emp_day", "emp_id", "day", unique=True),
+        Index("ix_attendance_records_day_status", "day", "status"),
+        # Keyset index for the change feed (see app/feed.py)
+        Index("ix_attendance_records_updated", "last_updated_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     emp_id: Mapped[str] = mapped_column(String(32), ForeignKey("employees.emp_id"))
     day: Mapped[date] = mapped_column(Date)
-    status: Mapped[str] = mapped_column(String(32))
-    source_system: Mapped[str] = mapped_column(String(50), default="SAP_MOCK")
+    status: Mapped[str] = mapped_column(
+        "status_code", CodeType(ATTENDANCE_STATUS_CODES, AttendanceStatus), key="status"
+    )
+    source_system: Mapped[str] = mapped_column(
+        "source_code", SourceCodeType(), key="source_system", default="SAP_MOCK"
+    )
     last_updated_by: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
     last_updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Optimistic concurrency: every ORM UPDATE is "... WHERE id = ? AND version = ?"
+    version: Mapped[int] = mapped_column(Integer, server_default="1")
 
     employee: Mapped[Employee] = relationship()
 
+    __mapper_args__ = {"version_id_col": version}
+
 
 class AttendanceChangeRequest(Base):
     __tablename__ = "attendance_change_requests"
+    __table_args__ = (
+        Index("ix_attendance_change_requests_updated", "updated_at", "id"),
+        # Overlap lookups on create (see app/dedupe.py)
+        Index("ix_change_requests_emp_range", "emp_id", "date_start", "date_end"),
+        # Overdue scans and approval-time reports (see app/sla.py)
+        Index("ix_change_requests_status_created", "status", "created_at"),
+        # Per-employee request history, newest first (see app/employee_views.py)
+        Index("ix_change_requests_emp_created", "emp_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
 
     emp_id: Mapped[str] = mapped_column(String(32), ForeignKey("employees.emp_id"))
-    request_type: Mapped[str] = mapped_column(String(40))
+    request_type: Mapped[str] = mapped_column(
+        "type_code", CodeType(REQUEST_TYPE_CODES, RequestType), key="request_type"
+    )
 
     date_start: Mapped[date] = mapped_column(Date)
     date_end: Mapped[date] = mapped_column(Date)
@@ -89,27 +157,47 @@ class AttendanceChangeRequest(Base):
     current_status: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
     desired_status: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
 
-    reason_category: Mapped[str] = mapped_column(String(40), default=ReasonCategory.OTHER.value)
+    reason_category: Mapped[str] = mapped_column(
+        "reason_code", CodeType(REASON_CATEGORY_CODES, ReasonCategory), key="reason_category",
+        default=ReasonCategory.OTHER.value,
+    )
     reason_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     approver_emp_id: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
 
-    status: Mapped[str] = mapped_column(String(40), default=RequestStatus.PENDING_APPROVAL.value)
+    # Set when this request overlaps (link) or duplicates (dedupe) another one
+    related_request_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("attendance_change_requests.id"), nullable=True
+    )
+
+    status: Mapped[str] = mapped_column(
+        "status_code", CodeType(REQUEST_STATUS_CODES, RequestStatus), key="status",
+        default=RequestStatus.PENDING_APPROVAL.value,
+    )
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Optimistic concurrency: a stale approve/reject/escalate updates no row (see app/concurrency.py)
+    version: Mapped[int] = mapped_column(Integer, server_default="1")
 
     employee: Mapped[Employee] = relationship(foreign_keys=[emp_id])
 
     audit_events: Mapped[List["AuditEvent"]] = relationship(
         back_populates="request",
         cascade="all, delete-orphan",
-        order_by="AuditEvent.created_at",
+        order_by="[AuditEvent.created_at, AuditEvent.id]",
     )
 
+    __mapper_args__ = {"version_id_col": version}
+
 
 class AuditEvent(Base):
+    """Append-only; monthly partitions on PostgreSQL (see app/partitions.py)."""
+
     __tablename__ = "audit_events"
+    __table_args__ = (
+        Index("ix_audit_events_request_created", "request_id", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     request_id: Mapped[int] = mapped_column(Integer, ForeignKey("attendance_change_requests.id"))
@@ -121,3 +209,39 @@ class AuditEvent(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     request: Mapped[AttendanceChangeRequest] = relationship(back_populates="audit_events")
+
+
+class SystemState(Base):
+    """Simulation / lockout state shared by all workers (see app/system_state.py)."""
+
+    __tablename__ = "system_state"
+    __table_args__ = (
+        UniqueConstraint("scope", "scope_key", name="uq_system_state_scope"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    scope: Mapped[str] = mapped_column(String(20), default="GLOBAL")  # GLOBAL | LOCATION | EMPLOYEE
+    scope_key: Mapped[str] = mapped_column(String(100), default="")
+    state: Mapped[str] = mapped_column(String(32), default="NORMAL")
+    # Monotonic stamp; unique so concurrent writers can't publish the same version
+    version: Mapped[int] = mapped_column(Integer, unique=True)
+    updated_by: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class UnlockGrant(Base):
+    """An approved UNLOCK request, materialized for fast lookup (see app/grants.py)."""
+
+    __tablename__ = "unlock_grants"
+    __table_args__ = (
+        Index("ix_unlock_grants_emp_range", "emp_id", "date_start", "date_end"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    emp_id: Mapped[str] = mapped_column(String(32), ForeignKey("employees.emp_id"))
+    date_start: Mapped[date] = mapped_column(Date)
+    date_end: Mapped[date] = mapped_column(Date)
+    request_id: Mapped[Optional[int]] = mapped_column(
+        Integer, ForeignKey("attendance_change_requests.id"), nullable=True, index=True
+    )
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import warnings
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import MetaData, PrimaryKeyConstraint, text
+from sqlalchemy.engine import Engine
+
+from .db import Base
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Monthly range partitioning
+# -----------------------------
+#
+# On PostgreSQL the tables listed here are created as native range-partitioned
+# parents with one child per month (`<table>_pYYYYMM`) plus a DEFAULT catch-all.
+# On SQLite they stay plain tables; the per-month helpers below fall back to
+# range predicates on the partition column.
+#
+# Each worker re-runs ensure_partitions every PARTITION_CHECK_HOURS, so the
+# months ahead exist even if the cron job stops. If rows for a month already
+# landed in DEFAULT, the month is split out of it (see _create_partition).
+
+PARTITIONED_TABLES = {
+    # table name -> partition column
+    "audit_events": "created_at",
+    "attendance_records": "day",
+}
+
+DEFAULT_MONTHS_AHEAD = 2
+DEFAULT_MONTHS_BACK = 12
+PARTITION_CHECK_HOURS = float(os.environ.get("PARTITION_CHECK_HOURS", "6"))
+
+
+def is_postgres(engine: Engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def add_months(d: date, months: int) -> date:
+    idx = d.year * 12 + (d.month - 1) + months
+    return date(idx // 12, idx % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+
+def _partitioned_metadata() -> MetaData:
+    # Partitioned tables need the partition column in their primary key, so
+    # build the DDL from a copy of the ORM metadata and adjust it there.
+    md = MetaData()
+    for table in Base.metadata.sorted_tables:
+        table.to_metadata(md)
+    for name, column in PARTITIONED_TABLES.items():
+        table = md.tables[name]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c[column]))
+        table.dialect_options["postgresql"]["partition_by"] = f"RANGE ({column})"
+    return md
+
+
+def create_schema(engine: Engine):
+    """Create all tables, using native partitioned parents on PostgreSQL."""
+    if not is_postgres(engine):
+        Base.metadata.create_all(bind=engine)
+        return
+
+    _partitioned_metadata().create_all(bind=engine)
+
+    for name in PARTITIONED_TABLES:
+        ensure_partitions(engine, name, months_back=DEFAULT_MONTHS_BACK)
+
+
+def ensure_partitions(
+    engine: Engine, table: str, months_ahead: int = DEFAULT_MONTHS_AHEAD, months_back: int = 0
+):
+    """Create monthly partitions from `months_back` before this month through `months_ahead` after."""
+    if not is_postgres(engine):
+        return
+    this_month = month_start(date.today())
+    first = add_months(this_month, -months_back)
+    last = add_months(this_month, months_ahead)
+    with engine.begin() as conn:
+        # Every worker runs this on a timer; one at a time per table
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"partitions:{table}"})
+        kind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}).scalar()
+        if kind != "p":
+            logger.warning("%s is not a partitioned table; see 'Partitioning an existing database' in the README", table)
+            return
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_pdefault PARTITION OF {table} DEFAULT"))
+        existing = set(_child_names(conn, table))
+        month = first
+        while month <= last:
+            if partition_name(table, month) not in existing:
+                _create_partition(conn, table, month)
+            month = add_months(month, 1)
+
+
+def partition_existing(engine: Engine, table: str, months_ahead: int = DEFAULT_MONTHS_AHEAD) -> int:
+    """Convert a plain table created before partitioning into a partitioned one; returns rows moved.
+
+    create_all leaves an existing table alone, so databases from before
+    partitioning keep a plain table. This renames it aside, creates the
+    partitioned parent with a partition for every month it holds data for,
+    copies the rows, carries the id sequence on, and drops the old table, all
+    in one transaction (the table is locked throughout). Stop writers first on
+    a large table. A no-op on SQLite or when the table is already partitioned.
+    """
+    if not is_postgres(engine):
+        return 0
+    column = PARTITIONED_TABLES[table]
+    old = f"{table}_unpartitioned"
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"partitions:{table}"})
+        kind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}).scalar()
+        if kind != "r":
+            return 0
+        conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+        # Free every name the new table will claim: the table, its sequence, its indexes
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}).scalar()
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+        if sequence:
+            conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {old}_id_seq"))
+        for index in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :old"), {"old": old}).scalars().all():
+            conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{index[:50]}_unpartitioned"'))
+
+        _partitioned_metadata().tables[table].create(conn)
+        conn.execute(text(f"CREATE TABLE {table}_pdefault PARTITION OF {table} DEFAULT"))
+        oldest = conn.execute(text(f"SELECT min({column}) FROM {old}")).scalar()
+        month = month_start(oldest.date() if isinstance(oldest, datetime) else oldest or date.today())
+        last = add_months(month_start(date.today()), months_ahead)
+        while month <= last:
+            _create_partition(conn, table, month)
+            month = add_months(month, 1)
+
+        columns = ", ".join(c.name for c in Base.metadata.tables[table].columns)
+        moved = conn.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {old}")).rowcount
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT coalesce(max(id), 0) + 1 FROM {table}), false)"
+        ))
+        conn.execute(text(f"DROP TABLE {old}"))
+    logger.info("Partitioned %s (%d rows)", table, moved)
+    return moved
+
+
+def _create_partition(conn, table: str, month: date):
+    name = partition_name(table, month)
+    column = PARTITIONED_TABLES[table]
+    default = f"{table}_pdefault"
+    bounds = {"lo": month, "hi": add_months(month, 1)}
+    ddl = text(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+    stray = conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {column} >= :lo AND {column} < :hi)"), bounds
+    ).scalar()
+    if not stray:
+        conn.execute(ddl)
+        return
+    # PostgreSQL won't create a partition while DEFAULT holds rows in its range:
+    # take DEFAULT out, create the month, move the rows across, and put it back
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    conn.execute(ddl)
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE {column} >= :lo AND {column} < :hi RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds).rowcount
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+    logger.info("Moved %d rows from %s into new partition %s", moved, default, name)
+
+
+def _child_names(conn, table: str) -> List[str]:
+    return conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table"
+    ), {"table": table}).scalars().all()
+
+
+def list_partitions(engine: Engine, table: str) -> List[Tuple[str, date]]:
+    """Return (partition table, month) pairs for the monthly children of `table`."""
+    if not is_postgres(engine):
+        return []
+    with engine.connect() as conn:
+        names = _child_names(conn, table)
+    prefix = f"{table}_p"
+    result = []
+    for name in names:
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and suffix.isdigit() and len(suffix) == 6:
+            result.append((name, date(int(suffix[:4]), int(suffix[4:]), 1)))
+    return sorted(result, key=lambda item: item[1])
+
+
+class PartitionScheduler:
+    """Re-runs ensure_partitions for every partitioned table on a timer, on each PostgreSQL engine."""
+
+    def __init__(self, interval_hours: float = PARTITION_CHECK_HOURS):
+        self.interval = interval_hours * 3600
+        self.last_run: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self._engines: List[Engine] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def run(self):
+        for engine in self._engines:
+            for table in PARTITIONED_TABLES:
+                ensure_partitions(engine, table)
+        self.last_run = datetime.utcnow().isoformat()
+        self.last_error = None
+
+    def start(self, engines: Iterable[Engine]):
+        if self._thread and self._thread.is_alive():
+            return
+        self._engines = [engine for engine in engines if is_postgres(engine)]
+        if not self._engines or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="partition-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("Partition maintenance failed")
+
+
+partition_scheduler = PartitionScheduler()
@@ -0,0 +1,407 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+try:  # Optional: a real shared store when redis-py (with asyncio support) is installed
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - depends on environment
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Rate limiting (token buckets)
+# -----------------------------
+#
+# Each request is matched against the configured limits for its method and
+# path. Every matching limit takes one token from the bucket keyed by
+# (limit, client), (limit, identity) or (limit, emp_id). Buckets refill lazily
+# on access, so state is just two floats per key and a check is a dict lookup
+# plus some arithmetic. The default store is per worker. RATE_LIMIT_STORE=shared
+# moves the buckets into a shared store so all workers count against the same
+# budget. That store is Redis (RATE_LIMIT_REDIS_URL, one awaited Lua round trip
+# per check, so the event loop is never blocked) when configured, otherwise an
+# in-process stand-in with the same interface.
+#
+# A caller's identity is its X-Client-Id, but only when the header can be
+# trusted: it carries a valid X-Client-Signature (hex HMAC-SHA256 of the id
+# under RATE_LIMIT_CLIENT_SECRET), or the connection comes from one of
+# RATE_LIMIT_TRUSTED_PROXIES. "client" limits fall back to the remote address
+# (the X-Forwarded-For hop in front of a trusted proxy); "identity" limits are
+# skipped for callers without one, so an office behind one NAT address isn't
+# throttled as a single client.
+
+DEFAULT_LIMITS = [
+    # Atomicwork retry loops: per integration client, and per employee being synced
+    {"name": "atomicwork_client", "path": "/api/atomicwork/sync-attendance", "key": "client", "rate": 5, "burst": 20},
+    {"name": "atomicwork_emp", "path": "/api/atomicwork/sync-attendance", "key": "emp_id", "rate": 1, "burst": 5},
+    # Mobile marking: a person taps a few times at most; a buggy build loops
+    {"name": "mark_emp", "path": "/api/mark-attendance", "key": "emp_id", "rate": 0.2, "burst": 5},
+    {"name": "mark_client", "path": "/api/mark-attendance", "key": "identity", "rate": 10, "burst": 30},
+    {"name": "mobile_sync_emp", "path": "/api/mobile/sync", "key": "emp_id", "rate": 0.5, "burst": 5},
+    # Everything else under /api, per client
+    {"name": "api_client", "path": "/api/*", "methods": ["GET", "POST"], "key": "client", "rate": 50, "burst": 100},
+]
+
+KEY_KINDS = ("client", "identity", "emp_id")
+ROUTE_CACHE_SIZE = 4096
+MAX_BUCKETS = int(os.environ.get("RATE_LIMIT_MAX_BUCKETS", "100000"))
+CLIENT_SECRET = os.environ.get("RATE_LIMIT_CLIENT_SECRET", "").encode("utf-8")
+TRUSTED_PROXIES = tuple(
+    ipaddress.ip_network(net.strip(), strict=False)
+    for net in os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", "").split(",") if net.strip()
+)
+
+# Tolerates double-encoded JSON bodies (\"emp_id\": \"E1001\")
+_EMP_ID_RE = re.compile(rb'\\?"emp_id\\?"\s*:\s*\\?"([A-Za-z0-9_.\-]{1,64})')
+
+
+@dataclass(frozen=True)
+class Limit:
+    name: str
+    path: str                   # exact path, or a prefix ending in "*"
+    key: str = "client"         # client | identity | emp_id
+    rate: float = 1.0           # tokens per second
+    burst: int = 10
+    methods: Tuple[str, ...] = ("POST",)
+
+    def matches(self, method: str, path: str) -> bool:
+        if method not in self.methods:
+            return False
+        if self.path.endswith("*"):
+            return path.startswith(self.path[:-1])
+        return path == self.path
+
+
+class LocalBucketStore:
+    """Buckets in this worker's memory."""
+
+    def __init__(self, max_keys: int = MAX_BUCKETS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, list] = {}   # key -> [tokens, last_ts, rate, burst]
+
+    def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        """Take one token; returns (allowed, seconds until a token is available)."""
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._sweep(now)
+                self._buckets[key] = [burst - 1.0, now, rate, burst]
+                return True, 0.0
+            tokens = b[0] + (now - b[1]) * rate
+            if tokens > burst:
+                tokens = burst
+            b[1] = now
+            if tokens >= 1.0:
+                b[0] = tokens - 1.0
+                return True, 0.0
+            b[0] = tokens
+            return False, (1.0 - tokens) / rate
+
+    def _sweep(self, now: float):
+        # Drop buckets that have refilled completely; they carry no state
+        full = [k for k, (tokens, ts, rate, burst) in self._buckets.items() if tokens + (now - ts) * rate >= burst]
+        for k in full:
+            del self._buckets[k]
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class LocalStoreClient:
+    """In-process stand-in for the shared store: same atomic token_bucket call, no network."""
+
+    def __init__(self):
+        self._buckets = LocalBucketStore()
+
+    async def token_bucket(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        return self._buckets.take(key, rate, burst)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# Runs atomically in Redis; uses the server clock so workers never disagree on time
+_TOKEN_BUCKET_LUA = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(b[1]) or burst
+local ts = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisStoreClient:
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        self._redis = aioredis.Redis.from_url(url)
+        self._script = self._redis.register_script(_TOKEN_BUCKET_LUA)
+        self._prefix = prefix
+
+    async def token_bucket(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        allowed, tokens = await self._script(keys=[self._prefix + key], args=[rate, burst])
+        return bool(allowed), 0.0 if allowed else (1.0 - float(tokens)) / rate
+
+    def __len__(self):
+        return 0  # not tracked locally
+
+
+class SharedBucketStore:
+    """Buckets in a shared store, one atomic round trip per check."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        return await self.client.token_bucket(key, rate, burst)
+
+    def __len__(self):
+        return len(self.client)
+
+
+class RateLimiter:
+    def __init__(self, limits: List[Limit], store=None):
+        self.limits = limits
+        self.store = store or LocalBucketStore()
+        # Local buckets answer inline; a shared store is awaited
+        self._awaits = isinstance(self.store, SharedBucketStore)
+        self._routes: Dict[Tuple[str, str], Tuple[Limit, ...]] = {}
+        self._lock = threading.Lock()
+        self._counts: Dict[str, List[int]] = {limit.name: [0, 0] for limit in limits}  # name -> [allowed, limited]
+        self._checks = 0
+        self._check_ns = 0
+
+    def limits_for(self, method: str, path: str) -> Tuple[Limit, ...]:
+        route = (method, path)
+        matched = self._routes.get(route)
+        if matched is None:
+            matched = tuple(limit for limit in self.limits if limit.matches(method, path))
+            if len(self._routes) >= ROUTE_CACHE_SIZE:
+                self._routes.clear()  # path parameters make this unbounded otherwise
+            self._routes[route] = matched
+        return matched
+
+    async def check(
+        self, limits: Tuple[Limit, ...], client: str, emp_id: Optional[str], identity: Optional[str] = None
+    ) -> Optional[Tuple[Limit, float]]:
+        """Take a token from every matching bucket; returns (limit, retry_after) for the first one exhausted."""
+        started = time.perf_counter_ns()
+        blocked = None
+        outcomes = []
+        subjects = {"client": client, "identity": identity, "emp_id": emp_id}
+        for limit in limits:
+            subject = subjects[limit.key]
+            if subject is None:
+                continue
+            key = f"{limit.name}:{subject}"
+            if self._awaits:
+                allowed, retry_after = await self.store.take(key, limit.rate, limit.burst)
+            else:
+                allowed, retry_after = self.store.take(key, limit.rate, limit.burst)
+            outcomes.append((limit.name, allowed))
+            if not allowed:
+                blocked = (limit, retry_after)
+                break
+        elapsed = time.perf_counter_ns() - started
+        # Counters are shared by every request (and thread) in this worker
+        with self._lock:
+            for name, allowed in outcomes:
+                self._counts[name][0 if allowed else 1] += 1
+            self._checks += 1
+            self._check_ns += elapsed
+        return blocked
+
+    def metrics(self) -> dict:
+        with self._lock:
+            checks, check_ns = self._checks, self._check_ns
+            limits = {
+                name: {"allowed": allowed, "limited": limited}
+                for name, (allowed, limited) in self._counts.items()
+            }
+        return {
+            "store": type(self.store).__name__,
+            "buckets": len(self.store),
+            "checks": checks,
+            "avg_check_us": round(check_ns / checks / 1000, 3) if checks else 0.0,
+            "limits": limits,
+        }
+
+
+def load_limits() -> List[Limit]:
+    path = os.environ.get("RATE_LIMITS_FILE")
+    config = DEFAULT_LIMITS
+    if path:
+        with open(path) as fh:
+            config = json.load(fh)
+    limits = []
+    for entry in config:
+        entry = dict(entry)
+        if entry.get("key", "client") not in KEY_KINDS:
+            raise ValueError(f"Rate limit {entry.get('name')}: key must be one of {', '.join(KEY_KINDS)}")
+        entry["methods"] = tuple(m.upper() for m in entry.get("methods", ("POST",)))
+        limits.append(Limit(**entry))
+    return limits
+
+
+def build_store():
+    kind = os.environ.get("RATE_LIMIT_STORE", "local")
+    if kind != "shared":
+        return LocalBucketStore()
+    url = os.environ.get("RATE_LIMIT_REDIS_URL")
+    if url and aioredis is not None:
+        return SharedBucketStore(RedisStoreClient(url))
+    if url:
+        logger.warning("RATE_LIMIT_REDIS_URL is set but redis is not installed; using the local stand-in")
+    return SharedBucketStore(LocalStoreClient())
+
+
+class RateLimitMiddleware:
+    """Plain ASGI middleware (no BaseHTTPMiddleware) to keep per-request overhead low."""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limits = self.limiter.limits_for(scope["method"], scope["path"])
+        if not limits:
+            return await self.app(scope, receive, send)
+
+        identity = _client_identity(scope)
+        client = identity or _remote_address(scope)
+        emp_id = None
+        if any(limit.key == "emp_id" for limit in limits):
+            emp_id = _query_emp_id(scope)
+            if emp_id is None:
+                body, receive = await _buffer_body(receive)
+                match = _EMP_ID_RE.search(body)
+                emp_id = match.group(1).decode() if match else None
+
+        blocked = await self.limiter.check(limits, client, emp_id, identity)
+        if blocked is None:
+            return await self.app(scope, receive, send)
+
+        limit, retry_after = blocked
+        payload = json.dumps({"detail": "Rate limit exceeded", "limit": limit.name}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+
+def _trusted_proxy(address: Optional[str]) -> bool:
+    if not TRUSTED_PROXIES or not address:
+        return False
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in net for net in TRUSTED_PROXIES)
+
+
+def _peer(scope) -> Optional[str]:
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _client_identity(scope) -> Optional[str]:
+    """X-Client-Id if it is signed or arrived through a trusted proxy, else None."""
+    client_id = _header(scope, b"x-client-id")
+    if not client_id:
+        return None
+    if _trusted_proxy(_peer(scope)):
+        return client_id
+    signature = _header(scope, b"x-client-signature")
+    if CLIENT_SECRET and signature:
+        expected = hmac.new(CLIENT_SECRET, client_id.encode("latin-1"), hashlib.sha256).hexdigest()
+        if hmac.compare_digest(expected, signature.strip().lower()):
+            return client_id
+    return None
+
+
+def _remote_address(scope) -> str:
+    """The connecting address, or the nearest untrusted X-Forwarded-For hop behind trusted proxies."""
+    address = _peer(scope)
+    if _trusted_proxy(address):
+        forwarded = _header(scope, b"x-forwarded-for") or ""
+        for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+            address = hop
+            if not _trusted_proxy(hop):
+                break
+    return address or "unknown"
+
+
+def _query_emp_id(scope) -> Optional[str]:
+    qs = scope.get("query_string", b"")
+    if b"emp_id=" not in qs:
+        return None
+    for part in qs.split(b"&"):
+        if part.startswith(b"emp_id="):
+            return part[7:].decode("latin-1") or None
+    return None
+
+
+async def _buffer_body(receive):
+    """Read the whole request body and return it with a receive() that replays it."""
+    chunks = []
+    more = True
+    while more:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        more = message.get("more_body", False)
+    body = b"".join(chunks)
+    replayed = False
+
+    async def replay():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return body, replay
+
+
+rate_limiter = RateLimiter(load_limits(), build_store())
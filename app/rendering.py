@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from .tracing import span
+
+# -----------------------------
+# Template rendering
+# -----------------------------
+#
+# Compiled templates are written to a bytecode cache on disk, so a fresh
+# worker loads them instead of re-parsing. Expensive blocks (request tables,
+# history grids) are wrapped in {% cache "name", version %} ... {% endcache %}
+# and stored by (template, name, version), where the view passes a cheap data
+# version such as (count, max(updated_at)). A changed version is a miss;
+# stale entries just age out of the LRU. Render time per template is recorded
+# and sent back in a Server-Timing header.
+
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "attendance-jinja-cache"))
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "1") == "1"
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "512"))
+
+
+class FragmentCache:
+    def __init__(self, max_entries: int = FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> Markup:
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return Markup(html)
+            self.misses += 1
+        # Render outside the lock; two concurrent misses both render, last one wins
+        html = str(render())
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return Markup(html)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache "name", version %}...{% endcache %} backed by `fragment_cache`."""
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [nodes.Const(parser.name), parser.parse_expression()]
+        if parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_cached", args), [], [], body).set_lineno(lineno)
+
+    def _cached(self, template_name, name, version, caller):
+        return fragment_cache.get_or_render((template_name, name, version), caller)
+
+
+class LazyRows:
+    """Defers a query until a template iterates it (i.e. only on a fragment cache miss)."""
+
+    def __init__(self, load: Callable[[], list]):
+        self._load = load
+        self._rows: Optional[list] = None
+
+    @property
+    def rows(self) -> list:
+        if self._rows is None:
+            self._rows = list(self._load())
+        return self._rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class RenderStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, dict] = {}
+
+    def record(self, name: str, elapsed_ms: float):
+        with self._lock:
+            s = self._stats.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            s["count"] += 1
+            s["total_ms"] += elapsed_ms
+            s["max_ms"] = max(s["max_ms"], elapsed_ms)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                name: {
+                    "count": s["count"],
+                    "avg_ms": round(s["total_ms"] / s["count"], 3),
+                    "max_ms": round(s["max_ms"], 3),
+                    "total_ms": round(s["total_ms"], 3),
+                }
+                for name, s in sorted(self._stats.items())
+            }
+
+
+render_stats = RenderStats()
+
+
+class TimedTemplates(Jinja2Templates):
+    """Jinja2Templates that records render time per template."""
+
+    def TemplateResponse(self, *args, **kwargs):
+        if args and isinstance(args[0], str):
+            name = args[0]
+        else:
+            name = kwargs.get("name") or (args[1] if len(args) > 1 else "?")
+        started = time.perf_counter()
+        with span(f"render {name}", template=name):
+            response = super().TemplateResponse(*args, **kwargs)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        render_stats.record(name, elapsed_ms)
+        response.headers.append("Server-Timing", f'tpl;desc="{name}";dur={elapsed_ms:.2f}')
+        return response
+
+
+def build_environment(directory: str, cache_dir: str = TEMPLATE_CACHE_DIR) -> Environment:
+    os.makedirs(cache_dir, exist_ok=True)
+    return Environment(
+        loader=FileSystemLoader(directory),
+        autoescape=True,
+        auto_reload=TEMPLATE_AUTO_RELOAD,
+        bytecode_cache=FileSystemBytecodeCache(cache_dir),
+        extensions=[FragmentCacheExtension],
+    )
+
+
+def build_templates(directory: str) -> TimedTemplates:
+    return TimedTemplates(env=build_environment(directory))
+
+
+def precompile(env: Environment) -> int:
+    """Load every template once so the bytecode cache is populated/warm."""
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompile Jinja templates into the bytecode cache")
+    parser.add_argument("--cache-dir", default=TEMPLATE_CACHE_DIR)
+    args = parser.parse_args(argv)
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+    count = precompile(build_environment(directory, args.cache_dir))
+    print(f"Compiled {count} templates into {args.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from starlette.requests import Request
+
+from .db import ReadSessionLocal, SessionLocal, replica_engine
+from .sharding import TenantSessionLocal, shard_router
+
+# -----------------------------
+# Read/write session routing
+# -----------------------------
+#
+# GET/HEAD handlers get a session on the read replica (REPLICA_DATABASE_URL);
+# everything else gets the primary. After a successful write the client is
+# pinned to the primary for PRIMARY_STICKY_SECONDS through a cookie, so the
+# page it is redirected to reads its own write even if the replica lags.
+# `X-Read-Primary: 1` forces the primary for a single request. Replica
+# sessions refuse to flush, so a GET handler that writes fails loudly instead
+# of writing to the wrong database.
+
+PRIMARY_STICKY_SECONDS = float(os.environ.get("PRIMARY_STICKY_SECONDS", "5"))
+STICKY_COOKIE = "db_primary_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_stats_lock = threading.Lock()
+routing_stats = {"primary": 0, "replica": 0, "sticky": 0}
+
+
+@event.listens_for(ReadSessionLocal, "before_flush")
+def _read_only(session, flush_context, instances):
+    if replica_engine is not None:
+        raise RuntimeError("Replica sessions are read-only; use a non-GET handler for writes")
+
+
+def wants_primary(request: Request) -> bool:
+    if request.method not in SAFE_METHODS:
+        return True
+    if request.headers.get("x-read-primary") == "1":
+        return True
+    until = request.cookies.get(STICKY_COOKIE)
+    if until:
+        try:
+            return float(until) > time.time()
+        except ValueError:
+            return False
+    return False
+
+
+def session_for(request: Request):
+    """Sessionmaker for this request: the replica for plain reads, otherwise the primary."""
+    if shard_router is not None:
+        return TenantSessionLocal  # shards have no replicas of their own
+    if replica_engine is None:
+        return SessionLocal
+    primary = wants_primary(request)
+    with _stats_lock:
+        if primary and request.method in SAFE_METHODS:
+            routing_stats["sticky"] += 1
+        routing_stats["primary" if primary else "replica"] += 1
+    return SessionLocal if primary else ReadSessionLocal
+
+
+class ReadYourWritesMiddleware:
+    """Pins the client to the primary for a few seconds after a successful write."""
+
+    def __init__(self, app, sticky_seconds: float = PRIMARY_STICKY_SECONDS):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or replica_engine is None:
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.sticky_seconds
+                cookie = f"{STICKY_COOKIE}={until:.3f}; Max-Age={int(self.sticky_seconds) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())])
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
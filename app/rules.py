@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# -----------------------------
+# Attendance marking rules
+# -----------------------------
+#
+# Rules are declared as data (DEFAULT_RULES, or a JSON file named by
+# ATTENDANCE_RULES_FILE) and compiled once per location into a tuple of
+# predicates. Evaluating a mark is a walk over that tuple; the first predicate
+# that returns an error code blocks the mark.
+
+# 2026 Indian Holidays (Fixed Set)
+INDIAN_HOLIDAYS = {
+    (1, 26),  # Republic Day
+    (5, 1),   # Labor Day / Maharashtra Day
+    (8, 15),  # Independence Day
+    (10, 2),  # Gandhi Jayanti
+    (12, 25), # Christmas
+    (11, 8),  # Diwali (Approx for demo)
+}
+
+DEFAULT_RULES = {
+    "rules": [
+        {"rule": "lockout"},
+        {
+            "rule": "non_working_day",
+            "weekend": [5, 6],
+            "holidays": sorted(f"{m:02d}-{d:02d}" for m, d in INDIAN_HOLIDAYS),
+            "allow_unlock_grant": True,
+        },
+        # max_days=0 keeps marking same-day only; grace_hours lets a late
+        # shift close out yesterday shortly after midnight.
+        {"rule": "backdate", "max_days": 0, "grace_hours": 0, "allow_unlock_grant": True},
+        {"rule": "future"},
+    ],
+    # Per-location overrides, merged into the matching rule by name, e.g.
+    # {"Hyderabad": {"shift_window": {"start": "07:00", "end": "22:00"}}}
+    "locations": {},
+}
+
+
+@dataclass
+class MarkContext:
+    emp_id: str
+    target_date: date
+    now: datetime
+    location: Optional[str] = None
+    sim_state: str = "NORMAL"
+    # Lazily answers "does an approved UNLOCK cover target_date?"
+    unlock_lookup: Optional[Callable[[], bool]] = None
+    _unlocked: Optional[bool] = field(default=None, repr=False)
+
+    @property
+    def today(self) -> date:
+        return self.now.date()
+
+    @property
+    def unlocked(self) -> bool:
+        if self._unlocked is None:
+            self._unlocked = bool(self.unlock_lookup and self.unlock_lookup())
+        return self._unlocked
+
+
+Predicate = Callable[[MarkContext], Optional[str]]
+
+
+# -----------------------------
+# Rule factories
+# -----------------------------
+
+def _lockout(cfg: dict) -> Predicate:
+    def check(ctx: MarkContext):
+        if ctx.sim_state == "LOCKOUT":
+            return "LOCKOUT_BLOCK"
+    return check
+
+
+Calendar = Tuple[FrozenSet[int], FrozenSet[Tuple[int, int]]]  # (weekend weekdays, (month, day) holidays)
+
+
+def _calendar(cfg: dict) -> Calendar:
+    weekend = frozenset(cfg.get("weekend", (5, 6)))
+    holidays = frozenset(tuple(int(x) for x in h.split("-")) for h in cfg.get("holidays", ()))
+    return weekend, holidays
+
+
+def _non_working_day(cfg: dict) -> Predicate:
+    weekend, holidays = _calendar(cfg)
+    allow_grant = cfg.get("allow_unlock_grant", False)
+
+    def check(ctx: MarkContext):
+        d = ctx.target_date
+        if d.weekday() in weekend or (d.month, d.day) in holidays or ctx.sim_state == "HOLIDAY":
+            # "UNLOCK_RESTRICTION" allows working on these days (simulating Atom approval)
+            if ctx.sim_state == "UNLOCK_RESTRICTION" or (allow_grant and ctx.unlocked):
+                return None
+            return "HOLIDAY_BLOCK"
+    return check
+
+
+def _backdate(cfg: dict) -> Predicate:
+    max_days = int(cfg.get("max_days", 0))
+    grace = timedelta(hours=float(cfg.get("grace_hours", 0)))
+    allow_grant = cfg.get("allow_unlock_grant", False)
+
+    def check(ctx: MarkContext):
+        d = ctx.target_date
+        if d >= ctx.today:
+            return None
+        if (ctx.today - d).days <= max_days:
+            return None
+        # Grace window: the day after `d` is still within `grace` of midnight
+        if grace and ctx.now - datetime.combine(d + timedelta(days=1), time.min) <= grace:
+            return None
+        if allow_grant and ctx.unlocked:
+            return None
+        return "PAST_DATE_BLOCK"
+    return check
+
+
+def _future(cfg: dict) -> Predicate:
+    def check(ctx: MarkContext):
+        if ctx.target_date > ctx.today:
+            return "FUTURE_DATE_BLOCK"
+    return check
+
+
+def _shift_window(cfg: dict) -> Predicate:
+    start = time.fromisoformat(cfg.get("start", "00:00"))
+    end = time.fromisoformat(cfg.get("end", "23:59:59"))
+
+    def check(ctx: MarkContext):
+        # Only same-day marks are clock-bound; backdated marks are governed by `backdate`
+        if ctx.target_date == ctx.today and not (start <= ctx.now.time() <= end):
+            return "OUTSIDE_SHIFT_BLOCK"
+    return check
+
+
+RULE_FACTORIES: Dict[str, Callable[[dict], Predicate]] = {
+    "lockout": _lockout,
+    "non_working_day": _non_working_day,
+    "backdate": _backdate,
+    "future": _future,
+    "shift_window": _shift_window,
+}
+
+
+# -----------------------------
+# Engine
+# -----------------------------
+
+def _merge_location(rules: List[dict], overrides: dict) -> List[dict]:
+    merged = []
+    seen = set()
+    for rule in rules:
+        name = rule["rule"]
+        seen.add(name)
+        override = overrides.get(name)
+        if override is False or (isinstance(override, dict) and override.get("enabled") is False):
+            continue
+        merged.append({**rule, **override} if isinstance(override, dict) else rule)
+    # Rules that only exist for this location (e.g. a shift window) run last
+    for name, override in overrides.items():
+        if name not in seen and isinstance(override, dict) and override.get("enabled", True):
+            merged.append({"rule": name, **override})
+    return merged
+
+
+def compile_rules(rules: List[dict]) -> Tuple[Predicate, ...]:
+    pipeline = []
+    for rule in rules:
+        factory = RULE_FACTORIES.get(rule["rule"])
+        if factory is None:
+            raise ValueError(f"Unknown attendance rule: {rule['rule']}")
+        pipeline.append(factory(rule))
+    return tuple(pipeline)
+
+
+class RuleEngine:
+    def __init__(self, config: dict):
+        self.config = config
+        self._default = compile_rules(config["rules"])
+        # Validate every location up front so bad config fails at startup
+        self._by_location: Dict[str, Tuple[Predicate, ...]] = {
+            loc: compile_rules(_merge_location(config["rules"], overrides))
+            for loc, overrides in config.get("locations", {}).items()
+        }
+
+    def pipeline(self, location: Optional[str]) -> Tuple[Predicate, ...]:
+        return self._by_location.get(location, self._default)
+
+    def calendar(self, location: Optional[str]) -> Calendar:
+        """Weekend and holidays of the location's `non_working_day` rule (none if it is disabled)."""
+        rules = self.config["rules"]
+        overrides = self.config.get("locations", {}).get(location)
+        if overrides is not None:
+            rules = _merge_location(rules, overrides)
+        for rule in rules:
+            if rule["rule"] == "non_working_day":
+                return _calendar(rule)
+        return frozenset(), frozenset()
+
+    def evaluate(self, ctx: MarkContext) -> Optional[str]:
+        """Return the first blocking error code, or None if the mark is allowed."""
+        for check in self.pipeline(ctx.location):
+            code = check(ctx)
+            if code:
+                return code
+        return None
+
+    def evaluate_many(self, contexts: Iterable[MarkContext]) -> List[Optional[str]]:
+        evaluate = self.evaluate
+        return [evaluate(ctx) for ctx in contexts]
+
+
+def load_config() -> dict:
+    path = os.environ.get("ATTENDANCE_RULES_FILE")
+    if path:
+        with open(path) as fh:
+            return json.load(fh)
+    return DEFAULT_RULES
+
+
+_engine_lock = threading.Lock()
+_engine: Optional[RuleEngine] = None
+
+
+def get_rule_engine() -> RuleEngine:
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RuleEngine(load_config())
+    return _engine
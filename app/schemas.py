@@ -1,9 +1,26 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Annotated, Optional, List
 
-from pydantic import BaseModel, Field
+from pydantic import AfterValidator, BaseModel, Field
+
+from .models import AttendanceStatus, ReasonCategory, RequestType
+
+
+def _one_of(enum):
+    # Status columns are stored as codes, so reject unknown names here with a 422
+    names = [m.value for m in enum]
+
+    def check(value: Optional[str]) -> Optional[str]:
+        if value is not None and value not in names:
+            raise ValueError(f"must be one of {', '.join(names)}")
+        return value
+
+    return AfterValidator(check)
+
+
+AttendanceStatusName = Annotated[str, _one_of(AttendanceStatus)]
 
 
 class EmployeeOut(BaseModel):
@@ -11,7 +28,16 @@ class EmployeeOut(BaseModel):
     name: str
     location: Optional[str] = None
     cost_center: Optional[str] = None
+    email: Optional[str] = None
     manager_emp_id: Optional[str] = None
+    is_active: Optional[bool] = True
+
+
+class EmployeeSearchOut(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    items: List[EmployeeOut] = []
 
 
 class AttendanceRecordOut(BaseModel):
@@ -26,18 +52,23 @@ class AttendanceRecordOut(BaseModel):
 
 class RequestCreateIn(BaseModel):
     emp_id: str
-    request_type: str = Field(..., description="UNLOCK | CORRECT_MARKING | HOLIDAY_EXCEPTION")
+    request_type: Annotated[str, _one_of(RequestType)] = Field(
+        ..., description="UNLOCK | CORRECT_MARKING | HOLIDAY_EXCEPTION"
+    )
     date_start: date
     date_end: date
     current_status: Optional[str] = None
-    desired_status: Optional[str] = None
-    reason_category: Optional[str] = None
+    desired_status: Optional[AttendanceStatusName] = None
+    reason_category: Annotated[Optional[str], _one_of(ReasonCategory)] = None
     reason_text: Optional[str] = None
+    on_overlap: str = Field("reject", description="reject | merge | link (when an open request covers the same days)")
 
 
 class RequestActionIn(BaseModel):
     actor_emp_id: str
     comment: Optional[str] = None
+    # The `version` the client saw; a 409 if the request has changed since
+    expected_version: Optional[int] = None
 
 
 class AuditEventOut(BaseModel):
@@ -60,21 +91,59 @@ class RequestOut(BaseModel):
     reason_category: str
     reason_text: Optional[str] = None
     approver_emp_id: Optional[str] = None
+    related_request_id: Optional[int] = None
     status: str
     created_at: datetime
     updated_at: datetime
+    version: int
 
 
 class RequestWithAuditOut(RequestOut):
     audit_events: List[AuditEventOut] = []
 
 
+class OfflineMarkIn(BaseModel):
+    client_id: str = Field(..., max_length=64, description="Client-generated id, echoed back in the result")
+    date: date
+    captured_at: datetime = Field(..., description="Device time when the employee tapped mark present")
+
+
+class MobileSyncIn(BaseModel):
+    emp_id: str
+    device_id: Optional[str] = None
+    issued_at: int = Field(..., description="Server time (epoch seconds) the page's device key was issued")
+    sent_at: datetime = Field(..., description="Device time when the batch was sent")
+    marks: List[OfflineMarkIn]
+
+
+class OfflineMarkResult(BaseModel):
+    client_id: str
+    date: date
+    applied: bool
+    code: Optional[str] = None
+
+
+class MobileSyncOut(BaseModel):
+    emp_id: str
+    applied: int
+    rejected: int
+    clock_skew_seconds: float
+    results: List[OfflineMarkResult] = []
+
+
+class ChangeFeedOut(BaseModel):
+    attendance: List[AttendanceRecordOut] = []
+    requests: List[RequestOut] = []
+    cursor: str
+    has_more: bool = False
+
+
 
 
 
 class AtomicworkSyncIn(BaseModel):
     emp_id: str
     date: date
-    status: str
+    status: AttendanceStatusName
     reason: str
     approval_note: str
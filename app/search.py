@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, func, text, literal_column, or_, and_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .models import Employee
+from .partitions import is_postgres
+from .sharding import is_sharded
+from .system_state import POLL_SECONDS
+
+# -----------------------------
+# Employee search / typeahead
+# -----------------------------
+#
+# On PostgreSQL search runs in the database against a pg_trgm GIN index over
+# name, emp_id, email, location and cost center. Elsewhere each worker keeps
+# an in-memory index: a sorted token list for prefix matches plus a trigram
+# map for substring matches. It is refreshed incrementally from
+# Employee.updated_at, at most once per POLL_SECONDS and only when searched.
+
+SEARCH_FIELDS = ("name", "emp_id", "email", "location", "cost_center")
+MAX_LIMIT = 100
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text_value: str) -> List[str]:
+    return _TOKEN_RE.findall(text_value.lower())
+
+
+def _trigrams(token: str) -> Set[str]:
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _document(emp) -> str:
+    return " ".join(str(getattr(emp, f) or "") for f in SEARCH_FIELDS).lower()
+
+
+class EmployeeSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs: Dict[str, dict] = {}              # emp_id -> row fields
+        self._emp_tokens: Dict[str, Set[str]] = {}    # emp_id -> tokens
+        self._sorted: List[Tuple[str, str]] = []      # (token, emp_id), sorted
+        self._trigrams: Dict[str, Set[str]] = {}      # trigram -> emp_ids
+        self._watermark: Optional[Tuple[datetime, str]] = None  # (updated_at, emp_id) keyset
+        self._last_check = 0.0
+        self._by_name: Optional[List[str]] = None  # cached order for empty queries
+
+    def __len__(self):
+        return len(self._docs)
+
+    # -- maintenance --
+
+    def upsert(self, emp):
+        doc = {f: getattr(emp, f) for f in SEARCH_FIELDS + ("manager_emp_id",)}
+        tokens = set(_tokens(_document(emp)))
+        with self._lock:
+            self._by_name = None
+            self._remove_locked(doc["emp_id"])
+            self._docs[doc["emp_id"]] = doc
+            self._emp_tokens[doc["emp_id"]] = tokens
+            for tok in tokens:
+                insort(self._sorted, (tok, doc["emp_id"]))
+                for tri in _trigrams(tok):
+                    self._trigrams.setdefault(tri, set()).add(doc["emp_id"])
+
+    def apply_batch(self, upserts: List, removals: List[str]):
+        """Bulk variant of upsert/remove: rebuilds the sorted token list once."""
+        changed = {e.emp_id for e in upserts} | set(removals)
+        new_pairs = []
+        with self._lock:
+            self._by_name = None
+            for emp_id in changed:
+                for tok in self._emp_tokens.pop(emp_id, ()):
+                    for tri in _trigrams(tok):
+                        ids = self._trigrams.get(tri)
+                        if ids:
+                            ids.discard(emp_id)
+                self._docs.pop(emp_id, None)
+            trigrams = self._trigrams
+            for emp in upserts:
+                doc = {f: getattr(emp, f) for f in SEARCH_FIELDS + ("manager_emp_id",)}
+                emp_id = doc["emp_id"]
+                tokens = set(_tokens(" ".join(str(doc[f] or "") for f in SEARCH_FIELDS)))
+                self._docs[emp_id] = doc
+                self._emp_tokens[emp_id] = tokens
+                for tok in tokens:
+                    new_pairs.append((tok, emp_id))
+                    for i in range(len(tok) - 2):
+                        ids = trigrams.get(tok[i:i + 3])
+                        if ids is None:
+                            trigrams[tok[i:i + 3]] = {emp_id}
+                        else:
+                            ids.add(emp_id)
+            if not self._sorted:
+                new_pairs.sort()
+                self._sorted = new_pairs
+            else:
+                kept = [pair for pair in self._sorted if pair[1] not in changed]
+                self._sorted = sorted(kept + new_pairs)
+
+    def remove(self, emp_id: str):
+        with self._lock:
+            self._by_name = None
+            self._remove_locked(emp_id)
+
+    def _remove_locked(self, emp_id: str):
+        tokens = self._emp_tokens.pop(emp_id, None)
+        self._docs.pop(emp_id, None)
+        if not tokens:
+            return
+        for tok in tokens:
+            i = bisect_left(self._sorted, (tok, emp_id))
+            if i < len(self._sorted) and self._sorted[i] == (tok, emp_id):
+                del self._sorted[i]
+            for tri in _trigrams(tok):
+                ids = self._trigrams.get(tri)
+                if ids:
+                    ids.discard(emp_id)
+
+    def refresh(self, db: Session, force: bool = False):
+        """Apply employee rows changed since the last refresh."""
+        now = time.monotonic()
+        if not force and now - self._last_check < POLL_SECONDS:
+            return
+        self._last_check = now
+        query = select(*[getattr(Employee, f) for f in SEARCH_FIELDS],
+                       Employee.manager_emp_id, Employee.is_active, Employee.updated_at)
+        if self._watermark is not None:
+            ts, emp_id = self._watermark
+            query = query.where(or_(
+                Employee.updated_at > ts, and_(Employee.updated_at == ts, Employee.emp_id > emp_id)
+            ))
+        upserts, removals = [], []
+        for emp in db.execute(query.order_by(Employee.updated_at, Employee.emp_id)):
+            if emp.is_active is False:
+                removals.append(emp.emp_id)
+            else:
+                upserts.append(emp)
+            # Track the maximum: a sharded session returns each shard's rows in turn
+            if emp.updated_at and (self._watermark is None or (emp.updated_at, emp.emp_id) > self._watermark):
+                self._watermark = (emp.updated_at, emp.emp_id)
+        if upserts or removals:
+            self.apply_batch(upserts, removals)
+
+    # -- queries --
+
+    def _match_term(self, term: str) -> Set[str]:
+        # Prefix matches on whole tokens
+        lo = bisect_left(self._sorted, (term, ""))
+        hits = set()
+        for tok, emp_id in self._sorted[lo:]:
+            if not tok.startswith(term):
+                break
+            hits.add(emp_id)
+        # Substring matches via trigrams (e.g. "sharma" inside an email local part)
+        if len(term) >= 3:
+            grams = _trigrams(term)
+            candidates = None
+            for tri in grams:
+                ids = self._trigrams.get(tri, set())
+                candidates = set(ids) if candidates is None else candidates & ids
+                if not candidates:
+                    break
+            for emp_id in candidates or ():
+                if any(term in tok for tok in self._emp_tokens.get(emp_id, ())):
+                    hits.add(emp_id)
+        return hits
+
+    def _prefix_count(self, term: str) -> int:
+        return bisect_left(self._sorted, (term + "\uffff", "")) - bisect_left(self._sorted, (term, ""))
+
+    def search(self, q: str, limit: int = 20, offset: int = 0) -> Tuple[int, List[dict]]:
+        terms = _tokens(q)
+        with self._lock:
+            if not terms:
+                if self._by_name is None:
+                    self._by_name = sorted(self._docs, key=lambda i: ((self._docs[i]["name"] or "").lower(), i))
+                page = self._by_name[offset:offset + limit]
+                return len(self._by_name), [self._docs[i] for i in page]
+
+            # Expand only the most selective term; filter the others per candidate
+            terms.sort(key=self._prefix_count)
+            ids = self._match_term(terms[0])
+            for term in terms[1:]:
+                if not ids:
+                    break
+                if len(term) >= 3:
+                    ids = {i for i in ids if any(term in tok for tok in self._emp_tokens[i])}
+                else:
+                    ids = {i for i in ids if any(tok.startswith(term) for tok in self._emp_tokens[i])}
+            docs = [self._docs[i] for i in ids]
+
+        q_lower = q.strip().lower()
+
+        def rank(doc):
+            name = (doc["name"] or "").lower()
+            return (
+                doc["emp_id"].lower() != q_lower,
+                not name.startswith(q_lower),
+                name,
+            )
+
+        docs.sort(key=rank)
+        return len(docs), docs[offset:offset + limit]
+
+
+employee_index = EmployeeSearchIndex()
+
+
+# -----------------------------
+# PostgreSQL (pg_trgm)
+# -----------------------------
+
+# Rendered verbatim in both the index and the query so the planner can match them
+SEARCH_SQL = (
+    "lower(name || ' ' || emp_id || ' ' || coalesce(email, '') || ' ' || "
+    "coalesce(location, '') || ' ' || coalesce(cost_center, ''))"
+)
+
+
+def install_trigram_index(engine: Engine):
+    if not is_postgres(engine):
+        return
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_employees_search_trgm ON employees USING gin (({SEARCH_SQL}) gin_trgm_ops)"
+        ))
+
+
+def _search_postgres(db: Session, q: str, limit: int, offset: int) -> Tuple[int, List[Employee]]:
+    expr = literal_column(SEARCH_SQL)
+    criteria = [Employee.is_active.is_not(False)] + [expr.like(f"%{term}%") for term in _tokens(q)]
+    query = select(Employee, func.count().over().label("total")).where(*criteria)
+    if q.strip():
+        query = query.order_by(func.similarity(expr, q.lower()).desc(), Employee.name)
+    else:
+        query = query.order_by(Employee.name)
+    rows = db.execute(query.limit(limit).offset(offset)).all()
+    if rows:
+        return rows[0].total, [r.Employee for r in rows]
+    # An offset past the last match returns no row to carry the window count
+    total = db.execute(select(func.count()).select_from(Employee).where(*criteria)).scalar() if offset else 0
+    return total, []
+
+
+def search_employees(db: Session, q: str, limit: int = 20, offset: int = 0):
+    limit = max(1, min(limit, MAX_LIMIT))
+    offset = max(0, offset)
+    if not is_sharded(db) and is_postgres(db.get_bind()):
+        return _search_postgres(db, q, limit, offset)
+    employee_index.refresh(db)
+    return employee_index.search(q, limit, offset)
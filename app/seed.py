@@ -2,17 +2,28 @@ import random
 from datetime import date, datetime, timedelta, time
 from sqlalchemy.orm import Session
 from sqlalchemy import select
-from app.db import engine, Base, SessionLocal
+from app.db import engine, Base
 from app.models import Employee, AttendanceRecord, AttendanceStatus, AttendanceChangeRequest
+from app.partitions import create_schema
+from app.audit import install_append_only_guard
+from app.search import install_trigram_index
+from app.sharding import TenantSessionLocal, shard_router
+from app.codes import source_codes
+from app.closing import close_days
 
 # Initialize DB tables
 # Base.metadata.create_all(bind=engine) # This line is moved inside the seed function
 
 def seed():
-    # Ensure tables exist
-    Base.metadata.create_all(bind=engine)
+    # Ensure tables exist (partitioned on PostgreSQL)
+    create_schema(engine)
+    install_append_only_guard(engine)
+    install_trigram_index(engine)
+    if shard_router:
+        shard_router.init_shards()
+    source_codes.load()
 
-    db = SessionLocal()
+    db = TenantSessionLocal()
     # 1. Seed Employees
     if not db.query(Employee).first():
         print("Seeding Employees...")
@@ -79,8 +90,8 @@ def seed():
                 status = "LEAVE"
                 src = "HRMS_PORTAL"
             elif i == 14:
-                status = "ABSENT"
-                src = "SYSTEM_AUTO"
+                # Left unmarked: end-of-day closing records it as ABSENT
+                continue
             elif i == 0:
                 # Today: Make Ananya NOT CHECKED IN initially
                 continue
@@ -110,6 +121,9 @@ def seed():
                 ))
 
         db.commit()
+
+        # 4. Close the seeded month: unmarked past days become ABSENT/HOLIDAY/WEEKLY_OFF
+        close_days(today - timedelta(days=29), today - timedelta(days=1))
         print("Seed complete")
     else:
         print("Data already exists.")
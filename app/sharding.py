@@ -0,0 +1,648 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import Column, MetaData, bindparam, delete, func, insert, inspect, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+from .db import Base, SessionLocal, _make_engine, _normalize_url, engine as primary_engine
+from .models import AttendanceChangeRequest, AttendanceRecord, AuditEvent, Employee
+from .partitions import create_schema, is_postgres
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Tenant sharding
+# -----------------------------
+#
+# With SHARD_URLS set, employees, attendance records, change requests and
+# audit events live in one of N shard databases chosen by the employee's
+# tenant key: the email domain (SHARD_KEY=tenant) or the location
+# (SHARD_KEY=location). Global tables (system state, unlock grants) stay on
+# DATABASE_URL, the "primary".
+#
+# Handlers get a SQLAlchemy ShardedSession. New rows go to the owning
+# employee's shard. Reads go to one shard when the WHERE clause pins an
+# emp_id or request id, and to every shard otherwise; rows come back
+# concatenated, so aggregate callers combine them with fan_in(). The shard map
+# file pins tenant -> shard; unpinned tenants are placed by a stable hash.
+# Each shard allocates ids from its own block (shard index * SHARD_ID_BLOCK),
+# so request and audit ids stay unique across shards and survive a move.
+
+SHARD_URLS = os.environ.get("SHARD_URLS")  # "s1=postgresql://...,s2=sqlite:///s2.db"
+SHARD_KEY = os.environ.get("SHARD_KEY", "tenant")
+SHARD_MAP_FILE = Path(os.environ.get("SHARD_MAP_FILE", Path(__file__).resolve().parent.parent / "shard_map.json"))
+ID_BLOCK = int(os.environ.get("SHARD_ID_BLOCK", "100000000"))
+MAP_POLL_SECONDS = float(os.environ.get("SHARD_MAP_POLL_SECONDS", "5"))
+
+SHARD_KEYS = ("tenant", "location")
+PRIMARY = "primary"
+DEFAULT_TENANT = "default"
+SHARDED_MODELS = (Employee, AttendanceRecord, AttendanceChangeRequest, AuditEvent)
+ID_TABLES = ("attendance_records", "attendance_change_requests", "audit_events")
+CHUNK = 1000
+
+if SHARD_KEY not in SHARD_KEYS:
+    raise ValueError(f"SHARD_KEY must be one of {', '.join(SHARD_KEYS)}")
+
+
+def parse_shard_urls(value: Optional[str]) -> Dict[str, str]:
+    shards = {}
+    for part in (value or "").split(","):
+        if not part.strip():
+            continue
+        name, sep, url = part.strip().partition("=")
+        if not sep or not name or name == PRIMARY:
+            raise ValueError(f"Invalid SHARD_URLS entry {part!r}; expected name=url")
+        shards[name] = _normalize_url(url)
+    return shards
+
+
+def tenant_key(email: Optional[str], location: Optional[str]) -> str:
+    if SHARD_KEY == "location":
+        return (location or DEFAULT_TENANT).strip()
+    if email and "@" in email:
+        return email.rsplit("@", 1)[1].strip().lower()
+    return DEFAULT_TENANT
+
+
+def fan_in(rows: Sequence[tuple], *ops: str) -> tuple:
+    """Combine per-shard aggregate rows column by column ("sum", "max" or "min").
+
+    An unsharded session returns a single row, which passes through unchanged.
+    """
+    combined = []
+    for i, op in enumerate(ops):
+        values = [row[i] for row in rows if row[i] is not None]
+        if op == "sum":
+            combined.append(sum(values))
+        elif op == "max":
+            combined.append(max(values) if values else None)
+        elif op == "min":
+            combined.append(min(values) if values else None)
+        else:
+            raise ValueError(f"Unknown fan_in op {op!r}")
+    return tuple(combined)
+
+
+def is_sharded(db: Session) -> bool:
+    return isinstance(db, ShardedSession)
+
+
+class ShardMap:
+    """Pinned tenant -> shard assignments (a JSON file); hash placement for everyone else."""
+
+    def __init__(self, shards: Sequence[str], path: Path = SHARD_MAP_FILE):
+        self.shards = list(shards)
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._pinned: Dict[str, str] = {}
+
+    def reload(self) -> bool:
+        """Re-read the file if it changed; returns True when it did."""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        self._pinned = json.loads(self.path.read_text("utf-8")).get("tenants", {}) if mtime else {}
+        self._mtime = mtime
+        return True
+
+    @property
+    def pinned(self) -> Dict[str, str]:
+        self.reload()
+        return self._pinned
+
+    def shard_for_key(self, key: str) -> str:
+        shard = self._pinned.get(key)
+        if shard in self.shards:
+            return shard
+        return self.shards[zlib.crc32(key.encode("utf-8")) % len(self.shards)]
+
+    def pin(self, key: str, shard: str):
+        if shard not in self.shards:
+            raise ValueError(f"Unknown shard {shard!r}")
+        tenants = dict(self.pinned, **{key: shard})
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"tenants": tenants}, indent=2, sort_keys=True), "utf-8")
+        tmp.replace(self.path)
+        self.reload()
+
+
+def _conjuncts(clause) -> Iterable:
+    # Only top-level AND terms narrow the shard set; a term under OR does not
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        for c in clause.clauses:
+            yield from _conjuncts(c)
+    elif clause is not None:
+        yield clause
+
+
+def _pinned_values(statement, params: dict, column_name: str, table_name: Optional[str] = None) -> Optional[List]:
+    """Values an AND-level `column == x` or `column IN (...)` restricts the statement to.
+
+    Session.get() leaves its bind values empty and passes them as execution parameters.
+    """
+    for term in _conjuncts(getattr(statement, "whereclause", None)):
+        if not isinstance(term, BinaryExpression):
+            continue
+        col, bind = term.left, term.right
+        if isinstance(col, BindParameter):
+            col, bind = bind, col
+        if not isinstance(col, Column) or not isinstance(bind, BindParameter) or col.name != column_name:
+            continue
+        if table_name and col.table.name != table_name:
+            continue
+        value = params.get(bind.key, bind.effective_value)
+        if term.operator is operators.eq:
+            return [value] if value is not None else None
+        if term.operator is operators.in_op:
+            return list(value or [])
+    return None
+
+
+class ShardRouter:
+    def __init__(self, shard_urls: Dict[str, str], map_path: Path = SHARD_MAP_FILE, primary: Engine = primary_engine):
+        if not shard_urls:
+            raise ValueError("At least one shard is required")
+        self.primary = primary
+        self.names = list(shard_urls)
+        self.engines: Dict[str, Engine] = {name: _make_engine(url) for name, url in shard_urls.items()}
+        self.index = {name: i + 1 for i, name in enumerate(self.names)}  # id block 0 belongs to the primary
+        self.shard_map = ShardMap(self.names, map_path)
+        self.shard_map.reload()
+        self._lock = threading.Lock()
+        self._map_checked = time.monotonic()
+        # Directory caches; cleared whenever the shard map changes (a tenant moved)
+        self._employees: Dict[str, str] = {}
+        self._requests: Dict[int, str] = {}
+        self._sessions = {name: sessionmaker(bind=eng, autocommit=False, autoflush=False) for name, eng in self.engines.items()}
+        self.stats = {"single_shard": 0, "fan_out": 0, "probes": 0}
+
+    # -- directory --
+
+    def forget(self):
+        with self._lock:
+            self._employees.clear()
+            self._requests.clear()
+
+    def _check_map(self):
+        now = time.monotonic()
+        if now - self._map_checked >= MAP_POLL_SECONDS:
+            self._map_checked = now
+            if self.shard_map.reload():
+                self.forget()
+
+    def _locate(self, ids: Iterable, table: str, column: str, cache: dict, prefer: Callable = None) -> Dict:
+        """Find the shard of each id not already cached, one IN query per shard and chunk."""
+        missing = [i for i in dict.fromkeys(ids) if i not in cache]
+        if missing:
+            self.stats["probes"] += 1
+            order = sorted(self.names, key=prefer) if prefer else self.names
+            for name in order:
+                if not missing:
+                    break
+                found = set()
+                with self.engines[name].connect() as conn:
+                    for i in range(0, len(missing), CHUNK):
+                        found.update(conn.execute(
+                            text(f"SELECT {column} FROM {table} WHERE {column} IN :ids").bindparams(
+                                bindparam("ids", expanding=True)),
+                            {"ids": missing[i:i + CHUNK]},
+                        ).scalars())
+                with self._lock:
+                    for i in found:
+                        cache[i] = name
+                missing = [i for i in missing if i not in found]
+        return cache
+
+    def shard_for_employee(self, emp_id: str) -> Optional[str]:
+        self._check_map()
+        shard = self._employees.get(emp_id)
+        if shard is None:
+            shard = self._locate([emp_id], "employees", "emp_id", self._employees).get(emp_id)
+        return shard
+
+    def shard_for_request(self, request_id: int) -> Optional[str]:
+        self._check_map()
+        shard = self._requests.get(request_id)
+        if shard is None:
+            # The id block names the shard the request was created on; a move may have changed that
+            block = int(request_id) // ID_BLOCK
+            shard = self._locate([request_id], "attendance_change_requests", "id", self._requests,
+                                 prefer=lambda n: self.index[n] != block).get(request_id)
+        return shard
+
+    def remember_requests(self, shards: Dict[int, str]):
+        with self._lock:
+            self._requests.update(shards)
+
+    def place_employee(self, emp_id: str, email: Optional[str], location: Optional[str]) -> str:
+        shard = self.shard_for_employee(emp_id) or self.shard_map.shard_for_key(tenant_key(email, location))
+        with self._lock:
+            self._employees[emp_id] = shard
+        return shard
+
+    # -- ShardedSession hooks --
+
+    def shard_chooser(self, mapper, instance, clause=None, **kw) -> str:
+        if mapper is None or mapper.class_ not in SHARDED_MODELS:
+            return PRIMARY
+        if instance is None:
+            raise ValueError(f"Cannot pick a shard for {mapper.class_.__name__} without a row; pass a shard_id")
+        if isinstance(instance, Employee):
+            return self.place_employee(instance.emp_id, instance.email, instance.location)
+        if isinstance(instance, AuditEvent):
+            shard = self.shard_for_request(instance.request_id)
+        else:
+            shard = self.shard_for_employee(instance.emp_id)
+        if shard is None:
+            raise ValueError(f"No shard holds the parent of this {mapper.class_.__name__}")
+        return shard
+
+    def identity_chooser(self, mapper, primary_key, *, lazy_loaded_from=None, **kw) -> List[str]:
+        if mapper.class_ not in SHARDED_MODELS:
+            return [PRIMARY]
+        if lazy_loaded_from is not None and lazy_loaded_from.identity_token in self.engines:
+            return [lazy_loaded_from.identity_token]
+        shard = None
+        if mapper.class_ is Employee:
+            shard = self.shard_for_employee(primary_key[0])
+        elif mapper.class_ is AttendanceChangeRequest:
+            shard = self.shard_for_request(primary_key[0])
+        return [shard] if shard else list(self.names)
+
+    def execute_chooser(self, context) -> List[str]:
+        mapper = context.bind_mapper
+        if mapper is not None and mapper.class_ not in SHARDED_MODELS:
+            return [PRIMARY]
+        if context.is_insert:
+            raise ValueError("Bulk INSERT into a sharded table needs bind_arguments={'shard_id': ...}")
+        statement = context.statement
+        params = context.parameters if isinstance(context.parameters, dict) else {}
+        shards = None
+        emp_ids = _pinned_values(statement, params, "emp_id")
+        if emp_ids is not None:
+            shards = {self.shard_for_employee(e) for e in emp_ids}
+        else:
+            request_ids = (
+                _pinned_values(statement, params, "id", "attendance_change_requests")
+                or _pinned_values(statement, params, "request_id", "audit_events")
+            )
+            if request_ids:
+                shards = {self.shard_for_request(r) for r in request_ids}
+        if shards is None:
+            self.stats["fan_out"] += 1
+            return list(self.names)
+        self.stats["single_shard"] += 1
+        # Unknown ids live nowhere; one shard is enough to return the empty result
+        return sorted(s for s in shards if s) or self.names[:1]
+
+    def sessionmaker(self) -> sessionmaker:
+        return sessionmaker(
+            class_=ShardedSession,
+            shards=dict(self.engines, **{PRIMARY: self.primary}),
+            shard_chooser=self.shard_chooser,
+            identity_chooser=self.identity_chooser,
+            execute_chooser=self.execute_chooser,
+            autocommit=False,
+            autoflush=False,
+        )
+
+    # -- bulk statements --
+
+    def group_rows(self, model, rows: List[dict]) -> Dict[str, List[dict]]:
+        """Split executemany parameter rows by the shard that owns them."""
+        if model is AuditEvent:
+            cache = self._locate((r["request_id"] for r in rows), "attendance_change_requests", "id", self._requests)
+            shard_of = lambda r: cache.get(r["request_id"])  # noqa: E731
+        elif model is Employee:
+            self._locate((r["emp_id"] for r in rows), "employees", "emp_id", self._employees)
+            shard_of = lambda r: self.place_employee(r["emp_id"], r.get("email"), r.get("location"))  # noqa: E731
+        else:
+            cache = self._locate((r["emp_id"] for r in rows), "employees", "emp_id", self._employees)
+            shard_of = lambda r: cache.get(r["emp_id"])  # noqa: E731
+        groups: Dict[str, List[dict]] = {}
+        for row in rows:
+            shard = shard_of(row)
+            if shard is None:
+                raise ValueError(f"No shard holds the parent of {row}")
+            groups.setdefault(shard, []).append(row)
+        return groups
+
+    # -- fan-out --
+
+    def fan_out(self, fn: Callable[[str, Session], object]) -> Dict[str, object]:
+        """Run fn(shard_name, session) against every shard in parallel."""
+
+        def run(name):
+            db = self._sessions[name]()
+            try:
+                return name, fn(name, db)
+            finally:
+                db.close()
+
+        with ThreadPoolExecutor(max_workers=len(self.names)) as pool:
+            return dict(pool.map(run, self.names))
+
+    # -- schema --
+
+    def init_shards(self):
+        for name, eng in self.engines.items():
+            init_shard(eng, self.index[name])
+        if is_postgres(self.primary):
+            # Grants on the primary point at employees/requests that now live on the shards
+            with self.primary.begin() as conn:
+                for col in ("emp_id", "request_id"):
+                    conn.execute(text(f"ALTER TABLE unlock_grants DROP CONSTRAINT IF EXISTS unlock_grants_{col}_fkey"))
+
+
+def init_shard(engine: Engine, index: int):
+    """Create the tables on one shard and start its ids at index * ID_BLOCK. Safe to re-run."""
+    from .audit import install_append_only_guard
+
+    start = index * ID_BLOCK
+    if is_postgres(engine):
+        create_schema(engine)
+        with engine.begin() as conn:
+            # A manager may sit in another tenant, hence on another shard
+            conn.execute(text("ALTER TABLE employees DROP CONSTRAINT IF EXISTS employees_manager_emp_id_fkey"))
+            for table in ID_TABLES:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"GREATEST((SELECT COALESCE(MAX(id), 0) FROM {table}), :start))"
+                ), {"start": start})
+    else:
+        # AUTOINCREMENT tables keep their counter in sqlite_sequence, which we can seed
+        md = MetaData()
+        for table in Base.metadata.sorted_tables:
+            copy = table.to_metadata(md)
+            if copy.name in ID_TABLES:
+                copy.dialect_options["sqlite"]["autoincrement"] = True
+        md.create_all(engine)
+        with engine.begin() as conn:
+            for table in ID_TABLES:
+                conn.execute(text(
+                    "INSERT INTO sqlite_sequence (name, seq) SELECT :t, :start "
+                    "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :t)"
+                ), {"t": table, "start": start})
+    install_append_only_guard(engine)
+
+
+# -----------------------------
+# Moving tenants
+# -----------------------------
+
+# Copy order; deletes run in reverse
+MOVE_TABLES = ("employees", "attendance_change_requests", "attendance_records", "audit_events")
+_PK = {"employees": "emp_id"}
+
+
+def _keyed(table):
+    # Rows keyed by column key (status, not status_code) so they feed straight back into insert()
+    return select(*[c.label(c.key) for c in table.columns])
+
+
+def _tenant_rows(conn, key: str) -> Dict[str, List[dict]]:
+    tables = Base.metadata.tables
+    rows = {t: [] for t in MOVE_TABLES}
+    rows["employees"] = [
+        dict(r._mapping) for r in conn.execute(_keyed(tables["employees"]))
+        if tenant_key(r.email, r.location) == key
+    ]
+    emp_ids = [e["emp_id"] for e in rows["employees"]]
+    for i in range(0, len(emp_ids), CHUNK):
+        chunk = emp_ids[i:i + CHUNK]
+        for t in ("attendance_change_requests", "attendance_records"):
+            rows[t] += [dict(r._mapping) for r in conn.execute(_keyed(tables[t]).where(tables[t].c.emp_id.in_(chunk)))]
+    request_ids = [r["id"] for r in rows["attendance_change_requests"]]
+    audit = tables["audit_events"]
+    for i in range(0, len(request_ids), CHUNK):
+        rows["audit_events"] += [
+            dict(r._mapping) for r in conn.execute(_keyed(audit).where(audit.c.request_id.in_(request_ids[i:i + CHUNK])))
+        ]
+    return rows
+
+
+def _insert_rows(conn, rows: Dict[str, List[dict]]):
+    tables = Base.metadata.tables
+    for t in MOVE_TABLES:
+        for i in range(0, len(rows[t]), CHUNK):
+            conn.execute(insert(tables[t]), rows[t][i:i + CHUNK])
+
+
+def _delete_rows(conn, rows: Dict[str, List[dict]]):
+    tables = Base.metadata.tables
+    # Break self references first so the deletes never trip a foreign key
+    req, emp = tables["attendance_change_requests"], tables["employees"]
+    for table, col, ids in (
+        (req, "related_request_id", [r["id"] for r in rows["attendance_change_requests"]]),
+        (emp, "manager_emp_id", [r["emp_id"] for r in rows["employees"]]),
+    ):
+        for i in range(0, len(ids), CHUNK):
+            conn.execute(update(table).where(table.c[_PK.get(table.name, "id")].in_(ids[i:i + CHUNK])).values({col: None}))
+    for t in reversed(MOVE_TABLES):
+        pk = tables[t].c[_PK.get(t, "id")]
+        ids = [r[pk.name] for r in rows[t]]
+        for i in range(0, len(ids), CHUNK):
+            conn.execute(delete(tables[t]).where(pk.in_(ids[i:i + CHUNK])))
+
+
+def _missing(rows: Dict[str, List[dict]], present: Dict[str, List[dict]]) -> Dict[str, List[dict]]:
+    out = {}
+    for t in MOVE_TABLES:
+        pk = _PK.get(t, "id")
+        have = {r[pk] for r in present[t]}
+        out[t] = [r for r in rows[t] if r[pk] not in have]
+    return out
+
+
+def move_tenant(router: ShardRouter, key: str, target: str, sources: Optional[Dict[str, Engine]] = None,
+                settle_seconds: float = MAP_POLL_SECONDS) -> Dict[str, int]:
+    """Copy a tenant to `target`, pin it there, then remove it from the source shards.
+
+    Re-running after a failure is safe: the copy only inserts rows the target
+    does not have yet. Rows *updated* on the source while the copy runs are not
+    carried over, so move a tenant in a quiet window.
+    """
+    if target not in router.engines:
+        raise ValueError(f"Unknown shard {target!r}")
+    if sources is None:
+        sources = {name: eng for name, eng in router.engines.items() if name != target}
+    moved = {t: 0 for t in MOVE_TABLES}
+
+    def copy_missing(eng):
+        with eng.connect() as conn:
+            rows = _tenant_rows(conn, key)
+        if not is_postgres(router.engines[target]):
+            # SQLite AUTOINCREMENT continues after the largest id present, so a row from a
+            # higher block would drag the target's counter into another shard's ids
+            ceiling = (router.index[target] + 1) * ID_BLOCK
+            if any(r["id"] >= ceiling for t in ID_TABLES for r in rows[t]):
+                raise ValueError(f"SQLite shard {target!r} cannot take rows from a higher-numbered shard")
+        with router.engines[target].begin() as conn:
+            new = _missing(rows, _tenant_rows(conn, key))
+            _insert_rows(conn, new)
+        for t in MOVE_TABLES:
+            moved[t] += len(new[t])
+        return rows
+
+    for eng in sources.values():
+        copy_missing(eng)
+    router.shard_map.pin(key, target)
+    router.forget()
+    # Other workers notice the new map within MAP_POLL_SECONDS; catch rows they created meanwhile
+    time.sleep(settle_seconds)
+    for name, eng in sources.items():
+        rows = copy_missing(eng)
+        with eng.begin() as conn:
+            _delete_rows(conn, rows)
+    logger.info("Moved tenant %s to %s: %s", key, target, moved)
+    return moved
+
+
+def split_primary(router: ShardRouter, settle_seconds: float = MAP_POLL_SECONDS) -> Dict[str, Dict[str, int]]:
+    """One-off migration of an unsharded database: move every tenant on the primary to its shard."""
+    with router.primary.connect() as conn:
+        keys = sorted({tenant_key(e, loc) for e, loc in conn.execute(select(Employee.email, Employee.location))})
+    return {
+        key: move_tenant(router, key, router.shard_map.shard_for_key(key), {PRIMARY: router.primary}, settle_seconds)
+        for key in keys
+    }
+
+
+def shard_status(router: ShardRouter) -> dict:
+    def counts(name, db):
+        tenants = {}
+        for email, location in db.execute(select(Employee.email, Employee.location)):
+            k = tenant_key(email, location)
+            tenants[k] = tenants.get(k, 0) + 1
+        return {
+            "tables": {
+                m.__tablename__: db.execute(select(func.count()).select_from(m)).scalar() for m in SHARDED_MODELS
+            },
+            "tenants": tenants,
+        }
+
+    return {
+        "key": SHARD_KEY,
+        "pinned": router.shard_map.pinned,
+        "routing": dict(router.stats),
+        "shards": router.fan_out(counts),
+    }
+
+
+shard_router: Optional[ShardRouter] = ShardRouter(parse_shard_urls(SHARD_URLS)) if SHARD_URLS else None
+# Sessions for tenant data: sharded when configured, otherwise plain primary sessions
+TenantSessionLocal = shard_router.sessionmaker() if shard_router else SessionLocal
+
+
+def all_engines() -> List[Engine]:
+    """The primary followed by every shard."""
+    return [primary_engine] + (list(shard_router.engines.values()) if shard_router is not None else [])
+
+
+def ensure_columns(model, *names: str):
+    """Add columns introduced after a table was first created (create_all never alters a table).
+
+    NOT NULL columns need a server default, which fills existing rows. Databases
+    where the table does not exist yet are skipped; create_all builds it whole.
+    """
+    table = model.__table__
+    for eng in all_engines():
+        insp = inspect(eng)
+        if not insp.has_table(table.name):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        with eng.begin() as conn:
+            for name in names:
+                column = table.c[name]
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=eng.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                    logger.info("Added %s.%s on %s", table.name, column.name, eng.url.render_as_string(hide_password=True))
+
+
+def ensure_indexes(model, *names: str):
+    """create_all only builds indexes with new tables; add these to existing databases (primary and shards)."""
+    indexes = [i for i in model.__table__.indexes if i.name in names]
+    for eng in all_engines():
+        for index in indexes:
+            index.create(eng, checkfirst=True)
+
+
+def _core_bulk(statement, model, rows: List[dict]):
+    """Core equivalent of an ORM bulk INSERT / bulk UPDATE by primary key."""
+    table = model.__table__
+    if statement.is_insert:
+        return insert(table), rows
+    pk = table.primary_key.columns[0].name
+    cols = [c for c in rows[0] if c != pk]
+    stmt = update(table).where(table.c[pk] == bindparam("_pk")).values({c: bindparam(f"_v_{c}") for c in cols})
+    return stmt, [{"_pk": r[pk], **{f"_v_{c}": r[c] for c in cols}} for r in rows]
+
+
+def execute_bulk(db: Session, statement, model, rows: List[dict]):
+    """db.execute(statement, rows) for an ORM bulk INSERT/UPDATE, split by shard on a sharded session."""
+    if not is_sharded(db):
+        db.execute(statement, rows)
+        return
+    if model is AuditEvent:
+        # Requests flushed in this transaction are invisible to the directory's own connections
+        shard_router.remember_requests({
+            pk[0]: token for cls, pk, token in db.identity_map.keys() if cls is AttendanceChangeRequest
+        })
+    # The ORM bulk paths refuse per-shard sessions, so run the Core form on each shard's connection
+    for shard, group in shard_router.group_rows(model, rows).items():
+        db.connection(bind_arguments={"shard_id": shard}).execute(*_core_bulk(statement, model, group))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tenant shard tooling (needs SHARD_URLS)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("init", help="Create tables and id blocks on every shard")
+    sub.add_parser("split", help="Move all tenant data from the primary into the shards")
+    p = sub.add_parser("rebalance", help="Move one tenant to another shard")
+    p.add_argument("tenant")
+    p.add_argument("target")
+    sub.add_parser("pin-all", help="Pin every tenant to its current shard (do this before adding a shard)")
+    sub.add_parser("status")
+    args = parser.parse_args(argv)
+
+    if shard_router is None:
+        parser.error("SHARD_URLS is not set")
+    if args.command == "init":
+        shard_router.init_shards()
+        print(f"Initialized {len(shard_router.names)} shards")
+    elif args.command == "split":
+        print(json.dumps(split_primary(shard_router), indent=2))
+    elif args.command == "rebalance":
+        print(json.dumps(move_tenant(shard_router, args.tenant, args.target), indent=2))
+    elif args.command == "pin-all":
+        for name, info in shard_status(shard_router)["shards"].items():
+            for key in info["tenants"]:
+                shard_router.shard_map.pin(key, name)
+        print(json.dumps(shard_router.shard_map.pinned, indent=2))
+    elif args.command == "status":
+        print(json.dumps(shard_status(shard_router), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
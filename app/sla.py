@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from .audit import stage_audit
+from .concurrency import lock_options
+from .events import event_bus
+from .feed import change_notifier
+from .models import AttendanceChangeRequest, AuditEvent, Employee, RequestStatus
+from .schemas import RequestOut
+from .sharding import TenantSessionLocal, ensure_indexes
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Approval SLA and escalation
+# -----------------------------
+#
+# A request still PENDING_APPROVAL `SLA_HOURS` after it was created (or after
+# its last escalation) moves to the current approver's manager. Candidates come
+# from a range scan on ix_change_requests_status_created; each batch then does
+# one manager lookup and one compare-and-set UPDATE per request, so a request
+# approved (or escalated by another worker) in the meantime is left alone.
+# Every escalation writes an ESCALATED audit event. Requests whose approver has
+# no manager stay where they are and are reported as `stuck`.
+
+SLA_HOURS = float(os.environ.get("SLA_HOURS", "48"))
+POLL_SECONDS = float(os.environ.get("SLA_POLL_SECONDS", "300"))
+BATCH_SIZE = int(os.environ.get("SLA_BATCH_SIZE", "200"))
+ACTOR = "SYSTEM_SLA"
+PERCENTILES = (50, 90, 99)
+
+_PENDING = RequestStatus.PENDING_APPROVAL.value
+_APPROVED = (RequestStatus.APPROVED.value, RequestStatus.APPLIED.value, RequestStatus.FAILED.value)
+
+
+def overdue_ids(db: Session, now: datetime, sla_hours: float = SLA_HOURS) -> List[int]:
+    cutoff = now - timedelta(hours=sla_hours)
+    return list(db.execute(
+        select(AttendanceChangeRequest.id)
+        .where(
+            # Index range: status = PENDING AND created_at < cutoff
+            AttendanceChangeRequest.status == _PENDING,
+            AttendanceChangeRequest.created_at < cutoff,
+            # Escalation restarts the clock
+            AttendanceChangeRequest.updated_at < cutoff,
+        )
+    ).scalars())
+
+
+def _escalate_batch(db: Session, ids: List[int], now: datetime, sla_hours: float) -> tuple:
+    cutoff = now - timedelta(hours=sla_hours)
+    stmt = select(AttendanceChangeRequest).where(AttendanceChangeRequest.id.in_(ids))
+    options = lock_options(db, skip_locked=True)
+    if options:
+        # Requests an approver is acting on right now are left for the next run
+        stmt = stmt.with_for_update(**options)
+    reqs = db.execute(stmt).scalars().all()
+    approvers = {r.approver_emp_id for r in reqs if r.approver_emp_id}
+    managers = dict(db.execute(
+        select(Employee.emp_id, Employee.manager_emp_id).where(Employee.emp_id.in_(approvers))
+    ).all()) if approvers else {}
+
+    escalated, stuck = [], 0
+    for req in reqs:
+        if req.status != _PENDING or req.updated_at >= cutoff:
+            continue
+        current = req.approver_emp_id
+        target = managers.get(current) if current else None
+        if not target or target == req.emp_id:
+            stuck += 1
+            continue
+        # Compare-and-set on the version: only if nobody approved or re-routed it since we read it
+        moved = db.execute(
+            update(AttendanceChangeRequest)
+            .where(
+                AttendanceChangeRequest.id == req.id,
+                AttendanceChangeRequest.version == req.version,
+            )
+            .values(approver_emp_id=target, updated_at=now, version=req.version + 1),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        if not moved:
+            continue
+        hours = (now - req.updated_at).total_seconds() / 3600
+        stage_audit(db, req.id, ACTOR, "ESCALATED", f"Pending {hours:.0f}h with {current}; escalated to {target}")
+        event = RequestOut.model_validate(req, from_attributes=True).model_copy(
+            update={"approver_emp_id": target, "updated_at": now, "version": req.version + 1}
+        )
+        escalated.append(event.model_dump(mode="json"))
+    db.commit()
+    return escalated, stuck
+
+
+def escalate_overdue(db: Session, sla_hours: float = SLA_HOURS, batch_size: int = BATCH_SIZE,
+                     now: Optional[datetime] = None) -> dict:
+    """Escalate every overdue pending request one level up the manager chain."""
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    ids = overdue_ids(db, now, sla_hours)
+    escalated = stuck = 0
+    for i in range(0, len(ids), batch_size):
+        try:
+            events, batch_stuck = _escalate_batch(db, ids[i:i + batch_size], now, sla_hours)
+        except Exception:
+            db.rollback()
+            raise
+        escalated += len(events)
+        stuck += batch_stuck
+        if events:
+            change_notifier.notify()
+            for request in events:
+                event_bus.publish("request_escalated", {"request": request, "pending_delta": 0})
+    summary = {
+        "overdue": len(ids),
+        "escalated": escalated,
+        "stuck": stuck,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    if ids:
+        logger.info("SLA escalation: %s", summary)
+    return summary
+
+
+# -----------------------------
+# Time to approve
+# -----------------------------
+
+def approval_percentiles(db: Session, days: int = 90) -> List[dict]:
+    """Hours from creation to approval, per approving manager, over requests created in the last `days`."""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.execute(
+        select(AuditEvent.actor_emp_id, AttendanceChangeRequest.created_at, AuditEvent.created_at)
+        .join(AttendanceChangeRequest, AttendanceChangeRequest.id == AuditEvent.request_id)
+        .where(
+            AttendanceChangeRequest.status.in_(_APPROVED),
+            AttendanceChangeRequest.created_at >= since,
+            AuditEvent.action == "APPROVED",
+        )
+    ).all()
+    hours: Dict[str, list] = {}
+    for approver, created, approved in rows:
+        hours.setdefault(approver or "UNKNOWN", []).append((approved - created).total_seconds() / 3600)
+
+    out = []
+    for approver, values in hours.items():
+        arr = np.asarray(values)
+        row = {"approver_emp_id": approver, "approved": int(arr.size)}
+        for p, v in zip(PERCENTILES, np.percentile(arr, PERCENTILES).tolist()):
+            row[f"p{p}_hours"] = round(v, 2)
+        row["max_hours"] = round(float(arr.max()), 2)
+        out.append(row)
+    out.sort(key=lambda r: -r["p90_hours"])
+    return out
+
+
+def pending_by_approver(db: Session, sla_hours: float = SLA_HOURS) -> Dict[str, dict]:
+    cutoff = datetime.utcnow() - timedelta(hours=sla_hours)
+    overdue = (AttendanceChangeRequest.created_at < cutoff) & (AttendanceChangeRequest.updated_at < cutoff)
+    counts: Dict[str, dict] = {}
+    for approver, pending, late in db.execute(
+        select(AttendanceChangeRequest.approver_emp_id, func.count(),
+               func.sum(case((overdue, 1), else_=0)))
+        .where(AttendanceChangeRequest.status == _PENDING)
+        .group_by(AttendanceChangeRequest.approver_emp_id)
+    ):
+        entry = counts.setdefault(approver or "UNASSIGNED", {"pending": 0, "overdue": 0})
+        # Sharded sessions return one row per shard
+        entry["pending"] += pending
+        entry["overdue"] += int(late or 0)
+    return counts
+
+
+# -----------------------------
+# Scheduler
+# -----------------------------
+
+class EscalationScheduler:
+    def __init__(self, session_factory=TenantSessionLocal):
+        self._session_factory = session_factory
+        self.last_run: Optional[dict] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._poller: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def run(self) -> dict:
+        with self._lock:
+            db = self._session_factory()
+            try:
+                summary = escalate_overdue(db)
+            finally:
+                db.close()
+            self.last_run = {**summary, "finished_at": datetime.utcnow().isoformat()}
+            self.last_error = None
+        return summary
+
+    def start(self, interval: float = POLL_SECONDS):
+        if interval <= 0 or (self._poller and self._poller.is_alive()):
+            return
+        ensure_indexes(AttendanceChangeRequest, "ix_change_requests_status_created")
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._poll, args=(interval,), name="sla-escalation", daemon=True)
+        self._poller.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.run()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.exception("SLA escalation failed")
+
+    def stats(self) -> dict:
+        return {
+            "sla_hours": SLA_HOURS,
+            "poll_seconds": POLL_SECONDS,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
+
+
+escalation_scheduler = EscalationScheduler()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Approval SLA tooling")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("escalate", help="Escalate overdue pending requests now")
+    p.add_argument("--sla-hours", type=float, default=SLA_HOURS)
+    p = sub.add_parser("percentiles", help="Time-to-approve percentiles per approver")
+    p.add_argument("--days", type=int, default=90)
+    args = parser.parse_args(argv)
+
+    db = TenantSessionLocal()
+    try:
+        if args.command == "escalate":
+            result = escalate_overdue(db, sla_hours=args.sla_hours)
+        else:
+            result = approval_percentiles(db, days=args.days)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
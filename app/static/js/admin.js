@@ -0,0 +1,137 @@
+// Navigation Logic
+function showView(viewId) {
+    document.querySelectorAll('.view-section').forEach(el => el.classList.remove('active'));
+    document.getElementById(viewId).classList.add('active');
+
+    document.querySelectorAll('.nav-item').forEach(el => el.classList.remove('active'));
+    event.target.classList.add('active');
+
+    document.getElementById('pageTitle').innerText = viewId.charAt(0).toUpperCase() + viewId.slice(1);
+
+    if (viewId === 'employees') loadEmployees();
+    if (viewId === 'system') loadSimState();
+}
+
+// Employee Data Logic (server-side search, paginated)
+const EMP_PAGE_SIZE = 50;
+let empQuery = '';
+let empResults = [];
+let empTotal = 0;
+let empLoaded = false;
+let empSearchTimer = null;
+let empSearchSeq = 0;
+
+async function fetchEmployees(offset) {
+    const seq = ++empSearchSeq;
+    const params = new URLSearchParams({ q: empQuery, limit: EMP_PAGE_SIZE, offset: offset });
+    const res = await fetch('/api/employees/search?' + params);
+    const data = await res.json();
+    if (seq !== empSearchSeq) return; // a newer search superseded this one
+    empResults = offset === 0 ? data.items : empResults.concat(data.items);
+    empTotal = data.total;
+    renderTable(empResults);
+}
+
+async function loadEmployees() {
+    if (empLoaded) return; // cache first page
+    empLoaded = true;
+    await fetchEmployees(0);
+}
+
+function loadMoreEmployees() {
+    fetchEmployees(empResults.length);
+}
+
+function renderTable(data) {
+    document.getElementById('empResultCount').innerText = `Showing ${data.length} of ${empTotal}`;
+    document.getElementById('empLoadMore').style.display = data.length < empTotal ? 'inline-block' : 'none';
+    const tbody = document.getElementById('empTableBody');
+    tbody.innerHTML = data.map(e => `
+    <tr style="cursor: pointer;" onclick="window.location.href='/admin/employees/${e.emp_id}'">
+        <td><a href="/admin/employees/${e.emp_id}" style="font-weight:bold; color:var(--dr-purple); text-decoration:none;">${e.emp_id}</a></td>
+        <td>${e.name}</td>
+        <td>${e.location}</td>
+        <td>${e.manager_emp_id || '-'}</td>
+        <td><span class="badge badge-present">Present</span></td> 
+        <td style="text-align:center;">
+            <a href="/admin/employees/${e.emp_id}" class="sim-btn" style="background:var(--dr-purple); color:white; text-decoration:none; font-size:12px; padding:5px 10px;">View</a>
+        </td>
+    </tr>
+`).join('');
+}
+
+function filterTable() {
+    clearTimeout(empSearchTimer);
+    empSearchTimer = setTimeout(() => {
+        empQuery = document.getElementById('empSearch').value.trim();
+        fetchEmployees(0);
+    }, 150);
+}
+
+// Simulation Logic
+async function loadSimState() {
+    const res = await fetch('/api/simulate');
+    const data = await res.json();
+    document.getElementById('simState').innerText = data.state;
+}
+async function setSim(state) {
+    await fetch('/api/simulate', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ state: state })
+    });
+    loadSimState();
+}
+
+// Live Updates (SSE): patch counters and request rows in place
+function bumpCounter(id, delta) {
+    if (!delta) return;
+    const el = document.getElementById(id);
+    el.innerText = parseInt(el.innerText || '0', 10) + delta;
+}
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.innerText = text == null ? '' : text;
+    return div.innerHTML;
+}
+
+function upsertRequestRow(req) {
+    const existing = document.getElementById('req-row-' + req.id);
+    if (existing) {
+        existing.querySelector('.req-status').innerText = req.status;
+        return;
+    }
+    const row = document.createElement('tr');
+    row.id = 'req-row-' + req.id;
+    row.innerHTML = `
+        <td>#${req.id}</td>
+        <td>${escapeHtml(req.emp_id)}</td>
+        <td>${escapeHtml(req.request_type)}</td>
+        <td>${req.date_start} - ${req.date_end}</td>
+        <td>${escapeHtml(req.reason_text || '-')}</td>
+        <td class="req-status">${escapeHtml(req.status)}</td>
+        <td>
+            <a href="/admin/requests/${req.id}" class="sim-btn"
+                style="background:#3b82f6; color:white; text-decoration:none; font-size:12px; padding:5px 10px;">Audit</a>
+        </td>`;
+    document.getElementById('reqTableBody').prepend(row);
+}
+
+function onRequestEvent(e) {
+    const data = JSON.parse(e.data);
+    upsertRequestRow(data.request);
+    bumpCounter('pendingRequests', data.pending_delta);
+}
+
+const liveEvents = new EventSource('/admin/events');
+liveEvents.addEventListener('request_created', onRequestEvent);
+liveEvents.addEventListener('request_approved', onRequestEvent);
+liveEvents.addEventListener('request_rejected', onRequestEvent);
+liveEvents.addEventListener('request_escalated', onRequestEvent);
+liveEvents.addEventListener('attendance_marked', e => {
+    bumpCounter('presentToday', JSON.parse(e.data).present_delta);
+});
+
+// Auto-load sim state on init
+loadSimState();
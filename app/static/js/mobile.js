@@ -0,0 +1,213 @@
+// Initial state check
+const currentStatus = document.getElementById('statusText').innerText.trim();
+const btn = document.getElementById('checkInBtn');
+const dateInput = document.getElementById('attendanceDate');
+
+// Set default date to today
+dateInput.valueAsDate = new Date();
+
+// If today is present, we don't disable because we want to allow picking other dates.
+// But we could change the text if TODAY is picked.
+// For simple demo, we leave it as "Attendance Checkin"
+
+async function markAttendance() {
+    const btn = document.getElementById('checkInBtn');
+    const spinner = document.getElementById('btnSpinner');
+    const btnText = document.getElementById('btnText');
+    const selectedDate = document.getElementById('attendanceDate').value;
+
+    if (!selectedDate) {
+        showToast("Please select a date");
+        return;
+    }
+
+    if (!navigator.onLine) {
+        queueMark(selectedDate);
+        return;
+    }
+
+    btn.disabled = true;
+    spinner.style.display = 'block';
+    btnText.style.display = 'none';
+
+    try {
+        const response = await fetch('/api/mark-attendance', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ emp_id: empId, date: selectedDate })
+        });
+
+        if (response.ok) {
+            showToast("Checked In Successfully!");
+
+            const todayDateStr = new Date().toISOString().split('T')[0];
+            if (selectedDate === todayDateStr) {
+                const statusCard = document.getElementById('statusCard');
+                const statusText = document.getElementById('statusText');
+                statusCard.classList.remove('absent');
+                statusCard.classList.add('present');
+                statusText.innerText = "PRESENT";
+
+                // Visual feedback for today (optional, but good)
+                btn.style.background = "#e5e7eb";
+                btn.style.color = "#4b5563";
+                btn.style.boxShadow = "none";
+                btnText.innerText = "Checked In";
+            }
+
+            spinner.style.display = 'none';
+            if (selectedDate === todayDateStr) {
+                btnText.style.display = 'block';
+            } else {
+                // Reset for other tasks
+                btn.disabled = false;
+                btnText.style.display = 'block';
+            }
+
+        } else {
+            const data = await response.json();
+
+            if (data.detail === "PAST_DATE_BLOCK") {
+                showToast("⚠️ Past dates blocked. Request unlock via Atom.");
+            } else if (data.detail === "FUTURE_DATE_BLOCK") {
+                showToast("⚠️ Future check-in not allowed.");
+            } else if (data.detail === "HOLIDAY_BLOCK") {
+                showToast("🏖️ Holiday/Weekend blocked. Request unlock via Atom.");
+            } else if (data.detail === "LOCKOUT_BLOCK") {
+                showToast("🔒 Account Locked. Contact Atom.");
+            } else {
+                showToast("Error: " + (data.detail || "Unknown error"));
+            }
+
+            btn.disabled = false;
+            spinner.style.display = 'none';
+            btnText.style.display = 'block';
+        }
+    } catch (e) {
+        // No connection: keep the mark and send it with the next batch
+        console.error(e);
+        queueMark(selectedDate);
+        btn.disabled = false;
+        spinner.style.display = 'none';
+        btnText.style.display = 'block';
+    }
+}
+
+function showToast(msg) {
+    const toast = document.getElementById('toast');
+    toast.innerText = msg;
+    toast.classList.add('visible');
+    setTimeout(() => {
+        toast.classList.remove('visible');
+    }, 3000);
+}
+
+// Cache the app shell and hashed assets for slow or offline field networks
+if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.register('/sw.js').catch(err => console.warn('Service worker not registered', err));
+}
+
+// --- Offline queue ---
+// Marks taken without a connection are stored with the time of the tap and
+// sent as signed batches to /api/mobile/sync when the device is back online.
+// Each mark remembers the key of the page it was taken on: the server rejects
+// marks captured before that page was issued.
+const QUEUE_KEY = 'attendanceQueue:' + empId;
+const KEYS_KEY = 'syncKeys:' + empId;
+
+function loadQueue() {
+    try {
+        return JSON.parse(localStorage.getItem(QUEUE_KEY)) || [];
+    } catch (e) {
+        return [];
+    }
+}
+
+function saveQueue(queue) {
+    localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+}
+
+function queueMark(selectedDate) {
+    const queue = loadQueue();
+    const clientId = (crypto.randomUUID ? crypto.randomUUID() : Date.now() + '-' + Math.random());
+    queue.push({ client_id: clientId, date: selectedDate, captured_at: new Date().toISOString(), issued_at: syncIssuedAt });
+    saveSyncKey();
+    saveQueue(queue);
+    showToast("Saved offline. Will sync when connected (" + queue.length + " pending)");
+}
+
+function loadSyncKeys() {
+    try {
+        return JSON.parse(localStorage.getItem(KEYS_KEY)) || {};
+    } catch (e) {
+        return {};
+    }
+}
+
+function saveSyncKey() {
+    const keys = loadSyncKeys();
+    keys[syncIssuedAt] = syncKey;
+    localStorage.setItem(KEYS_KEY, JSON.stringify(keys));
+}
+
+async function signBatch(body, rawKey) {
+    const enc = new TextEncoder();
+    const key = await crypto.subtle.importKey('raw', enc.encode(rawKey), { name: 'HMAC', hash: 'SHA-256' }, false, ['sign']);
+    const sig = await crypto.subtle.sign('HMAC', key, enc.encode(body));
+    return Array.from(new Uint8Array(sig)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+let flushing = false;
+
+async function sendBatch(issuedAt, marks, rawKey) {
+    const body = JSON.stringify({ emp_id: empId, issued_at: issuedAt, sent_at: new Date().toISOString(), marks: marks });
+    const response = await fetch('/api/mobile/sync', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-Signature': await signBatch(body, rawKey) },
+        body: body
+    });
+    if (!response.ok) {
+        console.warn('Offline sync failed', response.status);
+        return null;
+    }
+    const sent = new Set(marks.map(m => m.client_id));
+    // Keep anything queued while the batch was in flight
+    saveQueue(loadQueue().filter(m => !sent.has(m.client_id)));
+    return response.json();
+}
+
+async function flushQueue() {
+    const queue = loadQueue();
+    if (flushing || !queue.length || !navigator.onLine) return;
+    flushing = true;
+    try {
+        const keys = loadSyncKeys();
+        const batches = {};
+        for (const m of queue) {
+            const issuedAt = keys[m.issued_at] ? m.issued_at : syncIssuedAt;
+            (batches[issuedAt] = batches[issuedAt] || []).push({ client_id: m.client_id, date: m.date, captured_at: m.captured_at });
+        }
+        let applied = 0;
+        const codes = [];
+        for (const [issuedAt, marks] of Object.entries(batches)) {
+            const data = await sendBatch(Number(issuedAt), marks, keys[issuedAt] || syncKey);
+            if (!data) continue;
+            applied += data.applied;
+            data.results.filter(r => !r.applied).forEach(r => codes.push(r.date + ': ' + r.code));
+            if (Number(issuedAt) !== syncIssuedAt) delete keys[issuedAt];
+        }
+        localStorage.setItem(KEYS_KEY, JSON.stringify(keys));
+        if (codes.length) {
+            showToast("Synced " + applied + ", rejected " + codes.length + " (" + codes.join(', ') + ")");
+        } else if (applied) {
+            showToast("Synced " + applied + " offline mark(s)");
+        }
+    } catch (e) {
+        console.warn('Offline sync deferred', e);
+    } finally {
+        flushing = false;
+    }
+}
+
+window.addEventListener('online', flushQueue);
+flushQueue();
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from .concurrency import ConflictError
+from .db import SessionLocal
+from .models import SystemState
+from .partitions import is_postgres
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Shared simulation / lockout state
+# -----------------------------
+#
+# The state lives in the `system_state` table so every uvicorn worker sees the
+# same LOCKOUT/HOLIDAY rules. Each worker keeps an in-memory snapshot stamped
+# with the highest row version; a background poller reloads it when the stamp
+# moves, and writes made in this process invalidate it immediately through the
+# local pub/sub stand-in. Hot-path reads never touch the database.
+
+SIMULATION_STATES = ("NORMAL", "HOLIDAY", "LOCKOUT", "UNLOCK_RESTRICTION")
+SCOPES = ("GLOBAL", "LOCATION", "EMPLOYEE")
+POLL_SECONDS = float(os.environ.get("SYSTEM_STATE_POLL_SECONDS", "1.0"))
+SET_STATE_ATTEMPTS = 5
+_VERSION_LOCK_KEY = 0x53595354  # pg_advisory_xact_lock key serializing set_state writers
+
+ScopeKey = Tuple[str, str]
+
+
+class LocalPubSub:
+    """In-process stand-in for a shared pub/sub channel (e.g. Redis or LISTEN/NOTIFY)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers: Dict[str, List[Callable[[dict], None]]] = {}
+
+    def subscribe(self, channel: str, handler: Callable[[dict], None]):
+        with self._lock:
+            self._handlers.setdefault(channel, []).append(handler)
+
+    def publish(self, channel: str, message: dict):
+        with self._lock:
+            handlers = list(self._handlers.get(channel, ()))
+        for handler in handlers:
+            handler(message)
+
+
+pubsub = LocalPubSub()
+CHANNEL = "system_state"
+
+
+class SystemStateCache:
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._version = -1
+        self._states: Dict[ScopeKey, str] = {}
+        self._poller: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        pubsub.subscribe(CHANNEL, self._on_message)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    # -- reads (in-memory) --
+
+    def global_state(self) -> str:
+        return self._states.get(("GLOBAL", ""), "NORMAL")
+
+    def effective(self, emp_id: str, location: Optional[str] = None) -> str:
+        """Most specific non-NORMAL state: employee, then location, then global."""
+        states = self._states
+        for key in (("EMPLOYEE", emp_id), ("LOCATION", location or "")):
+            state = states.get(key)
+            if state and state != "NORMAL":
+                return state
+        return states.get(("GLOBAL", ""), "NORMAL")
+
+    def scoped(self) -> List[dict]:
+        return [
+            {"scope": scope, "scope_key": key, "state": state}
+            for (scope, key), state in sorted(self._states.items())
+            if scope != "GLOBAL" and state != "NORMAL"
+        ]
+
+    # -- refresh --
+
+    def refresh(self, db: Optional[Session] = None, force: bool = False) -> bool:
+        """Reload the snapshot if the shared version stamp moved. Returns True if reloaded."""
+        own = db is None
+        db = db or self._session_factory()
+        try:
+            version = db.execute(select(func.coalesce(func.max(SystemState.version), 0))).scalar()
+            if version == self._version and not force:
+                return False
+            rows = db.execute(select(SystemState.scope, SystemState.scope_key, SystemState.state)).all()
+            with self._lock:
+                # A concurrent refresh may already have installed a newer snapshot
+                if version < self._version and not force:
+                    return False
+                self._states = {(scope, key or ""): state for scope, key, state in rows}
+                self._version = version
+            return True
+        finally:
+            if own:
+                db.close()
+
+    def _on_message(self, message: dict):
+        if message.get("version", 0) > self._version:
+            self.refresh()
+
+    def start(self, interval: float = POLL_SECONDS):
+        if self._poller and self._poller.is_alive():
+            return
+        self.refresh(force=True)
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._poll, args=(interval,), name="system-state-poller", daemon=True)
+        self._poller.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("System state refresh failed")
+
+
+def set_state(db: Session, state: str, scope: str = "GLOBAL", scope_key: Optional[str] = None, actor: Optional[str] = None) -> int:
+    """Persist a state for a scope and broadcast the new version stamp.
+
+    The stamp is MAX(version) + 1 computed inside the write, so it is handed
+    out in commit order: SQLite holds its write lock for the statement, and
+    PostgreSQL writers first take an advisory lock. A writer that still loses
+    the unique version (or a race to create the scope's row) retries.
+    """
+    key = "" if scope == "GLOBAL" else (scope_key or "")
+    latest = aliased(SystemState)
+    stamp = select(func.coalesce(func.max(latest.version), 0) + 1).scalar_subquery()
+    where = (SystemState.scope == scope, SystemState.scope_key == key)
+    on_postgres = is_postgres(db.get_bind(SystemState))
+    for _ in range(SET_STATE_ATTEMPTS):
+        try:
+            if on_postgres:
+                db.execute(select(func.pg_advisory_xact_lock(_VERSION_LOCK_KEY)), bind_arguments={"mapper": SystemState})
+            values = dict(state=state, version=stamp, updated_by=actor, updated_at=datetime.utcnow())
+            moved = db.execute(
+                update(SystemState).where(*where).values(**values),
+                execution_options={"synchronize_session": False},
+            ).rowcount
+            if not moved:
+                db.execute(insert(SystemState).values(scope=scope, scope_key=key, **values))
+            next_version = db.execute(select(SystemState.version).where(*where)).scalar_one()
+            db.commit()
+            break
+        except IntegrityError:
+            # Lost the version stamp (or the new scope row) to a concurrent writer
+            db.rollback()
+    else:
+        raise ConflictError("System state is being changed concurrently; retry")
+
+    pubsub.publish(CHANNEL, {"version": next_version})
+    return next_version
+
+
+system_state = SystemStateCache()
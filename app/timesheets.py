@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import SmallInteger, func, select, type_coerce
+from sqlalchemy.orm import Session
+
+from .archive import archive_version, archived_months, read_archived_records
+from .models import (
+    ATTENDANCE_STATUS_CODES,
+    AttendanceChangeRequest,
+    AttendanceRecord,
+    Employee,
+    RequestStatus,
+)
+from .partitions import add_months, month_start
+from .rules import get_rule_engine
+from .sharding import TenantSessionLocal, fan_in, is_sharded, shard_router
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Monthly timesheets
+# -----------------------------
+#
+# One pass per month for the whole org: attendance is streamed sorted by
+# (emp_id, day) and cut into contiguous employee chunks as the stream passes
+# each chunk's last employee. An archived month is read back from app/archive.py
+# and merged with any live rows first. Each chunk is merged with the location's
+# holiday calendar (the `non_working_day` rule in app/rules.py) in a process
+# pool while the next chunk is still streaming. With sharding on, every shard streams its
+# own employees. Results are cached per month; `invalidate` drops a month when
+# attendance in it changes, and a cheap fingerprint catches writes made by
+# other workers.
+
+WORKERS = int(os.environ.get("TIMESHEET_WORKERS", os.cpu_count() or 1))
+CHUNK_EMPLOYEES = int(os.environ.get("TIMESHEET_CHUNK_EMPLOYEES", "2000"))
+STREAM_BATCH = 5000
+# Below this, pickling chunks to other processes costs more than it saves
+PARALLEL_MIN_EMPLOYEES = int(os.environ.get("TIMESHEET_PARALLEL_MIN", "5000"))
+
+FIELDS = (
+    "emp_id", "name", "location", "present", "absent", "leave", "holiday", "weekly_off",
+    "unmarked", "corrected_days", "working_days",
+)
+_COUNTED = {code: name.lower() for name, code in ATTENDANCE_STATUS_CODES.items()}
+# Requests that rewrite attendance once applied
+_CORRECTION_TYPES = ("CORRECT_MARKING", "HOLIDAY_EXCEPTION", "ATOMICWORK_SYNC")
+
+
+def parse_month(value: str) -> date:
+    """'2026-09' -> date(2026, 9, 1)."""
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise ValueError("month must look like YYYY-MM") from None
+
+
+def _bounds(month: date) -> Tuple[date, date]:
+    """[first day, first day of next month)."""
+    start = month_start(month)
+    return start, add_months(start, 1)
+
+
+# -----------------------------
+# Per-chunk computation (runs in the pool)
+# -----------------------------
+
+def _compute_chunk(first: int, last: int, today: int, employees: list, rows: list,
+                   corrections: dict, calendars: dict) -> List[dict]:
+    """Timesheet rows for one chunk of employees.
+
+    `first`/`last` are the month's day ordinals (inclusive), `employees` is
+    [(emp_id, name, location)], `rows` is [(employee position, day ordinal,
+    status code)] sorted by position then day, `corrections` maps emp_id to
+    [(start, end)] ordinals and `calendars` maps location to (weekend, holidays).
+    """
+    days = [date.fromordinal(o) for o in range(first, last + 1)]
+    kinds = {}
+    for loc, (weekend, holidays) in calendars.items():
+        # Per-day calendar for the month: "holiday", "weekly_off" or None
+        kinds[loc] = [
+            "holiday" if (d.month, d.day) in holidays else "weekly_off" if d.weekday() in weekend else None
+            for d in days
+        ]
+
+    out = []
+    i, n = 0, len(rows)
+    for pos, (emp_id, emp_name, location) in enumerate(employees):
+        sheet = {"emp_id": emp_id, "name": emp_name, "location": location, **dict.fromkeys(FIELDS[3:], 0)}
+        kind = kinds[location]
+        sheet["working_days"] = kind.count(None)
+
+        recorded = {}
+        while i < n and rows[i][0] == pos:
+            recorded[rows[i][1]] = rows[i][2]
+            i += 1
+        for offset, k in enumerate(kind):
+            ordinal = first + offset
+            code = recorded.get(ordinal)
+            if code is not None:
+                status = _COUNTED.get(code)
+                if status:
+                    sheet[status] += 1
+            elif k is not None:
+                sheet[k] += 1
+            elif ordinal <= today:
+                sheet["unmarked"] += 1
+
+        corrected = set()
+        for lo, hi in corrections.get(emp_id, ()):
+            corrected.update(range(max(lo, first), min(hi, last) + 1))
+        sheet["corrected_days"] = len(corrected)
+        out.append(sheet)
+    return out
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server process can copy held locks into the child
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+# -----------------------------
+# Generation
+# -----------------------------
+
+def _generate(db: Session, month: date, parallel: bool) -> List[dict]:
+    """Timesheets for every employee in one (unsharded) database."""
+    start, end = _bounds(month)
+    first, last = start.toordinal(), end.toordinal() - 1
+    today = date.today().toordinal()
+
+    employees = db.execute(
+        select(Employee.emp_id, Employee.name, Employee.location).order_by(Employee.emp_id)
+    ).all()
+    if not employees:
+        return []
+    engine = get_rule_engine()
+    calendars = {loc: engine.calendar(loc) for loc in {e.location for e in employees}}
+
+    corrections: Dict[str, list] = {}
+    for emp_id, lo, hi in db.execute(
+        select(AttendanceChangeRequest.emp_id, AttendanceChangeRequest.date_start, AttendanceChangeRequest.date_end)
+        .where(
+            AttendanceChangeRequest.status == RequestStatus.APPLIED.value,
+            AttendanceChangeRequest.request_type.in_(_CORRECTION_TYPES),
+            AttendanceChangeRequest.desired_status.is_not(None),
+            AttendanceChangeRequest.date_start < end,
+            AttendanceChangeRequest.date_end >= start,
+        )
+    ):
+        corrections.setdefault(emp_id, []).append((lo.toordinal(), hi.toordinal()))
+
+    # Positions follow the database's own emp_id order, which is also the stream order
+    position = {e.emp_id: i for i, e in enumerate(employees)}
+    size = CHUNK_EMPLOYEES if parallel else len(employees)
+    chunk_ends = list(range(size, len(employees), size)) + [len(employees)]
+    pending: List[object] = []
+
+    def submit(chunk: int, rows: list):
+        lo = chunk_ends[chunk - 1] if chunk else 0
+        hi = chunk_ends[chunk]
+        emps = [tuple(e) for e in employees[lo:hi]]
+        args = (first, last, today, emps, [(p - lo, d, c) for p, d, c in rows],
+                {e[0]: corrections[e[0]] for e in emps if e[0] in corrections},
+                {loc: calendars[loc] for loc in {e[2] for e in emps}})
+        pending.append(_get_pool().submit(_compute_chunk, *args) if parallel else _compute_chunk(*args))
+
+    chunk, rows = 0, []
+    stream = db.execute(
+        select(AttendanceRecord.emp_id, AttendanceRecord.day, type_coerce(AttendanceRecord.status, SmallInteger))
+        .where(AttendanceRecord.day >= start, AttendanceRecord.day < end)
+        .order_by(AttendanceRecord.emp_id, AttendanceRecord.day)
+        .execution_options(yield_per=STREAM_BATCH)
+    )
+    if month in archived_months():
+        stream = _merge_archived(stream, month, position)
+    for emp_id, day, code in stream:
+        pos = position.get(emp_id)
+        if pos is None:
+            continue
+        while pos >= chunk_ends[chunk]:
+            submit(chunk, rows)
+            chunk, rows = chunk + 1, []
+        rows.append((pos, day.toordinal(), code))
+    while chunk < len(chunk_ends):
+        submit(chunk, rows)
+        chunk, rows = chunk + 1, []
+
+    out = []
+    for result in pending:
+        out.extend(result.result() if isinstance(result, Future) else result)
+    return out
+
+
+def _merge_archived(stream, month: date, position: Dict[str, int]) -> List[tuple]:
+    """Archived rows for `month` plus the live ones, in stream order; a live row wins a shared day."""
+    merged = {
+        (emp_id, date.fromisoformat(day)): ATTENDANCE_STATUS_CODES[status]
+        for emp_id, day, status in read_archived_records({month})
+        if emp_id in position and status in ATTENDANCE_STATUS_CODES
+    }
+    merged.update(((emp_id, day), code) for emp_id, day, code in stream)
+    return sorted(
+        ((emp_id, day, code) for (emp_id, day), code in merged.items()),
+        key=lambda row: (position.get(row[0], -1), row[1]),
+    )
+
+
+def generate_month(db: Session, month: date, parallel: Optional[bool] = None) -> List[dict]:
+    """Org-wide timesheets for `month`, sorted by emp_id."""
+    if is_sharded(db):
+        results = shard_router.fan_out(lambda name, s: generate_month(s, month, parallel))
+        return sorted((r for rows in results.values() for r in rows), key=lambda r: r["emp_id"])
+    if parallel is None:
+        count = db.execute(select(func.count()).select_from(Employee)).scalar()
+        parallel = WORKERS > 1 and count >= PARALLEL_MIN_EMPLOYEES
+    return _generate(db, month, parallel)
+
+
+def month_fingerprint(db: Session, month: date) -> tuple:
+    """Changes whenever a record in the month is inserted or updated, or an employee is added or changed."""
+    start, end = _bounds(month)
+    att = fan_in(db.execute(
+        select(func.count(), func.max(AttendanceRecord.id), func.max(AttendanceRecord.last_updated_at))
+        .where(AttendanceRecord.day >= start, AttendanceRecord.day < end)
+    ).all(), "sum", "max", "max")
+    # Every employee gets a row carrying their name and location (HR sync bumps updated_at)
+    emps = fan_in(db.execute(select(func.count(), func.max(Employee.updated_at))).all(), "sum", "max")
+    return att + emps + (archive_version(),)
+
+
+def to_csv(rows: List[dict]) -> str:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buf.getvalue()
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+
+class TimesheetCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # month -> (fingerprint, generated_at, rows)
+        self._entries: Dict[date, tuple] = {}
+        # Bumped by invalidate so a generation that raced a write is not stored
+        self._epochs: Dict[date, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.last_seconds = 0.0
+
+    def get(self, db: Session, month: date) -> Tuple[datetime, List[dict]]:
+        month = month_start(month)
+        fingerprint = month_fingerprint(db, month)
+        with self._lock:
+            entry = self._entries.get(month)
+            if entry and entry[0] == fingerprint:
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+            epoch = self._epochs.get(month, 0)
+
+        started = time.perf_counter()
+        rows = generate_month(db, month)
+        generated_at = datetime.utcnow()
+        with self._lock:
+            self.last_seconds = time.perf_counter() - started
+            if self._epochs.get(month, 0) == epoch:
+                self._entries[month] = (fingerprint, generated_at, rows)
+        return generated_at, rows
+
+    def invalidate(self, start: date, end: Optional[date] = None):
+        """Drop every cached month between start and end (inclusive)."""
+        month, last = month_start(start), month_start(end or start)
+        with self._lock:
+            while month <= last:
+                self._entries.pop(month, None)
+                self._epochs[month] = self._epochs.get(month, 0) + 1
+                month = add_months(month, 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "months": sorted(m.strftime("%Y-%m") for m in self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "last_generation_seconds": round(self.last_seconds, 3),
+                "workers": WORKERS,
+            }
+
+
+timesheet_cache = TimesheetCache()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate monthly attendance timesheets")
+    parser.add_argument("month", type=parse_month, help="YYYY-MM")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("--serial", action="store_true", help="Do not use the process pool")
+    args = parser.parse_args(argv)
+
+    db = TenantSessionLocal()
+    try:
+        rows = generate_month(db, args.month, parallel=False if args.serial else None)
+    finally:
+        db.close()
+        shutdown_pool()
+    if args.format == "csv":
+        print(to_csv(rows), end="")
+    else:
+        print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,412 @@
+from __future__ import annotations
+
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------
+# Tracing
+# -----------------------------
+#
+# A small tracer with OpenTelemetry's data model: a sampled request gets a
+# SERVER span from TracingMiddleware, and everything it does under that span
+# (each SQL statement, the apply stage, template rendering, any `span(...)`
+# block) becomes a child span. Ended spans are batched by a background thread
+# into TRACE_FILE as OTLP/JSON (one ExportTraceServiceRequest per line), which
+# the OpenTelemetry Collector's `otlpjsonfile` receiver can ingest. W3C
+# `traceparent` is honoured on the way in and returned on the way out, so a
+# caller's trace continues through this service.
+#
+# TRACE_SAMPLE_RATIO (default 0, i.e. off) picks the share of requests traced
+# when the caller did not decide; an incoming sampled traceparent is always
+# traced. Unsampled requests cost one context-var lookup per instrumented call.
+# `GET /api/metrics/traces` breaks sampled requests down by route and stage.
+
+SAMPLE_RATIO = float(os.environ.get("TRACE_SAMPLE_RATIO", "0"))
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")  # empty: keep only the in-process breakdown
+SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "attendance-service")
+EXPORT_BATCH = 512
+EXPORT_INTERVAL = 1.0
+STATEMENT_MAX = 500
+
+SPAN_KIND_INTERNAL, SPAN_KIND_SERVER, SPAN_KIND_CLIENT = 1, 2, 3
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns",
+                 "attributes", "status", "status_message", "root", "stages")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: int = SPAN_KIND_INTERNAL,
+                 root: Optional["Span"] = None, attributes: Optional[dict] = None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.root = root or self
+        # Root spans only: (stage name, duration ns) of every child
+        self.stages: Optional[list] = [] if root is None else None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.status, self.status_message = STATUS_ERROR, message
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        if self.root is not self:
+            self.root.stages.append((self.name, self.end_ns - self.start_ns))
+        tracer.finished(self)
+
+    def to_otlp(self) -> dict:
+        out = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": self.status, **({"message": self.status_message} if self.status_message else {})},
+        }
+        if self.parent_id:
+            out["parentSpanId"] = self.parent_id
+        return out
+
+
+def _otlp_value(v) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, message):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _SpanContext:
+    __slots__ = ("name", "attributes", "kind", "span", "token")
+
+    def __init__(self, name: str, attributes: dict, kind: int):
+        self.name, self.attributes, self.kind = name, attributes, kind
+        self.span = None
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is None:
+            return _NOOP
+        self.span = Span(self.name, parent.trace_id, parent.span_id, self.kind, parent.root, self.attributes)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return False
+        if exc is not None:
+            self.span.set_error(f"{exc_type.__name__}: {exc}")
+        _current.reset(self.token)
+        self.span.end()
+        return False
+
+
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """`with span("stage", key=value):` records a child of the current span; a no-op when not tracing."""
+    return _SpanContext(name, attributes, kind)
+
+
+def traced(name: str):
+    """Decorator form of `span`."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+# -----------------------------
+# Export and per-stage breakdown
+# -----------------------------
+
+class StageStats:
+    """Per route: request count and time, and per stage (child span name) count and time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, dict] = {}
+
+    def record(self, root: Span):
+        with self._lock:
+            r = self._routes.setdefault(root.name, {"count": 0, "total_ns": 0, "stages": {}})
+            r["count"] += 1
+            r["total_ns"] += root.end_ns - root.start_ns
+            for name, ns in root.stages:
+                s = r["stages"].setdefault(name, [0, 0])
+                s[0] += 1
+                s[1] += ns
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            out = {}
+            for route, r in sorted(self._routes.items()):
+                stages = {
+                    name: {
+                        "calls_per_request": round(calls / r["count"], 2),
+                        "avg_ms_per_request": round(ns / r["count"] / 1e6, 3),
+                    }
+                    for name, (calls, ns) in sorted(r["stages"].items(), key=lambda kv: -kv[1][1])
+                }
+                out[route] = {"requests": r["count"], "avg_ms": round(r["total_ns"] / r["count"] / 1e6, 3), "stages": stages}
+            return out
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+class Tracer:
+    def __init__(self, sample_ratio: float = SAMPLE_RATIO, path: str = TRACE_FILE):
+        self.sample_ratio = sample_ratio
+        self.path = path
+        self.stages = StageStats()
+        self._queue: queue.Queue = queue.Queue(maxsize=50_000)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_ratio > 0
+
+    def start_root(self, name: str, traceparent: Optional[str] = None, **attributes) -> Optional[Span]:
+        """A SERVER span if this request is sampled, else None."""
+        trace_id = parent_id = None
+        sampled = None
+        if traceparent:
+            parts = traceparent.strip().split("-")
+            if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+                trace_id, parent_id = parts[1], parts[2]
+                sampled = int(parts[3][:2] or "0", 16) & 1 == 1
+        if sampled is None:
+            sampled = self.sample_ratio > 0 and random.random() < self.sample_ratio
+        if not sampled:
+            return None
+        root = Span(name, trace_id or f"{random.getrandbits(128):032x}", parent_id, SPAN_KIND_SERVER,
+                    attributes=attributes)
+        return root
+
+    def activate(self, root: Span):
+        return _current.set(root)
+
+    def deactivate(self, token):
+        _current.reset(token)
+
+    def finished(self, s: Span):
+        if s.root is s:
+            self.stages.record(s)
+        if not self.path:
+            return
+        self._ensure_exporter()
+        try:
+            self._queue.put_nowait(s)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_exporter(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _export_loop(self):
+        while not self._stop.is_set():
+            self._stop.wait(EXPORT_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        batch: List[Span] = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for i in range(0, len(batch), EXPORT_BATCH):
+            self._write(batch[i:i + EXPORT_BATCH])
+
+    def _write(self, spans: List[Span]):
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": [s.to_otlp() for s in spans]}],
+        }]}
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+            self.exported += len(spans)
+        except OSError as e:
+            self.dropped += len(spans)
+            logger.warning("Could not write traces to %s: %s", self.path, e)
+
+    def shutdown(self):
+        self._stop.set()
+        self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "sample_ratio": self.sample_ratio,
+            "file": self.path or None,
+            "exported_spans": self.exported,
+            "dropped_spans": self.dropped,
+            "queued_spans": self._queue.qsize(),
+            "routes": self.stages.snapshot(),
+        }
+
+
+tracer = Tracer()
+atexit.register(tracer.shutdown)
+
+
+# -----------------------------
+# SQL spans (every engine: primary, replica, shards)
+# -----------------------------
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_sql(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is None or context is None:
+        return
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+    context._trace_span = Span(f"db {verb}", parent.trace_id, parent.span_id, SPAN_KIND_CLIENT, parent.root, {
+        "db.system": conn.dialect.name,
+        "db.name": conn.engine.url.database or "",
+        "db.statement": statement[:STATEMENT_MAX],
+        "db.executemany": executemany,
+    })
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_sql(conn, cursor, statement, parameters, context, executemany):
+    s = getattr(context, "_trace_span", None)
+    if s is not None:
+        context._trace_span = None
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            s.set_attribute("db.rows", cursor.rowcount)
+        s.end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _sql_error(exception_context):
+    s = getattr(exception_context.execution_context, "_trace_span", None)
+    if s is not None:
+        exception_context.execution_context._trace_span = None
+        s.set_error(str(exception_context.original_exception))
+        s.end()
+
+
+# -----------------------------
+# HTTP spans
+# -----------------------------
+
+class TracingMiddleware:
+    """Root SERVER span per sampled request, named by route template (e.g. `POST /attendance-requests/{request_id}/approve`)."""
+
+    def __init__(self, app, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+        self._route_paths: Dict[object, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return scope["path"]
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            app = scope.get("app")
+            for route in getattr(app, "routes", ()):
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            self._route_paths[endpoint] = path = path or scope["path"]
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        if traceparent is None and not self.tracer.enabled:
+            return await self.app(scope, receive, send)
+        root = self.tracer.start_root(scope["method"], traceparent, **{
+            "http.method": scope["method"], "http.target": scope["path"],
+        })
+        if root is None:
+            return await self.app(scope, receive, send)
+
+        async def send_traced(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.status = STATUS_ERROR
+                header = f"00-{root.trace_id}-{root.span_id}-01".encode()
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"traceparent", header)])
+            await send(message)
+
+        token = self.tracer.activate(root)
+        try:
+            await self.app(scope, receive, send_traced)
+        except Exception as e:
+            root.set_error(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            self.tracer.deactivate(token)
+            route = self._route(scope)
+            root.name = f"{scope['method']} {route}"
+            root.set_attribute("http.route", route)
+            root.end()
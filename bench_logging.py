@@ -0,0 +1,69 @@
+"""Micro-benchmark for logging on the blocked-mark path (caller latency and log volume)."""
+import logging
+import os
+import tempfile
+import time
+from datetime import date
+
+from app.logs import log_pipeline, request_id
+
+N_EVENTS = 50_000
+EMPLOYEES = 5_000
+logger = logging.getLogger("bench.mark")
+
+
+def storm():
+    """A blocked-day storm: every employee hammering the same holiday."""
+    day = date(2026, 1, 26)
+    start = time.perf_counter()
+    for i in range(N_EVENTS):
+        request_id.set(f"{i:016x}")
+        emp_id = f"E{i % EMPLOYEES}"
+        logger.warning("Blocking attendance for %s on %s: %s", emp_id, day, "HOLIDAY_BLOCK",
+                       extra={"emp_id": emp_id, "day": day.isoformat(), "code": "HOLIDAY_BLOCK"})
+    return time.perf_counter() - start
+
+
+def storm_fstring():
+    """The previous call: message built eagerly with an f-string."""
+    day = date(2026, 1, 26)
+    start = time.perf_counter()
+    for i in range(N_EVENTS):
+        emp_id = f"E{i % EMPLOYEES}"
+        logger.warning(f"Blocking attendance for {emp_id} on {day}: HOLIDAY_BLOCK")
+    return time.perf_counter() - start
+
+
+def run(label, setup, fn):
+    fd, path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+    with open(path, "w") as stream:
+        setup(stream)
+        caller = fn()
+        flush_start = time.perf_counter()
+        log_pipeline.stop()
+        flush = time.perf_counter() - flush_start
+        stream.flush()
+    with open(path) as f:
+        lines = sum(1 for _ in f)
+    size = os.path.getsize(path)
+    os.unlink(path)
+    dropped = log_pipeline.handler.dropped if log_pipeline.handler and label != "sync text" else 0
+    print(f"{label + ':':24} {caller / N_EVENTS * 1e6:6.2f} us/call in caller, {flush:5.2f}s to drain, "
+          f"{lines:6d} lines, {size / 1024:8.0f} KiB, {dropped} dropped")
+
+
+def sync_text(stream):
+    root = logging.getLogger()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+    log_pipeline.handler = None
+
+
+if __name__ == "__main__":
+    print(f"{N_EVENTS} blocked-mark warnings")
+    run("sync text", sync_text, storm_fstring)
+    run("queued json", lambda s: log_pipeline.configure(stream=s, sample=False), storm)
+    run("queued json + sampling", lambda s: log_pipeline.configure(stream=s), storm)
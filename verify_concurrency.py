@@ -0,0 +1,85 @@
+"""
+Concurrent-write check against a scratch SQLite database. Several threads
+approve the same requests at once and then race to mark the same
+employee-day. Exactly one writer must win each race, the others must get a
+409, and nothing may be applied twice.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import Counter
+from datetime import date, timedelta
+
+tmp = tempfile.mkdtemp(prefix="concurrency-check-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'attendance.db')}"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+THREADS = 8
+ROUNDS = 5
+
+
+def race(fn, n=THREADS):
+    """Run fn(i) on n threads released together; returns the status codes."""
+    barrier = threading.Barrier(n)
+    codes = [None] * n
+
+    def run(i):
+        barrier.wait()
+        codes[i] = fn(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return Counter(codes)
+
+
+def query(sql, *args):
+    con = sqlite3.connect(os.path.join(tmp, "attendance.db"))
+    try:
+        return con.execute(sql, args).fetchall()
+    finally:
+        con.close()
+
+
+with TestClient(app) as client:
+    print("Approvals:")
+    for r in range(ROUNDS):
+        day = date.today() - timedelta(days=40 + r)
+        req = client.post("/attendance-requests", json={
+            "emp_id": "E1002", "request_type": "CORRECT_MARKING", "desired_status": "PRESENT",
+            "date_start": day.isoformat(), "date_end": day.isoformat(), "reason_text": "concurrency check",
+        }).json()
+        codes = race(lambda i: client.post(
+            f"/attendance-requests/{req['id']}/approve",
+            json={"actor_emp_id": req["approver_emp_id"], "comment": f"approver {i}"},
+        ).status_code)
+        applied = query("SELECT count(*) FROM audit_events WHERE request_id = ? AND action = 'APPLIED'", req["id"])[0][0]
+        version = client.get(f"/attendance-requests/{req['id']}").json()["version"]
+        print(f"  request {req['id']}: {dict(codes)}, APPLIED audit rows {applied}, version {version}")
+
+    pending = client.post("/attendance-requests", json={
+        "emp_id": "E1002", "request_type": "UNLOCK", "date_start": date.today().isoformat(),
+        "date_end": date.today().isoformat(), "reason_text": "stale version check",
+    }).json()
+    stale = client.post(f"/attendance-requests/{pending['id']}/reject",
+                        json={"actor_emp_id": pending["approver_emp_id"], "expected_version": pending["version"] + 1})
+    print("Reject with a stale expected_version:", stale.status_code, stale.json()["detail"])
+
+    print("Marks of one employee-day:")
+    emp_ids = [e["emp_id"] for e in client.get("/api/employees-list").json()][-ROUNDS:]
+    today = date.today().isoformat()
+    for emp_id in emp_ids:
+        codes = race(lambda i: client.post("/api/mark-attendance", json={"emp_id": emp_id, "date": today}).status_code)
+        rows = query("SELECT count(*) FROM attendance_records WHERE emp_id = ? AND day = ?", emp_id, today)[0][0]
+        print(f"  {emp_id} {today}: {dict(codes)}, records {rows}")
+
+    dupes = query("SELECT emp_id, day, count(*) FROM attendance_records GROUP BY emp_id, day HAVING count(*) > 1")
+    print("Duplicate employee-days:", dupes)
+    print("Conflicts:", client.get("/api/metrics/conflicts").json())
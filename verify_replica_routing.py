@@ -0,0 +1,49 @@
+"""
+Read/write routing check against two local SQLite files (primary + replica).
+"Replication" is simulated with SQLite's backup API so the replica lags until
+we copy it explicitly.
+"""
+import os
+import sqlite3
+import tempfile
+
+tmp = tempfile.mkdtemp(prefix="replica-check-")
+PRIMARY = os.path.join(tmp, "primary.db")
+REPLICA = os.path.join(tmp, "replica.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{PRIMARY}"
+os.environ["REPLICA_DATABASE_URL"] = f"sqlite:///{REPLICA}"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+def replicate():
+    src, dst = sqlite3.connect(PRIMARY), sqlite3.connect(REPLICA)
+    src.backup(dst)
+    src.close()
+    dst.close()
+
+
+with TestClient(app) as client:
+    replicate()
+    print("Employee read (replica):", client.get("/employees/E1001").status_code)
+
+    res = client.post("/attendance-requests", json={
+        "emp_id": "E1001", "request_type": "UNLOCK",
+        "date_start": "2026-01-05", "date_end": "2026-01-05", "reason_text": "replica check",
+    })
+    req_id = res.json()["id"]
+    print("Write (primary):", res.status_code, "sticky cookie set:", "db_primary_until" in res.cookies)
+
+    # Same client: pinned to the primary, sees its own write
+    print("Read own write (sticky -> primary):", client.get(f"/attendance-requests/{req_id}").status_code)
+
+    # Another client: served by the replica, which has not caught up yet
+    other = TestClient(app)
+    print("Other client before replication (replica):", other.get(f"/attendance-requests/{req_id}").status_code)
+    replicate()
+    print("Other client after replication (replica):", other.get(f"/attendance-requests/{req_id}").status_code)
+
+    print("Routing:", client.get("/api/metrics/db").json())